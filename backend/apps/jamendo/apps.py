@@ -0,0 +1,25 @@
+from django.apps import AppConfig
+
+
+class JamendoConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.jamendo'
+
+    def ready(self):
+        from .autocomplete import collect_autocomplete
+        from .metrics import register_collector
+        from .random_pool import collect_jamendo_response
+        from .signals import tracks_fetched
+        from .views import collect_jamendo_state
+        from .warmup import should_warm_on_boot, warm_on_boot
+
+        # 上游取得的音軌同時收進隨機音軌池
+        tracks_fetched.connect(collect_jamendo_response, dispatch_uid='jamendo-random-pool')
+        # 以及搜尋建議索引
+        tracks_fetched.connect(collect_autocomplete, dispatch_uid='jamendo-autocomplete')
+
+        # 緩存、斷路器等狀態在輸出指標時才讀取
+        register_collector(collect_jamendo_state)
+
+        if should_warm_on_boot():
+            warm_on_boot()
@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import weakref
+
+import httpx
+
+from .client import (
+    RETRY_STATUS_CODES,
+    CircuitOpenError,
+    backoff_delay,
+    breaker,
+    build_params,
+    get_api_base,
+    get_client_setting,
+    get_jamendo_headers,
+    get_timeouts,
+)
+from .governor import QuotaExceeded, governor
+from .metrics import observe_upstream, upstream_responses
+
+logger = logging.getLogger(__name__)
+
+# 每個事件迴圈共用一個 AsyncClient（httpx 的連線池綁定在建立它的迴圈上）
+_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_client():
+    """獲取目前事件迴圈共用的 keep-alive AsyncClient"""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        pool_size = int(get_client_setting('JAMENDO_ASYNC_POOL_SIZE', 100))
+        connect_timeout, read_timeout = get_timeouts()
+        client = httpx.AsyncClient(
+            headers=get_jamendo_headers(),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+        _clients[loop] = client
+    return client
+
+async def ajamendo_get(endpoint, params):
+    """jamendo_get 的非同步版本：遇到 5xx 或逾時會有限次數地重試
+
+    回傳最後一次的 Response；所有嘗試都發生網路錯誤時拋出 httpx.TransportError。
+    斷路器開啟時不請求上游，直接拋出 CircuitOpenError；
+    配額或並發名額不足、排隊逾時則拋出 QuotaExceeded（見 governor）。
+    """
+    if not breaker.allow():
+        upstream_responses.inc(endpoint.strip('/'), 'circuit_open')
+        raise CircuitOpenError('Jamendo 上游斷路器開啟中')
+    try:
+        async with governor.aadmit():
+            with observe_upstream(endpoint) as outcome:
+                try:
+                    response = await asend_with_retries(endpoint, params)
+                except asyncio.CancelledError:
+                    outcome['status'] = 'cancelled'
+                    raise
+                except Exception:
+                    breaker.record_failure()
+                    raise
+                outcome['status'] = response.status_code
+    except QuotaExceeded:
+        # 被本服務限流（只會發生在送出之前），不是上游故障：不計入斷路器
+        breaker.release_trial()
+        upstream_responses.inc(endpoint.strip('/'), 'shed')
+        raise
+    except asyncio.CancelledError:
+        # 排隊或請求中被取消，沒有結果：釋放試探名額
+        breaker.release_trial()
+        raise
+    breaker.record_response(response.status_code)
+    return response
+
+async def asend_with_retries(endpoint, params):
+    final_params = build_params(params)
+    url = f'{get_api_base()}/{endpoint.lstrip("/")}'
+    max_retries = int(get_client_setting('JAMENDO_MAX_RETRIES', 2))
+    client = get_async_client()
+
+    for attempt in range(max_retries + 1):
+        last_attempt = attempt == max_retries
+        try:
+            logger.info(f'Jamendo API 非同步請求: {url} with params: {final_params}')
+            response = await client.get(url, params=final_params)
+        except httpx.TransportError as e:
+            if last_attempt or not await governor.aallow_retry():
+                raise
+            logger.warning(f'Jamendo API 請求失敗，準備重試 ({attempt + 1}/{max_retries}): {str(e)}')
+            if not await governor.abackoff(backoff_delay(attempt)):
+                raise
+        else:
+            if response.status_code not in RETRY_STATUS_CODES or last_attempt or not await governor.aallow_retry():
+                return response
+            logger.warning(f'Jamendo API 回應 {response.status_code}，準備重試 ({attempt + 1}/{max_retries})')
+            if not await governor.abackoff(backoff_delay(attempt)):
+                return response
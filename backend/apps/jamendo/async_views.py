@@ -0,0 +1,122 @@
+"""Jamendo 視圖的非同步版本
+
+在 ASGI 下（JAMENDO_ASYNC_VIEWS=True）取代 views.py 中會請求上游的視圖：
+上游請求走共用連線池的 httpx.AsyncClient，一個 worker 即可同時等待大量上游請求，
+不必為每個請求佔用一條執行緒。參數解析與響應格式與同步視圖共用。
+搜尋建議只讀進程內索引，也直接在事件迴圈中執行，省去切換到執行緒池的開銷。
+"""
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.views.decorators.cache import cache_control, never_cache
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_http_methods
+
+from . import random_pool, views
+from .metrics import cache_requests
+from .services import ajamendo_api_request, ajamendo_list_request, ajamendo_tracks_request
+
+@csrf_exempt
+@require_http_methods(["GET"])
+@gzip_page
+async def search_tracks(request):
+    """搜尋音軌"""
+    params = views.search_params(request)
+    if isinstance(params, HttpResponse):
+        return params
+
+    data = await sync_to_async(views.catalog_search)(params)
+    if data is not None:
+        cache_requests.inc('search', 'catalog')
+        return views.tracks_response(request, data)
+
+    data = await ajamendo_api_request('tracks', params, cache_profile='search')
+    return views.tracks_response(request, data)
+
+@csrf_exempt
+@require_http_methods(["GET"])
+@cache_control(public=True, max_age=60)
+async def autocomplete(request):
+    """輸入時的搜尋建議（進程內索引，不請求上游）"""
+    params = views.autocomplete_params(request)
+    if isinstance(params, HttpResponse):
+        return params
+    return views.autocomplete_response(**params)
+
+@csrf_exempt
+@require_http_methods(["GET"])
+@gzip_page
+async def tracks_by_tag(request):
+    """按標籤獲取音軌"""
+    params = views.tag_params(request)
+    if isinstance(params, HttpResponse):
+        return params
+
+    data = await ajamendo_list_request(**params, cache_profile='tag')
+    return views.tracks_response(request, data)
+
+@csrf_exempt
+@require_http_methods(["GET"])
+@gzip_page
+async def popular_tracks(request):
+    """獲取熱門音軌"""
+    params = views.list_params(request, order='popularity_total')
+    if isinstance(params, HttpResponse):
+        return params
+
+    data = await ajamendo_list_request(**params, cache_profile='popular')
+    return views.tracks_response(request, data)
+
+@csrf_exempt
+@require_http_methods(["GET"])
+@gzip_page
+async def latest_tracks(request):
+    """獲取最新音軌"""
+    params = views.list_params(request, order='releasedate_desc')
+    if isinstance(params, HttpResponse):
+        return params
+
+    data = await ajamendo_list_request(**params, cache_profile='latest')
+    return views.tracks_response(request, data)
+
+@csrf_exempt
+@require_http_methods(["GET"])
+@never_cache
+@gzip_page
+async def random_tracks(request):
+    """獲取隨機音軌"""
+    params = views.random_params(request)
+    if isinstance(params, HttpResponse):
+        return params
+
+    # 池已足夠時抽樣只是記憶體操作，不必切換執行緒
+    if random_pool.needs_fill(params['limit'], params['tag']):
+        await sync_to_async(random_pool.ensure_pool, thread_sensitive=False)(params['limit'], params['tag'])
+    else:
+        random_pool.ensure_pool(params['limit'], params['tag'])
+    data = random_pool.random_response(**params)
+    return views.tracks_response(request, data)
+
+@csrf_exempt
+@require_http_methods(["GET"])
+@gzip_page
+async def get_track_detail(request, track_id):
+    """獲取音軌詳情"""
+    params = views.track_detail_params(track_id)
+    if isinstance(params, HttpResponse):
+        return params
+
+    data = await ajamendo_tracks_request(params)
+    return views.track_detail_response(request, data)
+
+@csrf_exempt
+@require_http_methods(["GET"])
+@gzip_page
+async def batch_tracks(request):
+    """批量獲取音軌詳情"""
+    params = views.batch_params(request)
+    if isinstance(params, HttpResponse):
+        return params
+
+    data = await ajamendo_tracks_request(params)
+    return views.tracks_response(request, data)
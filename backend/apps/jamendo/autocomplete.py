@@ -0,0 +1,297 @@
+"""搜尋建議（autocomplete/）：進程內的前綴索引，輸入時不請求上游
+
+索引的來源：
+- tracks_fetched 信號：上游取得的音軌名、藝人、專輯與標籤（musicinfo 的 genres / instruments / vartags）
+- 第一次查詢時在專用的背景執行緒從本地曲庫載入最近更新的音軌（重啟後緩存仍在、不會再經過信號的數據）；
+  不佔用背景刷新的執行緒與上游名額，也不計入背景刷新次數
+
+每個建議依名稱中的每個字詞建立前綴（最長 MAX_PREFIX_LENGTH 個字元），每個前綴只保留熱門度最高的
+TOP_PER_PREFIX 個建議，已按熱門度排序；查詢只是一次字典查找與少量過濾。
+熱門度取自依熱門度排序（order=popularity_*）的列表中的名次，其他響應中出現的給基本分；
+藝人、專輯、標籤取其音軌中最高的熱門度。建議數超過 AUTOCOMPLETE_MAX_ENTRIES 時淘汰熱門度最低的，
+記憶體用量因此有上限。索引是每個 worker 各自一份。
+"""
+import bisect
+import heapq
+import logging
+import math
+import re
+import threading
+import time
+
+from django.db import connection
+from django.db.models.fields.json import KT
+
+from apps.music.models import Track
+
+from .client import get_client_setting
+from .responses import loads
+
+logger = logging.getLogger(__name__)
+
+# 每個字詞建立前綴的最大長度；更長的查詢字詞以這個長度的前綴查找後再過濾
+MAX_PREFIX_LENGTH = 10
+
+# 每個建議最多為前幾個字詞建立前綴（很長的名稱後段的字詞不索引）
+MAX_INDEXED_TOKENS = 6
+
+# 每個前綴保留的建議數（多字詞查詢在其中過濾，須大於一次返回的數量）
+TOP_PER_PREFIX = 32
+
+# 只出現在非熱門度排序的響應中的建議的熱門度（低於熱門度列表中第 1000 名左右）
+BASE_POPULARITY = 0.05
+
+# 超過上限時一次淘汰到上限的這個比例，避免每加入一個建議就淘汰一次
+EVICT_TO = 0.9
+
+# 加入與淘汰時每持有一次鎖處理的音軌或建議數（約 1ms，查詢最多等這麼久）
+LOCK_BATCH_SIZE = 20
+
+# 從本地曲庫載入時每次讀取與加入的音軌數
+SEED_CHUNK_SIZE = 2000
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+# musicinfo.tags 的鍵與建議類型
+TAG_TYPES = (('genres', 'genre'), ('instruments', 'tag'), ('vartags', 'tag'))
+
+
+def get_max_entries():
+    return int(get_client_setting('AUTOCOMPLETE_MAX_ENTRIES', 50000))
+
+def tokenize(text):
+    """小寫的字詞列表（標點與空白都是分隔）"""
+    return TOKEN_PATTERN.findall(text.casefold())
+
+def response_popularity(params, count):
+    """響應中每個位置的熱門度：依熱門度排序的列表按名次遞減（第 1 名為 1），其他響應都是基本分"""
+    if not str(params.get('order', '')).startswith('popularity'):
+        return [BASE_POPULARITY] * count
+    try:
+        offset = max(int(params.get('offset') or 0), 0)
+    except (TypeError, ValueError):
+        offset = 0
+    return [max(1 / math.log2(offset + i + 2), BASE_POPULARITY) for i in range(count)]
+
+
+class Suggestion:
+    """一個建議：類型與顯示文字，加上索引用的字詞與熱門度"""
+    __slots__ = ('key', 'kind', 'text', 'id', 'artist_name', 'tokens', 'score')
+
+    def __init__(self, key, kind, text, tokens, id=None, artist_name=None):
+        self.key = key
+        self.kind = kind
+        self.text = text
+        self.tokens = tokens
+        self.id = id
+        self.artist_name = artist_name
+        self.score = 0.0
+
+    def prefixes(self):
+        return {
+            token[:length]
+            for token in self.tokens[:MAX_INDEXED_TOKENS]
+            for length in range(1, min(len(token), MAX_PREFIX_LENGTH) + 1)
+        }
+
+    def matches(self, tokens):
+        """每個查詢字詞都是建議中某個字詞的前綴"""
+        return all(any(token.startswith(query) for token in self.tokens) for query in tokens)
+
+    def as_dict(self):
+        result = {'text': self.text, 'type': self.kind}
+        if self.id is not None:
+            result['id'] = self.id
+        if self.artist_name:
+            result['artist_name'] = self.artist_name
+        return result
+
+
+def score_key(suggestion):
+    return -suggestion.score
+
+
+class AutocompleteIndex:
+    """建議與前綴表；查詢與每一小批更新各自持有鎖"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._suggestions = {}  # (類型, 小寫文字) -> Suggestion
+        self._prefixes = {}  # 前綴 -> 依熱門度由高到低的 Suggestion 列表，最多 TOP_PER_PREFIX 個
+        self._seeded = False
+        self._evicting = False
+        self._stats = {'queries': 0, 'updates': 0, 'evicted': 0, 'seed_ms': None}
+
+    def _observe(self, kind, text, score, id=None, artist_name=None):
+        """記錄一次出現（呼叫端持有鎖）：新建議加入前綴表，熱門度提高時調整所在的位置"""
+        text = ' '.join(str(text).split())
+        tokens = tokenize(text)
+        if not tokens:
+            return
+        key = (kind, ' '.join(tokens))
+        suggestion = self._suggestions.get(key)
+        if suggestion is None:
+            suggestion = self._suggestions[key] = Suggestion(key, kind, text, tuple(tokens), id, artist_name)
+        elif score <= suggestion.score:
+            # 大多數音軌是重複出現的：熱門度沒有提高就不必動前綴表
+            return
+        elif kind == 'track':
+            # 同名音軌以最熱門的一首代表
+            suggestion.id, suggestion.artist_name = id, artist_name
+        suggestion.score = score
+        for prefix in suggestion.prefixes():
+            ranked = self._prefixes.get(prefix)
+            if ranked is None:
+                self._prefixes[prefix] = [suggestion]
+                continue
+            if suggestion in ranked:
+                ranked.remove(suggestion)
+            if len(ranked) < TOP_PER_PREFIX or score > ranked[-1].score:
+                bisect.insort(ranked, suggestion, key=score_key)
+                del ranked[TOP_PER_PREFIX:]
+
+    def _evict(self):
+        """淘汰熱門度最低的建議到上限的 EVICT_TO
+
+        只在複製建議列表與每批移除時持有鎖，挑選淘汰對象在鎖外進行，淘汰期間查詢不必等待。
+        被排除在某個前綴表之外的建議熱門度都低於表中的，因此先被淘汰；前綴表不會因此缺少更熱門的建議。
+        """
+        max_entries = get_max_entries()
+        with self._lock:
+            if self._evicting or len(self._suggestions) <= max_entries:
+                return
+            self._evicting = True
+            candidates = list(self._suggestions.values())
+        try:
+            victims = heapq.nsmallest(len(candidates) - int(max_entries * EVICT_TO), candidates, key=lambda suggestion: suggestion.score)
+            threshold = victims[-1].score if victims else 0.0
+            for offset in range(0, len(victims), LOCK_BATCH_SIZE):
+                with self._lock:
+                    for suggestion in victims[offset:offset + LOCK_BATCH_SIZE]:
+                        # 挑選之後熱門度提高或已被移除的略過
+                        if suggestion.score > threshold or self._suggestions.get(suggestion.key) is not suggestion:
+                            continue
+                        del self._suggestions[suggestion.key]
+                        for prefix in suggestion.prefixes():
+                            ranked = self._prefixes.get(prefix)
+                            if ranked is not None and suggestion in ranked:
+                                ranked.remove(suggestion)
+                                if not ranked:
+                                    del self._prefixes[prefix]
+                        self._stats['evicted'] += 1
+        finally:
+            with self._lock:
+                self._evicting = False
+
+    def _add_track(self, track, score):
+        """記錄一首音軌的名稱、藝人、專輯與標籤（呼叫端持有鎖）"""
+        if not isinstance(track, dict) or not track.get('id'):
+            return
+        artist_name = track.get('artist_name') or None
+        if track.get('name'):
+            self._observe('track', track['name'], score, str(track['id']), artist_name)
+        if artist_name:
+            self._observe('artist', artist_name, score, str(track.get('artist_id') or '') or None)
+        if track.get('album_name'):
+            self._observe('album', track['album_name'], score, str(track.get('album_id') or '') or None, artist_name)
+        tags = (track.get('musicinfo') or {}).get('tags') or {}
+        for key, kind in TAG_TYPES:
+            for name in tags.get(key) or []:
+                if name and isinstance(name, str):
+                    self._observe(kind, name, score)
+
+    def add(self, tracks, scores):
+        """加入 Jamendo 格式的音軌（scores 為每首音軌的熱門度）；每 LOCK_BATCH_SIZE 首釋放一次鎖，讓查詢插隊"""
+        pairs = list(zip(tracks, scores))
+        for offset in range(0, len(pairs), LOCK_BATCH_SIZE):
+            with self._lock:
+                for track, score in pairs[offset:offset + LOCK_BATCH_SIZE]:
+                    self._add_track(track, score)
+        self._evict()
+        with self._lock:
+            self._stats['updates'] += 1
+
+    def suggest(self, query, limit):
+        """與查詢的每個字詞都前綴相符的建議，依熱門度由高到低"""
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        # 最長的字詞通常最有鑑別度，以它的前綴表為候選
+        probe = max(tokens, key=len)
+        exact = len(tokens) == 1 and len(probe) <= MAX_PREFIX_LENGTH
+        with self._lock:
+            self._stats['queries'] += 1
+            results = []
+            for suggestion in self._prefixes.get(probe[:MAX_PREFIX_LENGTH], ()):
+                if exact or suggestion.matches(tokens):
+                    results.append(suggestion.as_dict())
+                    if len(results) >= limit:
+                        break
+            return results
+
+    def seed(self):
+        """從本地曲庫載入最近更新的音軌（熱門度一律為基本分；已在索引中的保留較高的熱門度）"""
+        start = time.perf_counter()
+        rows = Track.objects.order_by('-updated_at').values_list(
+            'jamendo_id', 'name', 'artist__jamendo_id', 'artist__name', 'album__jamendo_id', 'album__name',
+            KT('data__musicinfo__tags'),
+        )[:get_max_entries()]
+        count = 0
+        batch = []
+        for track_id, name, artist_id, artist_name, album_id, album_name, tags in rows.iterator(chunk_size=SEED_CHUNK_SIZE):
+            batch.append({
+                'id': track_id,
+                'name': name,
+                'artist_id': artist_id,
+                'artist_name': artist_name,
+                'album_id': album_id,
+                'album_name': album_name,
+                'musicinfo': {'tags': loads(tags) if tags else {}},
+            })
+            if len(batch) >= SEED_CHUNK_SIZE:
+                self.add(batch, [BASE_POPULARITY] * len(batch))
+                count += len(batch)
+                batch = []
+        self.add(batch, [BASE_POPULARITY] * len(batch))
+        count += len(batch)
+        self._stats['seed_ms'] = round((time.perf_counter() - start) * 1000, 1)
+        logger.info(f'搜尋建議索引已從本地曲庫載入 {count} 首音軌, {self._stats["seed_ms"]} ms')
+
+    def run_seed(self):
+        try:
+            self.seed()
+        except Exception as e:
+            logger.error(f'搜尋建議索引載入失敗: {str(e)}')
+        finally:
+            # 背景執行緒不經過請求週期：結束時關閉這個執行緒的資料庫連線
+            connection.close()
+
+    def ensure_seeded(self):
+        """第一次查詢時在專用的背景執行緒從本地曲庫載入（不阻塞這次查詢）"""
+        if self._seeded:
+            return
+        with self._lock:
+            if self._seeded:
+                return
+            self._seeded = True
+        threading.Thread(target=self.run_seed, name='jamendo-autocomplete-seed', daemon=True).start()
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._stats,
+                'suggestions': len(self._suggestions),
+                'prefixes': len(self._prefixes),
+                'max_entries': get_max_entries(),
+            }
+
+
+index = AutocompleteIndex()
+
+
+def collect_autocomplete(sender, endpoint, params, data, **kwargs):
+    """tracks_fetched 信號接收者：把上游取得的音軌收進搜尋建議索引"""
+    if endpoint.strip('/') != 'tracks' or not isinstance(data, dict):
+        return
+    results = data.get('results') or []
+    index.add(results, response_popularity(params, len(results)))
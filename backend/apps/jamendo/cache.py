@@ -0,0 +1,533 @@
+"""Jamendo 層使用的緩存後端
+
+- TieredCache：進程內 LRU（L1）在前，跨 worker 共用的緩存（L2）在後
+- SQLiteCache：不需要外部服務的 L2，同一台機器上的所有 worker 共用一個 SQLite 檔案（WAL 模式）
+
+L2 也可以換成 Django 內建的 RedisCache 等網路緩存（見 settings.CACHES）。
+"""
+import os
+import pickle
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+
+# Django 為每個執行緒建立各自的緩存後端實例；L1 與計數器需要整個進程共用
+_local_caches = {}
+_local_caches_lock = threading.Lock()
+
+
+class LocalLRU:
+    """進程內 L1：有 TTL、條目數與位元組上限的 LRU
+
+    值以 pickle 後的 bytes 保存（與 LocMemCache 相同，避免呼叫端修改共享物件），
+    也因此可以直接統計佔用的記憶體。
+    """
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'shared_hits': 0, 'shared_misses': 0}
+
+    def get_many(self, keys):
+        """返回 {key: value}，只包含未過期的命中項"""
+        now = time.time()
+        found = {}
+        with self._lock:
+            for key in keys:
+                item = self._data.get(key)
+                if item is None:
+                    continue
+                expires, pickled = item
+                if expires <= now:
+                    self._remove(key)
+                    continue
+                self._data.move_to_end(key)
+                found[key] = pickled
+            self._stats['hits'] += len(found)
+            self._stats['misses'] += len(keys) - len(found)
+        return {key: pickle.loads(pickled) for key, pickled in found.items()}
+
+    def set_many(self, items, expires):
+        """寫入 {key: value}，全部在 expires 到期；超過上限時淘汰最久未使用的項"""
+        self.set_many_expiring({key: (value, expires) for key, value in items.items()})
+
+    def set_many_expiring(self, items):
+        """寫入 {key: (value, 到期時間)}；超過上限時淘汰最久未使用的項"""
+        pickled_items = [
+            (key, expires, pickle.dumps(value, pickle.HIGHEST_PROTOCOL)) for key, (value, expires) in items.items()
+        ]
+        with self._lock:
+            for key, expires, pickled in pickled_items:
+                if len(pickled) > self.max_bytes:
+                    self._remove(key)
+                    continue
+                self._remove(key)
+                self._data[key] = (expires, pickled)
+                self._bytes += len(pickled)
+            while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._data)))
+                self._stats['evictions'] += 1
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._remove(key)
+
+    def _remove(self, key):
+        item = self._data.pop(key, None)
+        if item is not None:
+            self._bytes -= len(item[1])
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def record_shared(self, hits, misses):
+        with self._lock:
+            self._stats['shared_hits'] += hits
+            self._stats['shared_misses'] += misses
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._data),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                **self._stats,
+            }
+
+
+class TieredCache(BaseCache):
+    """兩層緩存：讀取先查 L1，未命中再查 L2 並回填 L1；寫入同時寫兩層
+
+    OPTIONS：
+    - SHARED：L2 的 CACHES 別名（SQLiteCache、RedisCache 等）
+    - MAX_ENTRIES / MAX_BYTES：L1 的條目數與位元組上限
+    - LOCAL_TTL：L1 副本最長保留秒數；其他 worker 寫入 L2 的新數據最晚在這段時間後可見
+
+    add 只在 L2 上執行（跨 worker 原子）；鎖一類必須讓所有 worker 立即看到的鍵請直接使用 shared。
+    """
+
+    def __init__(self, name, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = options.get('SHARED', 'shared')
+        self.local_ttl = float(options.get('LOCAL_TTL', 60))
+        with _local_caches_lock:
+            self.local = _local_caches.setdefault(name or 'default', LocalLRU(
+                int(options.get('MAX_ENTRIES', 10000)),
+                int(options.get('MAX_BYTES', 64 * 1024 * 1024)),
+            ))
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def local_expires(self, timeout):
+        """L1 副本的到期時間：不超過 L2 的到期時間，也不超過 LOCAL_TTL"""
+        expires = time.time() + self.local_ttl
+        backend_timeout = self.get_backend_timeout(timeout)
+        return expires if backend_timeout is None else min(expires, backend_timeout)
+
+    def get_many_local(self, keys, version=None):
+        """只查 L1，返回 {key: value}"""
+        made = {self.make_and_validate_key(key, version=version): key for key in keys}
+        return {made[key]: value for key, value in self.local.get_many(list(made)).items()}
+
+    def get_many_shared(self, keys, version=None):
+        """查 L2 並把命中項回填 L1，返回 {key: value}
+
+        回填的 L1 副本與 local_expires 相同，不超過 L2 的剩餘有效期，也不超過 LOCAL_TTL；
+        無法取得 L2 到期時間的後端只受 LOCAL_TTL 限制。
+        """
+        found = get_many_expiring(self.shared, keys, version=version)
+        self.local.record_shared(len(found), len(keys) - len(found))
+        if found:
+            local_expires = time.time() + self.local_ttl
+            self.local.set_many_expiring({
+                self.make_and_validate_key(key, version=version): (
+                    value, local_expires if expires is None else min(local_expires, expires),
+                )
+                for key, (value, expires) in found.items()
+            })
+        return {key: value for key, (value, _) in found.items()}
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = self.get_many_local(keys, version=version)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            found.update(self.get_many_shared(missing, version=version))
+        return found
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def has_key(self, key, version=None):
+        return bool(self.get_many_local([key], version=version)) or self.shared.has_key(key, version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version=version)
+        self.local.set_many(
+            {self.make_and_validate_key(key, version=version): value for key, value in data.items() if key not in failed},
+            self.local_expires(timeout),
+        )
+        return failed
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version=version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            self.local.delete_many([self.make_and_validate_key(key, version=version)])
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self.local.delete_many([self.make_and_validate_key(key, version=version)])
+        return self.shared.touch(key, timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self.local.delete_many([self.make_and_validate_key(key, version=version)])
+        return self.shared.incr(key, delta, version=version)
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        self.local.delete_many([self.make_and_validate_key(key, version=version) for key in keys])
+        self.shared.delete_many(keys, version=version)
+
+    def delete(self, key, version=None):
+        self.local.delete_many([self.make_and_validate_key(key, version=version)])
+        return self.shared.delete(key, version=version)
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
+
+    def stats(self):
+        local = self.local.stats()
+        shared = getattr(self.shared, 'stats', dict)()
+        return {
+            'l1': {
+                'entries': local['entries'],
+                'bytes': local['bytes'],
+                'max_entries': local['max_entries'],
+                'max_bytes': local['max_bytes'],
+                'hits': local['hits'],
+                'misses': local['misses'],
+                'hit_ratio': hit_ratio(local['hits'], local['misses']),
+                'evictions': local['evictions'],
+            },
+            'l2': {
+                'backend': type(self.shared).__name__,
+                **shared,
+                'hits': local['shared_hits'],
+                'misses': local['shared_misses'],
+                'hit_ratio': hit_ratio(local['shared_hits'], local['shared_misses']),
+            },
+        }
+
+
+class SQLiteCache(BaseCache):
+    """單機多進程共用的 SQLite 緩存後端；LOCATION 為資料庫檔案路徑
+
+    每個執行緒各自一個連線（非同步視圖會把同一個後端實例交給不同執行緒使用），
+    請求結束時不關閉，避免每個請求重新連線。
+    每 CULL_EVERY 次寫入檢查一次條目數：先刪除已過期項，仍超過 MAX_ENTRIES 時刪除最早到期的 1/CULL_FREQUENCY。
+    """
+
+    # SQLite 單一語句的參數數量上限為 999（舊版本）
+    CHUNK_SIZE = 500
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._cull_every = int(options.get('CULL_EVERY', 100))
+        self._writes = 0
+        self._local = threading.local()
+
+    @property
+    def connection(self):
+        if getattr(self._local, 'connection', None) is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self._path)), exist_ok=True)
+            connection = sqlite3.connect(self._path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL) WITHOUT ROWID'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)')
+            self._local.connection = connection
+        return self._local.connection
+
+    def get_many(self, keys, version=None):
+        return {key: value for key, (value, _) in self.get_many_expiring(keys, version=version).items()}
+
+    def get_many_expiring(self, keys, version=None):
+        """返回 {key: (value, 到期時間)}；永不過期的項到期時間為 None"""
+        made = {self.make_and_validate_key(key, version=version): key for key in keys}
+        made_keys = list(made)
+        found = {}
+        now = time.time()
+        for start in range(0, len(made_keys), self.CHUNK_SIZE):
+            chunk = made_keys[start:start + self.CHUNK_SIZE]
+            rows = self.connection.execute(
+                f"SELECT key, value, expires FROM cache WHERE key IN ({', '.join('?' * len(chunk))}) "
+                'AND (expires IS NULL OR expires > ?)',
+                [*chunk, now],
+            ).fetchall()
+            for key, value, expires in rows:
+                found[made[key]] = (pickle.loads(value), expires)
+        return found
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def has_key(self, key, version=None):
+        row = self.connection.execute(
+            'SELECT 1 FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            [self.make_and_validate_key(key, version=version), time.time()],
+        ).fetchone()
+        return row is not None
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        rows = [
+            (self.make_and_validate_key(key, version=version), pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires)
+            for key, value in data.items()
+        ]
+        with self.transaction() as connection:
+            connection.executemany('INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)', rows)
+        self._maybe_cull(len(rows))
+        return []
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version=version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        """不存在或已過期時寫入；跨進程原子（可作為鎖）"""
+        with self.transaction() as connection:
+            cursor = connection.execute(
+                'INSERT INTO cache (key, value, expires) VALUES (?, ?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires = excluded.expires '
+                'WHERE cache.expires IS NOT NULL AND cache.expires <= ?',
+                [
+                    self.make_and_validate_key(key, version=version),
+                    pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                    self.get_backend_timeout(timeout),
+                    time.time(),
+                ],
+            )
+        self._maybe_cull(1)
+        return cursor.rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        """在同一個寫入交易內讀取並寫回，跨進程原子（配額計數器等）"""
+        made_key = self.make_and_validate_key(key, version=version)
+        with self.transaction() as connection:
+            row = connection.execute(
+                'SELECT value FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)', [made_key, time.time()],
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            connection.execute(
+                'UPDATE cache SET value = ? WHERE key = ?', [pickle.dumps(value, pickle.HIGHEST_PROTOCOL), made_key],
+            )
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        with self.transaction() as connection:
+            cursor = connection.execute(
+                'UPDATE cache SET expires = ? WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                [self.get_backend_timeout(timeout), self.make_and_validate_key(key, version=version), time.time()],
+            )
+        return cursor.rowcount == 1
+
+    def delete_many(self, keys, version=None):
+        made_keys = [self.make_and_validate_key(key, version=version) for key in keys]
+        deleted = 0
+        with self.transaction() as connection:
+            for start in range(0, len(made_keys), self.CHUNK_SIZE):
+                chunk = made_keys[start:start + self.CHUNK_SIZE]
+                deleted += connection.execute(
+                    f"DELETE FROM cache WHERE key IN ({', '.join('?' * len(chunk))})", chunk,
+                ).rowcount
+        return deleted
+
+    def delete(self, key, version=None):
+        return self.delete_many([key], version=version) > 0
+
+    def iter_made_keys(self, made_prefix):
+        """逐批列出以 made_prefix 開頭、未過期的已加前綴鍵（主鍵範圍查詢，不一次載入全部）"""
+        cursor = self.connection.execute(
+            'SELECT key FROM cache WHERE key >= ? AND key < ? AND (expires IS NULL OR expires > ?) ORDER BY key',
+            [made_prefix, made_prefix + '\uffff', time.time()],
+        )
+        while True:
+            rows = cursor.fetchmany(self.CHUNK_SIZE)
+            if not rows:
+                return
+            for (key,) in rows:
+                yield key
+
+    def clear(self):
+        with self.transaction() as connection:
+            connection.execute('DELETE FROM cache')
+
+    def transaction(self):
+        return _Transaction(self.connection)
+
+    def _maybe_cull(self, writes):
+        self._writes += writes
+        if self._writes < self._cull_every:
+            return
+        self._writes = 0
+        with self.transaction() as connection:
+            connection.execute('DELETE FROM cache WHERE expires <= ?', [time.time()])
+            count = connection.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+            if count > self._max_entries:
+                connection.execute(
+                    'DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY expires IS NULL, expires LIMIT ?)',
+                    [max(count - self._max_entries, count // self._cull_frequency)],
+                )
+
+    def stats(self):
+        """條目數與檔案大小（包括 WAL）"""
+        count = self.connection.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        size = sum(
+            os.path.getsize(path)
+            for path in (self._path, f'{self._path}-wal')
+            if os.path.exists(path)
+        )
+        return {'entries': count, 'bytes': size, 'max_entries': self._max_entries}
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE 寫入交易：多個 worker 同時寫入時在 busy timeout 內排隊"""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute('BEGIN IMMEDIATE')
+        return self.connection
+
+    def __exit__(self, exc_type, exc, tb):
+        self.connection.execute('ROLLBACK' if exc_type else 'COMMIT')
+
+
+def hit_ratio(hits, misses):
+    total = hits + misses
+    return round(hits / total, 4) if total else None
+
+def default_cache():
+    return caches['default']
+
+def shared_cache():
+    """跨 worker 共用的緩存層：分層緩存時為 L2，否則即預設緩存
+
+    鎖一類必須讓所有 worker 立即看到的鍵只能放在這一層。
+    """
+    return getattr(default_cache(), 'shared', default_cache())
+
+def cache_stats():
+    """各緩存層的命中率與記憶體用量；非分層緩存時只返回後端名稱"""
+    backend = default_cache()
+    if isinstance(backend, TieredCache):
+        return backend.stats()
+    return {'backend': type(backend).__name__}
+
+def get_many_expiring(backend, keys, version=None):
+    """讀取 {key: (value, 到期時間)}；永不過期或後端無法提供到期時間時為 None
+
+    支援 SQLiteCache、RedisCache 與 LocMemCache；其他後端只讀取值。
+    """
+    if isinstance(backend, SQLiteCache):
+        return backend.get_many_expiring(keys, version=version)
+    found = backend.get_many(keys, version=version)
+    if not found:
+        return {}
+    made_keys = {key: backend.make_and_validate_key(key, version=version) for key in found}
+    expiries = {}
+    if isinstance(backend, RedisCache):
+        client = backend._cache.get_client(write=False)
+        pipeline = client.pipeline(transaction=False)
+        for made_key in made_keys.values():
+            pipeline.pttl(made_key)
+        now = time.time()
+        # pttl 返回剩餘毫秒數；-1 表示永不過期，-2 表示已不存在（到期時間設為現在，不回填 L1）
+        for key, ttl in zip(made_keys, pipeline.execute()):
+            expiries[key] = None if ttl == -1 else now + max(ttl, 0) / 1000
+    elif isinstance(backend, LocMemCache):
+        with backend._lock:
+            for key, made_key in made_keys.items():
+                expiries[key] = backend._expire_info.get(made_key)
+    return {key: (value, expiries.get(key)) for key, value in found.items()}
+
+def iter_cache_keys(prefix, backend=None):
+    """列出跨 worker 緩存中以 prefix 開頭的鍵（呼叫端使用的原始鍵）
+
+    分層緩存列舉 L2（L1 只是其中一部分的副本）。支援 SQLiteCache、RedisCache 與 LocMemCache，
+    其他後端或自訂 KEY_FUNCTION 無法還原原始鍵時不返回任何鍵。
+    """
+    backend = backend or shared_cache()
+    if isinstance(backend, TieredCache):
+        backend = backend.shared
+    head = backend.make_key('')
+    if backend.make_key(prefix) != head + prefix:
+        return
+    made_prefix = head + prefix
+
+    if isinstance(backend, SQLiteCache):
+        made_keys = backend.iter_made_keys(made_prefix)
+    elif isinstance(backend, RedisCache):
+        pattern = re.sub(r'([*?\[\]\\])', r'\\\1', made_prefix) + '*'
+        client = backend._cache.get_client(write=False)
+        made_keys = (key.decode() for key in client.scan_iter(match=pattern, count=1000))
+    elif isinstance(backend, LocMemCache):
+        with backend._lock:
+            made_keys = [key for key in backend._cache if key.startswith(made_prefix)]
+    else:
+        return
+    for made_key in made_keys:
+        yield made_key[len(head):]
+
+def is_in_process_cache(backend=None):
+    """緩存是否為進程內記憶體緩存（呼叫不會阻塞）"""
+    return isinstance(backend or default_cache(), LocMemCache)
+
+async def acache_call(method, *args, backend=None):
+    """在非同步視圖中呼叫緩存方法
+
+    進程內緩存直接呼叫；其他後端交給執行緒池，避免阻塞事件迴圈，
+    也避免 Django 預設 aget/aset 走 thread_sensitive 單執行緒而互相排隊。
+    分層緩存的讀取先在事件迴圈內查 L1，只有 L1 未命中的鍵才交給執行緒池查 L2。
+    """
+    backend = backend or default_cache()
+    if is_in_process_cache(backend):
+        return getattr(backend, method)(*args)
+    if isinstance(backend, TieredCache) and method in ('get', 'get_many'):
+        keys = [args[0]] if method == 'get' else list(args[0])
+        found = backend.get_many_local(keys)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            found.update(await sync_to_async(backend.get_many_shared, thread_sensitive=False)(missing))
+        if method == 'get':
+            return found.get(args[0], args[1] if len(args) > 1 else None)
+        return found
+    return await sync_to_async(getattr(backend, method), thread_sensitive=False)(*args)
@@ -0,0 +1,238 @@
+import logging
+import os
+import random
+import threading
+import time
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from .governor import QuotaExceeded, governor
+from .metrics import observe_upstream, upstream_responses
+
+logger = logging.getLogger(__name__)
+
+# Jamendo API 配置
+JAMENDO_API_BASE = 'https://api.jamendo.com/v3.0'
+
+# 可重試的上游狀態碼
+RETRY_STATUS_CODES = frozenset({500, 502, 503, 504})
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def get_client_setting(name, default):
+    """動態讀取客戶端設定，避免在模組載入時訪問 settings"""
+    try:
+        from django.conf import settings
+        return getattr(settings, name, default)
+    except:
+        return default
+
+class CircuitOpenError(requests.exceptions.ConnectionError, httpx.TransportError):
+    """斷路器開啟期間拒絕請求上游
+
+    同時是 requests 與 httpx 的連線錯誤，呼叫端既有的錯誤處理（視為上游不可用）不必修改。
+    """
+
+
+class CircuitBreaker:
+    """Jamendo 上游斷路器
+
+    連續失敗（網路錯誤、逾時、5xx）達 JAMENDO_BREAKER_THRESHOLD 次後斷開：
+    JAMENDO_BREAKER_RESET 秒內的上游請求直接拋出 CircuitOpenError，不佔用 worker 等待逾時；
+    時間到後進入半開狀態，只放行一個試探請求，成功即恢復、失敗則再次斷開。
+    狀態為每個進程各自一份，同步與非同步客戶端共用。
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._stats = {'trips': 0, 'rejected': 0}
+
+    def allow(self):
+        """是否可以請求上游；半開狀態同時只放行一個試探請求"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                reset = float(get_client_setting('JAMENDO_BREAKER_RESET', 30))
+                if time.monotonic() - self._opened_at < reset:
+                    self._stats['rejected'] += 1
+                    return False
+                self._state = self.HALF_OPEN
+            if self._trial_in_flight:
+                self._stats['rejected'] += 1
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info('Jamendo 上游已恢復，斷路器關閉')
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._trial_in_flight = False
+            self._failures += 1
+            threshold = int(get_client_setting('JAMENDO_BREAKER_THRESHOLD', 5))
+            if self._state == self.HALF_OPEN or (self._state == self.CLOSED and self._failures >= threshold):
+                logger.warning(f'Jamendo 上游連續失敗 {self._failures} 次，斷路器開啟')
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._stats['trips'] += 1
+
+    def release_trial(self):
+        """試探請求被取消（沒有結果）時釋放名額，讓下一個請求試探"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_response(self, status_code):
+        """5xx 視為上游故障；其他狀態碼（包括 4xx）代表上游正常回應"""
+        if status_code in RETRY_STATUS_CODES:
+            self.record_failure()
+        else:
+            self.record_success()
+
+    @property
+    def state(self):
+        return self._state
+
+    def stats(self):
+        with self._lock:
+            return {'state': self._state, 'consecutive_failures': self._failures, **self._stats}
+
+
+breaker = CircuitBreaker()
+
+
+def get_jamendo_client_id():
+    """動態獲取 Jamendo Client ID，避免在模組載入時訪問 settings"""
+    try:
+        from django.conf import settings
+        return getattr(settings, 'JAMENDO_CLIENT_ID', None) or os.getenv('JAMENDO_CLIENT_ID', '93957ee4')
+    except:
+        return os.getenv('JAMENDO_CLIENT_ID', '93957ee4')
+
+def get_jamendo_headers():
+    """獲取 Jamendo API 請求標頭"""
+    return {
+        'User-Agent': 'DDM360-Music-Streaming/1.0',
+        'Accept': 'application/json',
+    }
+
+def get_api_base():
+    """Jamendo API 基礎網址，可用 JAMENDO_API_BASE 覆寫（例如指向本地 stub）"""
+    return get_client_setting('JAMENDO_API_BASE', None) or JAMENDO_API_BASE
+
+def get_timeouts():
+    """(連線逾時, 讀取逾時)，分開設定避免慢上游長時間佔住 worker"""
+    return (
+        float(get_client_setting('JAMENDO_CONNECT_TIMEOUT', 3.05)),
+        float(get_client_setting('JAMENDO_READ_TIMEOUT', 8)),
+    )
+
+def get_session():
+    """獲取本進程共用的 keep-alive Session（fork 後會重新建立）"""
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                pool_size = int(get_client_setting('JAMENDO_POOL_SIZE', 20))
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+                session = requests.Session()
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                session.headers.update(get_jamendo_headers())
+                _session, _session_pid = session, pid
+    return _session
+
+def backoff_delay(attempt):
+    """指數退避加隨機抖動，避免多個 worker 同步重試"""
+    base = float(get_client_setting('JAMENDO_RETRY_BACKOFF', 0.3))
+    return random.uniform(0, base * (2 ** attempt))
+
+def build_params(params):
+    """添加必要的參數"""
+    return {
+        'client_id': get_jamendo_client_id(),
+        'format': 'json',
+        **params
+    }
+
+def jamendo_get(endpoint, params):
+    """對 Jamendo 發出 GET 請求，遇到 5xx 或逾時會有限次數地重試
+
+    回傳最後一次的 Response；所有嘗試都發生網路錯誤時拋出 RequestException。
+    斷路器開啟時不請求上游，直接拋出 CircuitOpenError；
+    配額或並發名額不足、排隊逾時則拋出 QuotaExceeded（見 governor）。
+    """
+    return guarded_request(endpoint, lambda: send_with_retries(endpoint, params))
+
+def jamendo_stream(url, headers):
+    """以 stream=True 抓取 Jamendo 的音訊檔案（不重試），返回 Response
+
+    音訊與 API 請求打的是同一個上游：共用斷路器、配額與並發名額，指標以 audio 為端點標籤。
+    名額只在送出請求、收到響應標頭之前佔用，讀取響應內容不佔用。
+    """
+    return guarded_request('audio', lambda: get_session().get(url, headers=headers, timeout=get_timeouts(), stream=True))
+
+def guarded_request(endpoint, send):
+    """經過斷路器與 governor 執行 send()，記錄上游指標並依結果更新斷路器"""
+    if not breaker.allow():
+        upstream_responses.inc(endpoint.strip('/'), 'circuit_open')
+        raise CircuitOpenError('Jamendo 上游斷路器開啟中')
+    try:
+        with governor.admit(), observe_upstream(endpoint) as outcome:
+            try:
+                response = send()
+            except Exception:
+                breaker.record_failure()
+                raise
+            outcome['status'] = response.status_code
+    except QuotaExceeded:
+        # 被本服務限流（只會發生在送出之前），不是上游故障：不計入斷路器
+        breaker.release_trial()
+        upstream_responses.inc(endpoint.strip('/'), 'shed')
+        raise
+    breaker.record_response(response.status_code)
+    return response
+
+def send_with_retries(endpoint, params):
+    final_params = build_params(params)
+    url = f'{get_api_base()}/{endpoint.lstrip("/")}'
+    max_retries = int(get_client_setting('JAMENDO_MAX_RETRIES', 2))
+    timeouts = get_timeouts()
+    session = get_session()
+
+    for attempt in range(max_retries + 1):
+        last_attempt = attempt == max_retries
+        try:
+            logger.info(f'Jamendo API 請求: {url} with params: {final_params}')
+            response = session.get(url, params=final_params, timeout=timeouts)
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+            if last_attempt or not governor.allow_retry():
+                raise
+            logger.warning(f'Jamendo API 請求失敗，準備重試 ({attempt + 1}/{max_retries}): {str(e)}')
+            if not governor.backoff(backoff_delay(attempt)):
+                raise
+        else:
+            if response.status_code not in RETRY_STATUS_CODES or last_attempt or not governor.allow_retry():
+                return response
+            logger.warning(f'Jamendo API 回應 {response.status_code}，準備重試 ({attempt + 1}/{max_retries})')
+            if not governor.backoff(backoff_delay(attempt)):
+                return response
@@ -0,0 +1,393 @@
+"""Jamendo 上游的准入控制：所有 worker 共用一個配額令牌桶，每個 worker 有並發上限，請求分優先順序
+
+- 配額：跨 worker 緩存（shared_cache）中的一個計數器記錄已用掉的令牌，可用量以 JAMENDO_QUOTA_RATE
+  隨時間增長、最多累積 JAMENDO_QUOTA_BURST 個。取令牌是一次原子 incr；令牌不足時等於預約了
+  下一個令牌，等到它產生即可送出，等待超過期限則退回預約並拒絕
+- 並發：每個 worker 同時進行的上游請求最多 JAMENDO_MAX_CONCURRENCY 個，超過時排隊；
+  重試前的退避期間釋放名額，退避後重新排隊（見 backoff），上游變慢時重試不會佔住名額
+- 優先順序分三級：
+  - interactive：音軌詳情、搜尋等使用者正在等待單一結果的請求（預設）
+  - browse：列表頁（標籤、熱門、最新）與隨機池的同步補充；與背景工作合計最多使用四分之三的並發名額，
+    只取用桶內超過 JAMENDO_QUOTA_BROWSE_RESERVE 的令牌，配額緊張時讓給 interactive
+  - background：預熱、預取、背景刷新等背景工作，最多使用一半的並發名額，
+    只取用桶內超過 JAMENDO_QUOTA_BACKGROUND_RESERVE 的令牌，排隊期限也較長
+
+被拒絕時拋出 QuotaExceeded（同時是 requests 與 httpx 的連線錯誤）：有舊緩存時返回舊數據，
+否則由 ApiAdmissionMiddleware 轉成 503。
+"""
+import asyncio
+import contextvars
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+
+import httpx
+import requests
+from django.conf import settings
+
+from .cache import acache_call, shared_cache
+from .metrics import upstream_admissions
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 'interactive'
+BROWSE = 'browse'
+BACKGROUND = 'background'
+
+QUOTA_KEY = 'jamendo_quota_consumed'
+# 計數器以千分之一個令牌為單位，每秒速率可以不是整數
+TOKEN_UNITS = 1000
+
+_priority = contextvars.ContextVar('jamendo_upstream_priority', default=INTERACTIVE)
+# 目前 admit 區塊的優先順序與是否持有並發名額（退避期間不持有）
+_admission = contextvars.ContextVar('jamendo_upstream_admission', default=None)
+
+
+class QuotaExceeded(requests.exceptions.ConnectionError, httpx.TransportError):
+    """上游配額或並發名額不足，排隊超過期限；retry_after 為預計可以重試的秒數"""
+
+    def __init__(self, message, retry_after=1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def current_priority():
+    return _priority.get()
+
+@contextmanager
+def background_priority():
+    """區塊內（同一執行緒或 task）的上游請求以背景優先順序送出"""
+    token = _priority.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+@contextmanager
+def browse_priority():
+    """區塊內的上游請求以列表優先順序送出；已在背景優先順序中時維持背景"""
+    if _priority.get() != INTERACTIVE:
+        yield
+        return
+    token = _priority.set(BROWSE)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class QuotaBucket:
+    """跨 worker 共用的令牌桶；JAMENDO_QUOTA_RATE 為 0 時不限流
+
+    計數器記錄累計用掉的令牌，可用量 = rate × 現在時間 − 計數器。閒置太久時可用量會超過桶容量，
+    取令牌時把計數器補到桶滿的位置。並發補齊可能多補一次，結果只會更保守。
+    緩存不可用時不限流。
+    """
+
+    def rate(self):
+        return float(getattr(settings, 'JAMENDO_QUOTA_RATE', 0))
+
+    def burst(self):
+        return max(1.0, float(getattr(settings, 'JAMENDO_QUOTA_BURST', 20)))
+
+    def reserve(self, priority):
+        """列表與背景工作取令牌後桶內至少要留下的令牌（單位）"""
+        if priority == INTERACTIVE:
+            return 0
+        if priority == BROWSE:
+            fraction = float(getattr(settings, 'JAMENDO_QUOTA_BROWSE_RESERVE', 0.2))
+        else:
+            fraction = float(getattr(settings, 'JAMENDO_QUOTA_BACKGROUND_RESERVE', 0.5))
+        return self.burst() * fraction * TOKEN_UNITS
+
+    def plan(self, consumed, priority, now):
+        """incr 之後的計數器 → (要補齊的單位, 令牌產生前要等待的秒數)"""
+        rate = self.rate() * TOKEN_UNITS
+        capacity = now * rate
+        floor = capacity - self.burst() * TOKEN_UNITS
+        lift = 0
+        if consumed - TOKEN_UNITS < floor:
+            lift = math.ceil(floor - (consumed - TOKEN_UNITS))
+            consumed += lift
+        return lift, max((consumed + self.reserve(priority) - capacity) / rate, 0.0)
+
+    def take(self, priority, timeout):
+        """取一個令牌，需要時等待；要等超過 timeout 秒時退回預約並拋出 QuotaExceeded。返回等待的秒數"""
+        if self.rate() <= 0:
+            return 0.0
+        backend = shared_cache()
+        try:
+            try:
+                consumed = backend.incr(QUOTA_KEY, TOKEN_UNITS)
+            except ValueError:
+                # 計數器不存在（第一次使用或被淘汰）：從桶滿開始
+                backend.add(QUOTA_KEY, 0, None)
+                consumed = backend.incr(QUOTA_KEY, TOKEN_UNITS)
+            lift, wait = self.plan(consumed, priority, time.time())
+            if lift:
+                backend.incr(QUOTA_KEY, lift)
+            if wait > timeout:
+                backend.decr(QUOTA_KEY, TOKEN_UNITS)
+        except Exception as e:
+            logger.warning(f'上游配額計數失敗，本次不限流: {str(e)}')
+            return 0.0
+        if wait > timeout:
+            raise QuotaExceeded('Jamendo 上游配額不足', retry_after=wait)
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    async def atake(self, priority, timeout):
+        """take 的非同步版本"""
+        if self.rate() <= 0:
+            return 0.0
+        backend = shared_cache()
+        try:
+            try:
+                consumed = await acache_call('incr', QUOTA_KEY, TOKEN_UNITS, backend=backend)
+            except ValueError:
+                await acache_call('add', QUOTA_KEY, 0, None, backend=backend)
+                consumed = await acache_call('incr', QUOTA_KEY, TOKEN_UNITS, backend=backend)
+            lift, wait = self.plan(consumed, priority, time.time())
+            if lift:
+                await acache_call('incr', QUOTA_KEY, lift, backend=backend)
+            if wait > timeout:
+                await acache_call('decr', QUOTA_KEY, TOKEN_UNITS, backend=backend)
+        except Exception as e:
+            logger.warning(f'上游配額計數失敗，本次不限流: {str(e)}')
+            return 0.0
+        if wait > timeout:
+            raise QuotaExceeded('Jamendo 上游配額不足', retry_after=wait)
+        if wait:
+            await asyncio.sleep(wait)
+        return wait
+
+
+class WorkerSlots:
+    """每個 worker 的上游並發名額；列表與背景工作合計最多使用四分之三、背景工作最多使用一半，其餘留給 interactive"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._in_flight = {INTERACTIVE: 0, BROWSE: 0, BACKGROUND: 0}
+
+    def capacity(self):
+        return max(1, int(getattr(settings, 'JAMENDO_MAX_CONCURRENCY', 16)))
+
+    def _available(self, priority):
+        capacity = self.capacity()
+        if sum(self._in_flight.values()) >= capacity:
+            return False
+        if priority == INTERACTIVE:
+            return True
+        if self._in_flight[BROWSE] + self._in_flight[BACKGROUND] >= capacity - capacity // 4:
+            return False
+        return priority == BROWSE or self._in_flight[BACKGROUND] < max(1, capacity // 2)
+
+    def try_acquire(self, priority):
+        with self._cond:
+            if not self._available(priority):
+                return False
+            self._in_flight[priority] += 1
+            return True
+
+    def acquire(self, priority, timeout):
+        """等待名額，最多 timeout 秒；逾時返回 False"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._available(priority), timeout):
+                return False
+            self._in_flight[priority] += 1
+            return True
+
+    async def aacquire(self, priority, timeout):
+        """acquire 的非同步版本：與同步呼叫端共用同一組名額，以短間隔輪詢，不阻塞事件迴圈"""
+        deadline = time.monotonic() + timeout
+        delay = 0.005
+        while not self.try_acquire(priority):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.05)
+        return True
+
+    def release(self, priority):
+        with self._cond:
+            self._in_flight[priority] -= 1
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {'capacity': self.capacity(), 'in_flight': dict(self._in_flight)}
+
+
+class UpstreamGovernor:
+    """上游請求的准入：先取得本 worker 的並發名額，再取得共用配額的令牌"""
+
+    def __init__(self):
+        self.slots = WorkerSlots()
+        self.bucket = QuotaBucket()
+
+    def queue_timeout(self, priority):
+        """排隊（等名額加上等令牌）的最長秒數；列表請求也有使用者在等待"""
+        if priority != BACKGROUND:
+            return float(getattr(settings, 'JAMENDO_QUEUE_TIMEOUT', 2))
+        return float(getattr(settings, 'JAMENDO_BACKGROUND_QUEUE_TIMEOUT', 30))
+
+    def shed(self, priority, message, retry_after):
+        upstream_admissions.inc(priority, 'shed')
+        return QuotaExceeded(message, retry_after=retry_after)
+
+    @contextmanager
+    def admit(self):
+        """放行一個上游請求（含重試），期間佔用一個並發名額；排隊逾時拋出 QuotaExceeded"""
+        priority = _priority.get()
+        deadline = time.monotonic() + self.queue_timeout(priority)
+        queued = not self.slots.try_acquire(priority)
+        if queued and not self.slots.acquire(priority, self.queue_timeout(priority)):
+            raise self.shed(priority, 'Jamendo 上游並發已滿', 1.0)
+        try:
+            waited = self.bucket.take(priority, max(deadline - time.monotonic(), 0.0))
+        except QuotaExceeded as e:
+            self.slots.release(priority)
+            raise self.shed(priority, str(e), e.retry_after)
+        upstream_admissions.inc(priority, 'queued' if queued or waited else 'admitted')
+        admission = {'priority': priority, 'held': True}
+        token = _admission.set(admission)
+        try:
+            yield
+        finally:
+            _admission.reset(token)
+            if admission['held']:
+                self.slots.release(priority)
+
+    @asynccontextmanager
+    async def aadmit(self):
+        """admit 的非同步版本"""
+        priority = _priority.get()
+        deadline = time.monotonic() + self.queue_timeout(priority)
+        queued = not self.slots.try_acquire(priority)
+        if queued and not await self.slots.aacquire(priority, self.queue_timeout(priority)):
+            raise self.shed(priority, 'Jamendo 上游並發已滿', 1.0)
+        try:
+            waited = await self.bucket.atake(priority, max(deadline - time.monotonic(), 0.0))
+        except QuotaExceeded as e:
+            self.slots.release(priority)
+            raise self.shed(priority, str(e), e.retry_after)
+        upstream_admissions.inc(priority, 'queued' if queued or waited else 'admitted')
+        admission = {'priority': priority, 'held': True}
+        token = _admission.set(admission)
+        try:
+            yield
+        finally:
+            _admission.reset(token)
+            if admission['held']:
+                self.slots.release(priority)
+
+    def backoff(self, seconds):
+        """重試前的退避：等待期間釋放並發名額，之後重新排隊取得；排隊逾時返回 False（放棄重試）"""
+        admission = _admission.get()
+        if admission is None:
+            time.sleep(seconds)
+            return True
+        priority = admission['priority']
+        admission['held'] = False
+        self.slots.release(priority)
+        time.sleep(seconds)
+        if not self.slots.acquire(priority, self.queue_timeout(priority)):
+            upstream_admissions.inc(priority, 'retry_skipped')
+            return False
+        admission['held'] = True
+        return True
+
+    async def abackoff(self, seconds):
+        """backoff 的非同步版本"""
+        admission = _admission.get()
+        if admission is None:
+            await asyncio.sleep(seconds)
+            return True
+        priority = admission['priority']
+        admission['held'] = False
+        self.slots.release(priority)
+        await asyncio.sleep(seconds)
+        if not await self.slots.aacquire(priority, self.queue_timeout(priority)):
+            upstream_admissions.inc(priority, 'retry_skipped')
+            return False
+        admission['held'] = True
+        return True
+
+    def allow_retry(self):
+        """重試也要消耗令牌，但不等待：令牌不足時放棄重試"""
+        try:
+            self.bucket.take(_priority.get(), 0.0)
+            return True
+        except QuotaExceeded:
+            upstream_admissions.inc(_priority.get(), 'retry_skipped')
+            return False
+
+    async def aallow_retry(self):
+        """allow_retry 的非同步版本"""
+        try:
+            await self.bucket.atake(_priority.get(), 0.0)
+            return True
+        except QuotaExceeded:
+            upstream_admissions.inc(_priority.get(), 'retry_skipped')
+            return False
+
+    def stats(self):
+        return {
+            **self.slots.stats(),
+            'quota_rate': self.bucket.rate(),
+            'quota_burst': self.bucket.burst(),
+        }
+
+
+governor = UpstreamGovernor()
+
+
+class ClientThrottle:
+    """本服務 api/jamendo/ 的每客戶端令牌桶（API_THROTTLE_RATE 為 0 時不限流）
+
+    每個 worker 各自計算，只保留最近出現的 MAX_CLIENTS 個客戶端。
+    """
+    MAX_CLIENTS = 10000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+
+    def check(self, client):
+        """取一個令牌；不足時返回需要等待的秒數，否則返回 0"""
+        rate = float(getattr(settings, 'API_THROTTLE_RATE', 0))
+        if rate <= 0:
+            return 0.0
+        burst = max(1.0, float(getattr(settings, 'API_THROTTLE_BURST', 60)))
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(client, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / rate
+            self._buckets[client] = (tokens, now)
+            if len(self._buckets) > self.MAX_CLIENTS:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+client_throttle = ClientThrottle()
+
+
+def client_address(request):
+    """客戶端位址：經過 API_THROTTLE_TRUSTED_PROXIES 層反向代理時取 X-Forwarded-For 中對應的一項"""
+    proxies = int(getattr(settings, 'API_THROTTLE_TRUSTED_PROXIES', 0))
+    if proxies:
+        forwarded = [address.strip() for address in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')]
+        forwarded = [address for address in forwarded if address]
+        if forwarded:
+            return forwarded[-min(proxies, len(forwarded))]
+    return request.META.get('REMOTE_ADDR', '')
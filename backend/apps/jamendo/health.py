@@ -0,0 +1,84 @@
+"""Jamendo 上游健康狀態：背景執行緒定期探測，health_check 只讀取紀錄的結果
+
+負載平衡器的健康檢查因此不會觸發上游請求，也不會因上游逾時而卡住。
+探測請求同樣經過斷路器：斷路器開啟時不打上游，時間到後由探測（或一般請求）負責半開試探。
+"""
+import logging
+import threading
+import time
+
+import requests
+
+from .client import breaker, get_client_setting, jamendo_get
+from .governor import QuotaExceeded, background_priority
+
+logger = logging.getLogger(__name__)
+
+
+class UpstreamProbe:
+    """定期以 tracks?limit=1 探測上游，保留最近一次的結果"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._state = {'ok': None, 'latency_ms': None, 'error': None, 'checked_at': None}
+
+    def interval(self):
+        return float(get_client_setting('JAMENDO_HEALTH_PROBE_INTERVAL', 30))
+
+    def probe(self):
+        """探測一次並記錄結果（配額不足而未送出時不更新）"""
+        start = time.monotonic()
+        try:
+            with background_priority():
+                response = jamendo_get('tracks', {'limit': 1})
+            ok = response.status_code == 200
+            error = None if ok else f'HTTP {response.status_code}'
+        except QuotaExceeded:
+            return  # 配額留給使用者請求；保留上一次的結果
+        except requests.exceptions.RequestException as e:
+            ok, error = False, str(e)
+        with self._lock:
+            self._state = {
+                'ok': ok,
+                'latency_ms': round((time.monotonic() - start) * 1000, 1),
+                'error': error,
+                'checked_at': time.time(),
+            }
+
+    def run(self):
+        while True:
+            try:
+                self.probe()
+            except Exception as e:
+                logger.error(f'上游健康探測異常: {str(e)}')
+            time.sleep(self.interval())
+
+    def ensure_started(self):
+        """第一次讀取狀態時才啟動背景執行緒（每個進程一個）"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self.run, name='jamendo-health-probe', daemon=True)
+                self._thread.start()
+
+    def status(self):
+        """最近一次探測結果；status 為 healthy / degraded / starting"""
+        self.ensure_started()
+        with self._lock:
+            state = dict(self._state)
+        if state['ok'] is None:
+            status = 'starting'
+        elif state['ok'] and breaker.state == breaker.CLOSED:
+            status = 'healthy'
+        else:
+            status = 'degraded'
+        age = time.time() - state['checked_at'] if state['checked_at'] else None
+        return {
+            'status': status,
+            **state,
+            'age_seconds': round(age, 1) if age is not None else None,
+            'breaker': breaker.stats(),
+        }
+
+
+probe = UpstreamProbe()
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from apps.jamendo.snapshot import dump_snapshot, get_snapshot_path
+
+
+class Command(BaseCommand):
+    help = (
+        '把 Jamendo 緩存（音軌實體、列表與搜尋結果）與本地曲庫寫成 gzip 壓縮的快照，'
+        '部署後以 load_jamendo_snapshot 或 JAMENDO_SNAPSHOT_ON_BOOT 載入。'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help='快照檔案路徑（預設 JAMENDO_SNAPSHOT_PATH）')
+        parser.add_argument('--no-catalog', action='store_true', help='只匯出緩存，不包括本地曲庫')
+
+    def handle(self, *args, **options):
+        path = options['path'] or get_snapshot_path()
+        report = dump_snapshot(path, include_catalog=not options['no_catalog'])
+        self.stdout.write(self.style.SUCCESS(
+            f"快照 {path}: {report['cache']} 個緩存項, {report['track']} 首曲庫音軌, "
+            f"{report['bytes'] / 1024:.0f} KB, 耗時 {report['elapsed']:.2f}s"
+        ))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.jamendo.snapshot import SnapshotError, get_snapshot_path, load_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        '載入 dump_jamendo_snapshot 產生的快照到緩存與本地曲庫。'
+        '版本或上游不符、或超過 JAMENDO_SNAPSHOT_MAX_AGE 的快照會被拒絕；緩存中較新的項目不會被覆蓋。'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help='快照檔案路徑（預設 JAMENDO_SNAPSHOT_PATH）')
+        parser.add_argument('--no-catalog', action='store_true', help='只載入緩存，不寫入本地曲庫')
+
+    def handle(self, *args, **options):
+        path = options['path'] or get_snapshot_path()
+        try:
+            report = load_snapshot(path, include_catalog=not options['no_catalog'])
+        except SnapshotError as e:
+            raise CommandError(str(e))
+
+        summary = (
+            f"載入 {path}: {report['cache']} 個緩存項, {report['kept']} 項保留現有, "
+            f"{report['expired']} 項已過期, {report['track']} 首曲庫音軌; 耗時 {report['elapsed']:.2f}s"
+        )
+        if report['failed']:
+            self.stdout.write(self.style.WARNING(f"{summary}, {report['failed']} 首寫入曲庫失敗"))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from apps.jamendo.warmup import warm_cache
+
+
+class Command(BaseCommand):
+    help = (
+        '預熱 Jamendo 緩存：以有限並發抓取熱門、最新與各推薦曲風列表並寫入緩存。'
+        '緩存後端需為跨進程共用（見 CACHES 設定），進程內緩存請改用 JAMENDO_WARM_ON_BOOT。'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, help='每個列表預熱的規範頁數（預設 JAMENDO_WARM_PAGES）')
+        parser.add_argument('--genres', nargs='+', help='只預熱指定曲風（預設全部推薦曲風）')
+        parser.add_argument('--concurrency', type=int, help='同時進行的上游請求數（預設 JAMENDO_WARM_CONCURRENCY）')
+        parser.add_argument('--force', action='store_true', help='即使緩存仍新鮮也重新抓取')
+
+    def handle(self, *args, **options):
+        report = warm_cache(
+            pages=options['pages'],
+            genres=options['genres'],
+            concurrency=options['concurrency'],
+            force=options['force'],
+        )
+
+        if options['verbosity'] > 1:
+            for name, status, elapsed in report['results']:
+                self.stdout.write(f'{status:>8}  {elapsed * 1000:8.1f} ms  {name}')
+
+        summary = (
+            f"預熱 {report['targets']} 項: {report['fetched']} 項抓取, {report['hit']} 項已在緩存, "
+            f"{report['failed']} 項失敗; 覆蓋率 {report['coverage']:.0%}, 耗時 {report['elapsed']:.2f}s"
+        )
+        if report['failed']:
+            self.stdout.write(self.style.WARNING(summary))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
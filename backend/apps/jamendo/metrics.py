@@ -0,0 +1,192 @@
+"""進程內的請求與上游指標，以 Prometheus 文字格式輸出（api/jamendo/metrics/）
+
+記錄路徑上不取鎖：每個執行緒累加到自己的分片，只有輸出時才合併所有分片。
+非同步視圖都在事件迴圈執行緒上執行，同一分片的累加之間沒有 await，也不會互相覆蓋。
+
+指標是每個 worker 各自一份；多 worker 部署時每次抓取只會看到其中一個 worker。
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# 延遲（秒）與大小（位元組）的預設分桶
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+_registry = []
+_collectors = []
+
+
+class _Shards:
+    """每個執行緒各自一份的 {標籤: 數值}；讀取時才合併"""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards = []
+
+    def values(self):
+        try:
+            return self._local.values
+        except AttributeError:
+            values = {}
+            with self._lock:
+                self._shards.append(values)
+            self._local.values = values
+            return values
+
+    def snapshot(self):
+        with self._lock:
+            shards = list(self._shards)
+        return [dict(shard) for shard in shards]
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._shards = _Shards()
+        _registry.append(self)
+
+    def samples(self):
+        """返回 [(名稱後綴, {標籤: 值}, 數值)]"""
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        values = self._shards.values()
+        values[labels] = values.get(labels, 0) + amount
+
+    def samples(self):
+        merged = {}
+        for shard in self._shards.snapshot():
+            for labels, value in shard.items():
+                merged[labels] = merged.get(labels, 0) + value
+        return [('', dict(zip(self.labelnames, labels)), value) for labels, value in sorted(merged.items())]
+
+
+class Gauge(Counter):
+    """可增可減的數值（例如進行中的請求數）；各分片的加總即目前的值"""
+    kind = 'gauge'
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        values = self._shards.values()
+        counts = values.get(labels)
+        if counts is None:
+            # 每個分桶的個數，最後兩格是總和與總數
+            counts = values[labels] = [0] * (len(self.buckets) + 3)
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-2] += value
+        counts[-1] += 1
+
+    def samples(self):
+        merged = {}
+        for shard in self._shards.snapshot():
+            for labels, counts in shard.items():
+                total = merged.setdefault(labels, [0] * len(counts))
+                for i, count in enumerate(list(counts)):
+                    total[i] += count
+        samples = []
+        for labels, counts in sorted(merged.items()):
+            label_map = dict(zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                samples.append(('_bucket', {**label_map, 'le': format_value(bound)}, cumulative))
+            samples.append(('_sum', label_map, counts[-2]))
+            samples.append(('_count', label_map, counts[-1]))
+        return samples
+
+
+def register_collector(collect):
+    """註冊在輸出時才計算的指標：collect() 返回 [(名稱, 類型, 說明, [(標籤, 數值)])]"""
+    _collectors.append(collect)
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_sample(name, labels, value):
+    if labels:
+        label_text = ','.join(f'{key}="{escape_label(label)}"' for key, label in labels.items())
+        return f'{name}{{{label_text}}} {format_value(value)}'
+    return f'{name} {format_value(value)}'
+
+def render():
+    """所有指標的 Prometheus 文字格式（0.0.4）"""
+    lines = []
+    for metric in _registry:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        for suffix, labels, value in metric.samples():
+            lines.append(format_sample(metric.name + suffix, labels, value))
+    for collect in _collectors:
+        for name, kind, documentation, samples in collect():
+            lines.append(f'# HELP {name} {documentation}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in samples:
+                if value is not None:
+                    lines.append(format_sample(name, labels, value))
+    return '\n'.join(lines) + '\n'
+
+
+http_request_duration = Histogram(
+    'http_request_duration_seconds', '視圖處理時間（不含串流響應的傳輸）', ('view', 'method', 'status'),
+)
+http_response_size = Histogram(
+    'http_response_size_bytes', '響應內容大小（壓縮後）', ('view',), buckets=SIZE_BUCKETS,
+)
+upstream_duration = Histogram(
+    'jamendo_upstream_request_duration_seconds', 'Jamendo 上游請求時間（包括重試）', ('endpoint',),
+)
+upstream_responses = Counter(
+    'jamendo_upstream_responses_total', 'Jamendo 上游請求結果（HTTP 狀態碼、error 或 circuit_open）', ('endpoint', 'status'),
+)
+upstream_in_flight = Gauge(
+    'jamendo_upstream_in_flight', '進行中的 Jamendo 上游請求數',
+)
+upstream_admissions = Counter(
+    'jamendo_upstream_admissions_total', 'Jamendo 上游准入結果（admitted、queued、shed、retry_skipped）', ('priority', 'result'),
+)
+cache_requests = Counter(
+    'jamendo_cache_requests_total', 'Jamendo 緩存查詢結果（hit、stale、miss、fallback、catalog）', ('endpoint', 'result'),
+)
+
+
+@contextmanager
+def observe_upstream(endpoint):
+    """記錄一次上游請求的時間、結果與進行中數量；呼叫端把狀態碼寫入 outcome['status']"""
+    label = endpoint.strip('/')
+    outcome = {'status': 'error'}
+    upstream_in_flight.inc()
+    start = time.perf_counter()
+    try:
+        yield outcome
+    finally:
+        upstream_in_flight.dec()
+        upstream_duration.observe(time.perf_counter() - start, label)
+        upstream_responses.inc(label, str(outcome['status']))
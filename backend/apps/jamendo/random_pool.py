@@ -0,0 +1,207 @@
+"""隨機音軌池：在進程內保留數千首音軌，tracks/random/ 直接從池中抽樣
+
+池的來源：
+- 定期以 order=random 向上游抓取一頁（間隔 JAMENDO_RANDOM_POOL_REFRESH 秒，背景執行）
+- tracks_fetched 信號：其他列表端點取得的音軌也一併收入
+
+池是每個 worker 各自一份；同一 session 不重複只在同一 worker 內成立，屬於盡力而為。
+"""
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+
+import requests
+
+from .client import get_client_setting, jamendo_get
+from .governor import browse_priority
+from .services import DETAIL_ONLY_FIELDS, normalize_tracks, notify_tracks_fetched, tracks_query
+from .singleflight import flight
+
+logger = logging.getLogger(__name__)
+
+
+def track_tag_names(track):
+    """音軌的所有標籤（曲風、樂器、其他），統一小寫"""
+    tags = (track.get('musicinfo') or {}).get('tags') or {}
+    return {
+        name.lower()
+        for key in ('genres', 'instruments', 'vartags')
+        for name in tags.get(key) or []
+        if name
+    }
+
+
+class RandomTrackPool:
+    """有上限的音軌池與標籤索引；超過上限時淘汰最早加入的音軌"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tracks = OrderedDict()
+        self._by_tag = {}
+        self._sessions = OrderedDict()
+        self._refreshed = OrderedDict()
+
+    def max_size(self):
+        return int(get_client_setting('JAMENDO_RANDOM_POOL_SIZE', 3000))
+
+    def add(self, tracks):
+        """加入（或更新）音軌，返回加入後的池大小"""
+        max_size = self.max_size()
+        with self._lock:
+            for track in tracks:
+                if not isinstance(track, dict) or not track.get('id'):
+                    continue
+                track_id = str(track['id'])
+                self._discard(track_id)
+                self._tracks[track_id] = {key: value for key, value in track.items() if key not in DETAIL_ONLY_FIELDS}
+                for tag in track_tag_names(track):
+                    self._by_tag.setdefault(tag, set()).add(track_id)
+            while len(self._tracks) > max_size:
+                self._discard(next(iter(self._tracks)))
+            return len(self._tracks)
+
+    def _discard(self, track_id):
+        track = self._tracks.pop(track_id, None)
+        if track is None:
+            return
+        for tag in track_tag_names(track):
+            ids = self._by_tag.get(tag)
+            if ids is not None:
+                ids.discard(track_id)
+                if not ids:
+                    del self._by_tag[tag]
+
+    def _session_history(self, session):
+        """session 最近取得的音軌 id；只保留最近活躍的 JAMENDO_RANDOM_POOL_SESSIONS 個 session"""
+        history = self._sessions.pop(session, None)
+        if history is None:
+            history = deque(maxlen=self.max_size())
+        self._sessions[session] = history
+        while len(self._sessions) > int(get_client_setting('JAMENDO_RANDOM_POOL_SESSIONS', 10000)):
+            self._sessions.popitem(last=False)
+        return history
+
+    def sample(self, limit, tag=None, session=None):
+        """抽樣最多 limit 首音軌；有 session 時避開該 session 已取得的音軌
+
+        session 已看過所有候選音軌時，清空紀錄重新開始一輪。
+        """
+        with self._lock:
+            if tag:
+                candidates = list(self._by_tag.get(tag.lower(), ()))
+            else:
+                candidates = list(self._tracks)
+
+            if session:
+                history = self._session_history(session)
+                seen = set(history)
+                unseen = [track_id for track_id in candidates if track_id not in seen]
+                if len(unseen) < min(limit, len(candidates)):
+                    history.clear()
+                else:
+                    candidates = unseen
+
+            picked = random.sample(candidates, min(limit, len(candidates)))
+            if session:
+                history.extend(picked)
+            return [self._tracks[track_id] for track_id in picked]
+
+    def count(self, tag=None):
+        with self._lock:
+            if tag:
+                return len(self._by_tag.get(tag.lower(), ()))
+            return len(self._tracks)
+
+    def refresh_due(self, tag=None):
+        """距離上次成功向上游抓取（整個池或指定標籤）是否已超過 JAMENDO_RANDOM_POOL_REFRESH 秒"""
+        interval = float(get_client_setting('JAMENDO_RANDOM_POOL_REFRESH', 300))
+        last = self._refreshed.get(tag or '')
+        return last is None or time.monotonic() - last >= interval
+
+    def mark_refreshed(self, tag=None):
+        with self._lock:
+            self._refreshed.pop(tag or '', None)
+            self._refreshed[tag or ''] = time.monotonic()
+            while len(self._refreshed) > 1000:
+                self._refreshed.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._tracks),
+                'max_size': self.max_size(),
+                'tags': len(self._by_tag),
+                'sessions': len(self._sessions),
+            }
+
+
+pool = RandomTrackPool()
+
+
+def fetch_random_page(tag=None):
+    """向上游抓取一頁隨機音軌放進池中，返回抓到的數量；失敗時返回 None"""
+    filters = {'order': 'random'}
+    if tag:
+        filters['tags'] = tag
+    params = tracks_query(200, **filters)
+    try:
+        # 同步補充時有使用者在等待，以 browse 優先順序送出；背景刷新時維持背景
+        with browse_priority():
+            response = jamendo_get('tracks', params)
+        if response.status_code != 200:
+            logger.error(f'隨機音軌池刷新失敗: {response.status_code}')
+            return None
+        data = normalize_tracks(response.json())
+    except (requests.exceptions.RequestException, ValueError) as e:
+        logger.error(f'隨機音軌池刷新異常: {str(e)}')
+        return None
+
+    results = data.get('results') or []
+    pool.add(results)
+    # 本地曲庫等其他接收者也會收到；池自己的接收者重複加入同一批音軌沒有副作用
+    notify_tracks_fetched('tracks', params, data)
+    return len(results)
+
+def refresh_pool(tag=None):
+    count = fetch_random_page(tag)
+    if count is not None:
+        pool.mark_refreshed(tag)
+    return count
+
+def needs_fill(limit, tag=None):
+    """池中候選不足 limit 且到了刷新間隔，需要同步向上游補充"""
+    return pool.count(tag) < limit and pool.refresh_due(tag)
+
+def ensure_pool(limit, tag=None):
+    """需要補充時同步抓取一次（同一 worker 的並發請求只抓一次）；
+    否則到了刷新間隔就在背景補充
+    """
+    if needs_fill(limit, tag):
+        flight.do(f'random_pool_{tag}' if tag else 'random_pool', lambda: refresh_pool(tag))
+    elif pool.refresh_due():
+        flight.refresh('random_pool', refresh_pool)
+
+def random_response(limit, tag=None, session=None):
+    """組成與 Jamendo API 相同格式的響應；池為空時返回 None"""
+    tracks = pool.sample(limit, tag=tag, session=session)
+    if not tracks and not pool.count():
+        return None
+    return {
+        'headers': {
+            'status': 'success',
+            'code': 0,
+            'error_message': '',
+            'warnings': '',
+            'results_count': len(tracks),
+            'source': 'pool',
+        },
+        'results': tracks,
+    }
+
+def collect_jamendo_response(sender, endpoint, params, data, **kwargs):
+    """tracks_fetched 信號接收者：把上游取得的音軌收進池中"""
+    if endpoint.strip('/') != 'tracks' or not isinstance(data, dict):
+        return
+    pool.add(data.get('results') or [])
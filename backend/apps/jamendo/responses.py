@@ -0,0 +1,132 @@
+"""Jamendo 響應的字段投影與序列化
+
+- fields= 參數：逗號分隔的字段名或設定檔名（card、player、detail），可混用，
+  例如 fields=card,musicinfo；未指定時返回完整數據
+- 序列化：安裝了 orjson 時使用 orjson，否則使用標準庫 json；兩者都輸出緊湊、不轉義中文的 UTF-8
+- 壓縮：視圖以 gzip_page 按請求的 Accept-Encoding 決定是否 gzip
+- 條件請求：緩存數據寫入時計算 ETag，If-None-Match 命中時直接返回 304
+"""
+import hashlib
+import json
+
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, quote_etag
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# 上游不可用、以過期緩存備援時加上的響應標頭
+STALE_HEADER = 'X-Jamendo-Stale'
+
+# 具名的精簡字段組合
+FIELD_PROFILES = {
+    # 網格卡片：標題、藝人、專輯、封面、時長
+    'card': (
+        'id', 'name', 'artist_id', 'artist_name', 'album_id', 'album_name', 'image', 'duration',
+    ),
+    # 播放器：卡片字段加上音訊與分享連結
+    'player': (
+        'id', 'name', 'artist_id', 'artist_name', 'album_id', 'album_name', 'image', 'duration',
+        'audio', 'audiodownload', 'audiodownload_allowed', 'shorturl', 'license_ccurl',
+    ),
+    # 詳情頁：播放器字段加上音樂資訊、歌詞與統計（不含 waveform 等大字段）
+    'detail': (
+        'id', 'name', 'artist_id', 'artist_name', 'album_id', 'album_name', 'image', 'duration',
+        'audio', 'audiodownload', 'audiodownload_allowed', 'shorturl', 'license_ccurl',
+        'album_image', 'releasedate', 'position', 'shareurl', 'musicinfo', 'lyrics', 'stats',
+    ),
+}
+
+
+class ValidatedData(dict):
+    """附帶 ETag 與剩餘新鮮秒數的響應數據
+
+    etag 為 None 代表無法做條件請求；stale 表示上游不可用時以過期緩存備援的數據。
+    """
+
+    def __init__(self, data, etag=None, max_age=0, stale=False):
+        super().__init__(data)
+        self.etag = etag
+        self.max_age = max(0, int(max_age))
+        self.stale = stale
+
+
+def parse_fields(request):
+    """解析 fields= 參數，返回字段集合；未指定時返回 None"""
+    fields = set()
+    for name in request.GET.get('fields', '').split(','):
+        name = name.strip()
+        if name:
+            fields.update(FIELD_PROFILES.get(name, (name,)))
+    return fields or None
+
+def project_track(track, fields):
+    """只保留指定字段（保持原本的字段順序）"""
+    return {key: value for key, value in track.items() if key in fields}
+
+def project_tracks(data, fields):
+    """投影列表響應的每首音軌；headers 原樣保留"""
+    if not fields:
+        return data
+    return {**data, 'results': [project_track(track, fields) for track in data.get('results', [])]}
+
+def dumps(data):
+    """序列化為緊湊的 UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def loads(raw):
+    """解析 JSON 字串或 bytes（安裝了 orjson 時使用 orjson）"""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+def json_response(data, status=200):
+    """以快速序列化器產生 JSON 響應"""
+    return HttpResponse(dumps(data), content_type='application/json', status=status)
+
+def payload_etag(data):
+    """數據的 ETag（寫入緩存時計算一次）"""
+    return hashlib.md5(dumps(data)).hexdigest()
+
+def combine_etags(*parts):
+    """由多個 ETag 與變體（limit、fields 等）組合出新的 ETag；任一部分為 None 時返回 None"""
+    if any(part is None for part in parts):
+        return None
+    return hashlib.md5('|'.join(str(part) for part in parts).encode()).hexdigest()
+
+def etag_matches(request, etag):
+    """If-None-Match 是否命中（弱比較：gzip 後的 W/ ETag 也算命中）"""
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    etags = parse_etags(header)
+    if etags == ['*']:
+        return True
+    return etag.removeprefix('W/') in {candidate.removeprefix('W/') for candidate in etags}
+
+def conditional_json_response(request, data, build, variant=''):
+    """帶 ETag 與 Cache-Control 的 JSON 響應
+
+    data 附帶 ETag 時先比對 If-None-Match，命中即返回 304，不呼叫 build()（投影與序列化）；
+    max-age 為緩存的剩餘新鮮時間。沒有 ETag 的數據照常返回，不加緩存標頭。
+    過期備援數據加上 X-Jamendo-Stale 標頭。
+    """
+    etag = combine_etags(getattr(data, 'etag', None), variant)
+    if etag is None:
+        return json_response(build())
+
+    etag = quote_etag(etag)
+    if etag_matches(request, etag):
+        response = HttpResponseNotModified()
+    else:
+        response = json_response(build())
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=data.max_age)
+    if data.stale:
+        response[STALE_HEADER] = '1'
+    return response
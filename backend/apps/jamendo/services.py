@@ -0,0 +1,679 @@
+import hashlib
+import json
+import logging
+import time
+
+import httpx
+import requests
+from django.core.cache import cache
+
+from .async_client import ajamendo_get
+from .cache import acache_call
+from .client import get_client_setting, jamendo_get
+from .governor import QuotaExceeded, browse_priority
+from .metrics import cache_requests
+from .responses import ValidatedData, combine_etags, payload_etag
+from .signals import notify_queue
+from .singleflight import (
+    acoalesced_fetch,
+    arefresh_in_background,
+    coalesced_fetch,
+    refresh_in_background,
+)
+
+logger = logging.getLogger(__name__)
+
+# Jamendo 的 id 參數一次最多 100 個
+TRACK_BATCH_SIZE = 100
+
+# 只在詳情響應出現的大字段：不放進列表共用的音軌實體（也不存入本地曲庫），另存於詳情緩存項
+DETAIL_ONLY_FIELDS = ('lyrics', 'stats')
+
+def tracks_query(limit, **filters):
+    """列表端點共用的上游參數（緩存鍵由此決定，預熱時也使用同一函數）"""
+    return {
+        **filters,
+        'include': 'musicinfo',
+        'audioformat': 'mp32',
+        'limit': limit
+    }
+
+def get_list_page_size():
+    """列表端點向上游抓取與緩存的固定頁大小（Jamendo 單次上限 200）"""
+    return int(get_client_setting('JAMENDO_LIST_PAGE_SIZE', 200))
+
+def list_page_params(filters, page):
+    """第 page 個規範頁的上游參數；同一查詢不論請求的 limit 為何都共用這些頁"""
+    page_size = get_list_page_size()
+    return tracks_query(page_size, offset=page * page_size, **filters)
+
+def list_page_range(limit, offset):
+    """覆蓋 [offset, offset + limit) 所需的頁碼範圍"""
+    page_size = get_list_page_size()
+    return range(offset // page_size, (offset + limit - 1) // page_size + 1)
+
+def slice_pages(pages, limit, offset):
+    """從連續的規範頁切出請求的區段；pages 為空（第一頁就失敗）時返回 None
+
+    緩存中的頁可能被其他請求共用，這裡只組新的 dict/list，不修改原數據。
+    """
+    if not pages:
+        return None
+    page_size = get_list_page_size()
+    start = offset - list_page_range(limit, offset)[0] * page_size
+    available = [track for page in pages for track in page.get('results', [])]
+    results = available[start:start + limit]
+    # 最後一頁不足一整頁代表上游已沒有更多結果
+    exhausted = len(pages[-1].get('results', [])) < page_size
+    has_more = not exhausted or start + limit < len(available)
+    data = {
+        'headers': {
+            **pages[0].get('headers', {}),
+            'results_count': len(results),
+            'offset': offset,
+            'next_offset': offset + len(results) if has_more else None,
+        },
+        'results': results,
+    }
+    etag = combine_etags(*(getattr(page, 'etag', None) for page in pages), limit, offset)
+    max_age = min(getattr(page, 'max_age', 0) for page in pages)
+    return ValidatedData(data, etag, max_age, stale=any(getattr(page, 'stale', False) for page in pages))
+
+def get_cache_key(endpoint, params):
+    """生成緩存鍵"""
+    cache_string = f"{endpoint}_{json.dumps(sorted(params.items()))}"
+    return hashlib.md5(cache_string.encode()).hexdigest()
+
+def get_cache_ttls(cache_profile, cache_timeout):
+    """返回 (軟 TTL, 硬 TTL)；沒有設定檔的請求沿用固定的 cache_timeout"""
+    ttls = get_client_setting('JAMENDO_CACHE_TTLS', {})
+    if cache_profile in ttls:
+        soft_ttl, hard_ttl = ttls[cache_profile]
+        return soft_ttl, max(soft_ttl, hard_ttl)
+    return cache_timeout, cache_timeout
+
+def unwrap_envelope(envelope):
+    """只接受 {data, soft_expires, hard_expires} 格式的緩存項"""
+    if isinstance(envelope, dict) and 'soft_expires' in envelope:
+        return envelope
+    return None
+
+def get_cached_envelope(cache_key):
+    """從緩存讀取 {data, soft_expires, hard_expires}，緩存失敗時返回 None
+
+    正規化的列表項只存 id 陣列，這裡用一次 get_many 取回音軌實體組回完整響應。
+    """
+    try:
+        envelope = unwrap_envelope(cache.get(f"jamendo_{cache_key}"))
+        if envelope and envelope.get('normalized'):
+            envelope = expand_envelope(envelope, cache.get_many(entity_keys(envelope)))
+        return envelope
+    except:
+        return None  # 如果緩存失敗，繼續API請求
+
+def get_cached_data(cache_key):
+    """從緩存讀取未過硬 TTL 的數據（附帶 ETag），沒有或緩存失敗時返回 None"""
+    envelope = get_cached_envelope(cache_key)
+    return validated_data(envelope) if envelope and time.time() < envelope['hard_expires'] else None
+
+def validated_data(envelope, stale=False):
+    """緩存項的數據，附帶寫入時計算的 ETag 與剩餘新鮮時間；stale 表示上游不可用時的備援數據"""
+    max_age = 0 if stale else envelope['soft_expires'] - time.time()
+    return ValidatedData(envelope['data'], envelope.get('etag'), max_age, stale=stale)
+
+def get_stale_grace():
+    """緩存項過了硬 TTL 後再保留的秒數，上游不可用時作為備援"""
+    return int(get_client_setting('JAMENDO_STALE_GRACE', 86400))
+
+def normalize_tracks(data):
+    """數據後處理：確保所有曲目都有必要字段"""
+    if 'results' in data:
+        for track in data['results']:
+            # 確保圖片字段
+            if not track.get('image') and track.get('album_image'):
+                track['image'] = track['album_image']
+
+            # 確保時長字段
+            if not track.get('duration'):
+                track['duration'] = 180  # 默認3分鐘
+
+            # 格式化藝人信息
+            if not track.get('artist_name'):
+                track['artist_name'] = 'Unknown Artist'
+
+            # 格式化專輯信息
+            if not track.get('album_name'):
+                track['album_name'] = 'Unknown Album'
+    return data
+
+def build_envelope(data, soft_ttl, hard_ttl):
+    """包裝緩存項（硬 TTL 到期後由緩存後端淘汰）；ETag 在此計算一次，之後的請求不必重新序列化"""
+    now = time.time()
+    return {
+        'data': data,
+        'etag': payload_etag(data),
+        'soft_expires': now + soft_ttl,
+        'hard_expires': now + hard_ttl,
+    }
+
+def track_cache_key(track_id):
+    """音軌實體的緩存鍵（存放於 jamendo_track_{id}），所有列表與詳情共用"""
+    return f"track_{track_id}"
+
+def track_detail_cache_key(track_id):
+    """音軌詳情專用字段（lyrics、stats）的緩存鍵"""
+    return f"track_detail_{track_id}"
+
+def get_entity_ttl():
+    """音軌實體的緩存時間：不短於任何可能引用它的列表（包括備援保留期）"""
+    ttls = get_client_setting('JAMENDO_CACHE_TTLS', {})
+    return max([3600] + [max(pair) for pair in ttls.values()]) + get_stale_grace()
+
+def is_normalizable(endpoint, params, data):
+    """include=musicinfo 的 tracks 響應（列表、搜尋）才拆成實體；字段組合不同的響應整份存放"""
+    if endpoint.strip('/') != 'tracks' or 'musicinfo' not in str(params.get('include', '')):
+        return False
+    results = data.get('results')
+    return isinstance(results, list) and all(isinstance(track, dict) and track.get('id') for track in results)
+
+def entity_envelopes(tracks, soft_ttl, hard_ttl):
+    """音軌實體緩存項（不含詳情專用字段）"""
+    return {
+        f"jamendo_{track_cache_key(track['id'])}": build_envelope(
+            {key: value for key, value in track.items() if key not in DETAIL_ONLY_FIELDS}, soft_ttl, hard_ttl
+        )
+        for track in tracks
+    }
+
+def entity_keys(envelope):
+    return [f"jamendo_{track_cache_key(track_id)}" for track_id in envelope['data']['ids']]
+
+def expand_envelope(envelope, entities):
+    """把列表項的 id 陣列組回完整響應；有音軌實體已被淘汰時視為未命中
+
+    ETag 由列表項與各音軌實體的 ETag 組合，詳情刷新了某首音軌時列表的 ETag 也隨之改變。
+    """
+    results, etags = [], [envelope.get('etag')]
+    for key in entity_keys(envelope):
+        entity = unwrap_envelope(entities.get(key))
+        if entity is None:
+            return None
+        results.append(entity['data'])
+        etags.append(entity.get('etag'))
+    return {
+        **envelope,
+        'data': {'headers': envelope['data']['headers'], 'results': results},
+        'etag': combine_etags(*etags),
+    }
+
+def response_writes(endpoint, params, cache_key, data, soft_ttl, hard_ttl):
+    """上游響應要寫入緩存的 [(鍵值 dict, timeout)]，依序寫入
+
+    tracks 列表與搜尋響應拆成音軌實體（每首只存一份）與只含 id 陣列的列表項，
+    實體先寫，讀到列表項時實體一定已在緩存；其他響應整份存放。
+    """
+    if not is_normalizable(endpoint, params, data):
+        return [({f"jamendo_{cache_key}": build_envelope(data, soft_ttl, hard_ttl)}, hard_ttl + get_stale_grace())]
+
+    envelope = build_envelope({
+        'headers': data.get('headers', {}),
+        'ids': [str(track['id']) for track in data['results']],
+    }, soft_ttl, hard_ttl)
+    envelope['normalized'] = True
+    return [
+        (entity_envelopes(data['results'], soft_ttl, hard_ttl), get_entity_ttl()),
+        ({f"jamendo_{cache_key}": envelope}, hard_ttl + get_stale_grace()),
+    ]
+
+def track_writes(data, soft_ttl, hard_ttl):
+    """詳情響應要寫入緩存的 [(鍵值 dict, timeout)]：更新列表共用的音軌實體，並另存詳情專用字段"""
+    tracks = [track for track in data.get('results', []) if track.get('id')]
+    return [
+        (entity_envelopes(tracks, soft_ttl, hard_ttl), get_entity_ttl()),
+        ({
+            f"jamendo_{track_detail_cache_key(track['id'])}": build_envelope(
+                {key: track[key] for key in DETAIL_ONLY_FIELDS if key in track}, soft_ttl, hard_ttl
+            )
+            for track in tracks
+        }, hard_ttl + get_stale_grace()),
+    ]
+
+def split_expired(envelopes):
+    """分成 (未過硬 TTL 的緩存項, 已過硬 TTL、只在上游不可用時備援的緩存項)"""
+    now = time.time()
+    usable, expired = {}, {}
+    for track_id, envelope in envelopes.items():
+        (usable if now < envelope['hard_expires'] else expired)[track_id] = envelope
+    return usable, expired
+
+def written_values(writes):
+    return {key: value for values, _ in writes for key, value in values.items()}
+
+def written_data(cache_key, writes):
+    """由剛寫入的緩存項組出與讀取緩存時相同的結果（含 ETag）"""
+    values = written_values(writes)
+    envelope = values[f"jamendo_{cache_key}"]
+    if envelope.get('normalized'):
+        envelope = expand_envelope(envelope, values)
+    return validated_data(envelope)
+
+def track_cache_keys(track_ids):
+    """{緩存鍵: (id, 是否為詳情字段)}"""
+    keys = {}
+    for track_id in track_ids:
+        keys[f"jamendo_{track_cache_key(track_id)}"] = (track_id, False)
+        keys[f"jamendo_{track_detail_cache_key(track_id)}"] = (track_id, True)
+    return keys
+
+def assemble_tracks(keys, found):
+    """組合音軌實體與詳情字段，返回 {id: 緩存項}；只有兩者皆在緩存的音軌才算命中
+
+    新鮮度以詳情字段為準（可能已過硬 TTL，見 split_expired）。
+    """
+    entities, details = {}, {}
+    for key, value in found.items():
+        envelope = unwrap_envelope(value)
+        if envelope:
+            track_id, is_detail = keys[key]
+            (details if is_detail else entities)[track_id] = envelope
+    return {
+        track_id: {
+            **detail,
+            'data': {**entities[track_id]['data'], **detail['data']},
+            'etag': combine_etags(entities[track_id].get('etag'), detail.get('etag')),
+        }
+        for track_id, detail in details.items()
+        if track_id in entities
+    }
+
+def write_cache(writes):
+    for values, timeout in writes:
+        cache.set_many(values, timeout)
+
+async def awrite_cache(writes):
+    for values, timeout in writes:
+        await acache_call('set_many', values, timeout)
+
+def notify_tracks_fetched(endpoint, params, data):
+    """通知其他應用（例如本地曲庫）有新的上游數據；放入背景佇列，不在請求中等待接收者"""
+    notify_queue.put(endpoint, params, data)
+
+def jamendo_api_request(endpoint, params, cache_timeout=3600, cache_profile=None):
+    """統一的 Jamendo API 請求函數，帶緩存
+
+    超過軟 TTL 的緩存會立即返回並在背景刷新；超過硬 TTL 才阻塞請求上游，
+    上游失敗時仍返回保留期內的舊數據（標記為 stale）。
+    """
+    # 生成緩存鍵
+    cache_key = get_cache_key(endpoint, params)
+    soft_ttl, hard_ttl = get_cache_ttls(cache_profile, cache_timeout)
+    metric_label = cache_profile or endpoint.strip('/')
+
+    def fetch():
+        return fetch_and_cache(endpoint, params, cache_key, soft_ttl, hard_ttl)
+
+    # 嘗試從緩存獲取
+    envelope = get_cached_envelope(cache_key)
+    if envelope:
+        now = time.time()
+        if now < envelope['soft_expires']:
+            logger.info(f'從緩存返回數據: {endpoint}')
+            cache_requests.inc(metric_label, 'hit')
+            return validated_data(envelope)
+        if now < envelope['hard_expires']:
+            logger.info(f'返回過期緩存並在背景刷新: {endpoint}')
+            cache_requests.inc(metric_label, 'stale')
+            refresh_in_background(cache_key, fetch)
+            return validated_data(envelope)
+
+    # 緩存未命中：合併同一鍵的並發請求，只打一次上游
+    cache_requests.inc(metric_label, 'miss')
+    try:
+        data = coalesced_fetch(cache_key, fetch, lambda: get_cached_data(cache_key))
+    except QuotaExceeded:
+        # 上游配額不足：有舊數據就以舊數據回應，否則交給呼叫端返回 503
+        if not envelope:
+            raise
+        data = None
+    if data is None and envelope:
+        # 上游不可用（斷路器開啟或配額不足）：返回最後一次成功的數據並標記為過期
+        logger.warning(f'上游不可用，返回過期緩存: {endpoint}')
+        cache_requests.inc(metric_label, 'fallback')
+        return validated_data(envelope, stale=True)
+    return data
+
+def jamendo_list_request(filters, limit, offset=0, cache_profile=None):
+    """列表端點（標籤、熱門、最新）：按固定大小的規範頁抓取與緩存，再切出 limit/offset
+
+    limit=20、24、50 的同一查詢共用同一個緩存頁，只打一次上游。
+    上游請求以 browse 優先順序送出，配額緊張時讓給音軌詳情與搜尋。
+    """
+    pages = []
+    for page in list_page_range(limit, offset):
+        with browse_priority():
+            data = jamendo_api_request('tracks', list_page_params(filters, page), cache_profile=cache_profile)
+        if not data:
+            break
+        pages.append(data)
+        if len(data.get('results', [])) < get_list_page_size():
+            break
+    return slice_pages(pages, limit, offset)
+
+def track_detail_query(track_ids):
+    """音軌詳情的上游參數；多個 id 以空格分隔，一次請求取回"""
+    return {
+        'id': ' '.join(track_ids),
+        'include': 'musicinfo+stats+lyrics',
+        'audioformat': 'mp32',
+        'limit': len(track_ids)
+    }
+
+def track_batches(track_ids):
+    """按 Jamendo 單次 id 上限分批"""
+    return [track_ids[i:i + TRACK_BATCH_SIZE] for i in range(0, len(track_ids), TRACK_BATCH_SIZE)]
+
+def get_cached_tracks(track_ids):
+    """一次讀取多首音軌的詳情緩存，返回 {id: 緩存項}；緩存失敗時返回空 dict"""
+    keys = track_cache_keys(track_ids)
+    try:
+        return assemble_tracks(keys, cache.get_many(list(keys)))
+    except:
+        return {}
+
+def batch_response(track_ids, envelopes, stale=False):
+    """依請求順序組成 Jamendo 格式的響應；找不到的 id 列在 headers.missing"""
+    found = [envelopes[track_id] for track_id in track_ids if track_id in envelopes]
+    data = {
+        'headers': {
+            'status': 'success',
+            'code': 0,
+            'error_message': '',
+            'warnings': '',
+            'results_count': len(found),
+            'missing': [track_id for track_id in track_ids if track_id not in envelopes],
+        },
+        'results': [envelope['data'] for envelope in found],
+    }
+    etag = combine_etags(','.join(track_ids), *(envelope.get('etag') for envelope in found))
+    now = time.time()
+    max_age = 0 if stale else min((envelope['soft_expires'] - now for envelope in found), default=0)
+    return ValidatedData(data, etag, max_age, stale=stale)
+
+def jamendo_tracks_request(track_ids):
+    """按 id 批量取得音軌詳情
+
+    每首音軌單獨緩存：已緩存的直接使用（過了軟 TTL 的在背景刷新），
+    未命中的 id 合併成一次（每 100 個一批）上游請求，再逐首寫回緩存。
+    上游失敗時以保留期內的舊數據備援；仍沒有任何數據時返回 None。
+    """
+    soft_ttl, hard_ttl = get_cache_ttls('detail', 3600)
+    envelopes, expired = split_expired(get_cached_tracks(track_ids))
+
+    now = time.time()
+    refreshing = [track_id for track_id, envelope in envelopes.items() if now >= envelope['soft_expires']]
+    record_track_lookups(len(envelopes) - len(refreshing), len(refreshing), len(track_ids) - len(envelopes))
+    if refreshing:
+        logger.info(f'返回過期音軌緩存並在背景刷新: {len(refreshing)} 首')
+        batch_key = get_cache_key('tracks', {'id': ' '.join(sorted(refreshing))})
+        refresh_in_background(batch_key, lambda: fetch_tracks(refreshing, soft_ttl, hard_ttl))
+
+    misses = [track_id for track_id in track_ids if track_id not in envelopes]
+    if misses:
+        def lookup():
+            found, _ = split_expired(get_cached_tracks(misses))
+            return found if len(found) == len(misses) else None
+
+        batch_key = get_cache_key('tracks', {'id': ' '.join(sorted(misses))})
+        try:
+            fetched = coalesced_fetch(batch_key, lambda: fetch_tracks(misses, soft_ttl, hard_ttl), lookup)
+            shed = None
+        except QuotaExceeded as e:
+            fetched, shed = None, e
+        if fetched is None:
+            # 上游不可用（斷路器開啟或配額不足）：以保留期內的舊數據備援
+            fallback = {track_id: expired[track_id] for track_id in misses if track_id in expired}
+            if fallback:
+                logger.warning(f'上游不可用，返回過期音軌緩存: {len(fallback)} 首')
+                cache_requests.inc('detail', 'fallback', amount=len(fallback))
+                return batch_response(track_ids, {**envelopes, **fallback}, stale=True)
+            if not envelopes:
+                if shed:
+                    raise shed
+                return None
+        envelopes.update(fetched or {})
+
+    return batch_response(track_ids, envelopes)
+
+def record_track_lookups(hits, stale, misses):
+    """按音軌計數的緩存查詢結果"""
+    for result, count in (('hit', hits), ('stale', stale), ('miss', misses)):
+        if count:
+            cache_requests.inc('detail', result, amount=count)
+
+def fetch_tracks(track_ids, soft_ttl, hard_ttl):
+    """向上游抓取多首音軌並逐首寫入緩存，返回 {id: 緩存項}；上游失敗時返回 None"""
+    tracks = {}
+    for batch in track_batches(track_ids):
+        params = track_detail_query(batch)
+        try:
+            response = jamendo_get('tracks', params)
+            if response.status_code != 200:
+                logger.error(f'Jamendo API 錯誤: {response.status_code} - {response.text}')
+                return None
+            data = normalize_tracks(response.json())
+        except QuotaExceeded:
+            raise
+        except requests.exceptions.RequestException as e:
+            logger.error(f'Jamendo API 請求異常: {str(e)}')
+            return None
+
+        writes = track_writes(data, soft_ttl, hard_ttl)
+        try:
+            write_cache(writes)
+        except:
+            pass  # 如果緩存失敗，不影響主要功能
+        notify_tracks_fetched('tracks', params, data)
+        track_ids = [str(track['id']) for track in data.get('results', []) if track.get('id')]
+        tracks.update(assemble_tracks(track_cache_keys(track_ids), written_values(writes)))
+    return tracks
+
+def fetch_and_cache(endpoint, params, cache_key, soft_ttl, hard_ttl):
+    """請求 Jamendo API 並寫入緩存"""
+    try:
+        response = jamendo_get(endpoint, params)
+
+        if response.status_code == 200:
+            data = normalize_tracks(response.json())
+
+            # 緩存數據
+            writes = response_writes(endpoint, params, cache_key, data, soft_ttl, hard_ttl)
+            try:
+                write_cache(writes)
+            except:
+                pass  # 如果緩存失敗，不影響主要功能
+            notify_tracks_fetched(endpoint, params, data)
+
+            logger.info(f'Jamendo API 響應成功: {len(data.get("results", []))} 項結果')
+            return written_data(cache_key, writes)
+        else:
+            logger.error(f'Jamendo API 錯誤: {response.status_code} - {response.text}')
+            return None
+
+    except QuotaExceeded:
+        raise  # 配額不足不是上游錯誤：交給呼叫端決定返回舊數據或 503
+    except requests.exceptions.Timeout:
+        logger.error('Jamendo API 請求超時')
+        return None
+    except requests.exceptions.RequestException as e:
+        logger.error(f'Jamendo API 請求異常: {str(e)}')
+        return None
+
+async def aget_cached_envelope(cache_key):
+    """get_cached_envelope 的非同步版本"""
+    try:
+        envelope = unwrap_envelope(await acache_call('get', f"jamendo_{cache_key}"))
+        if envelope and envelope.get('normalized'):
+            envelope = expand_envelope(envelope, await acache_call('get_many', entity_keys(envelope)))
+        return envelope
+    except:
+        return None
+
+async def aget_cached_data(cache_key):
+    """get_cached_data 的非同步版本"""
+    envelope = await aget_cached_envelope(cache_key)
+    return validated_data(envelope) if envelope and time.time() < envelope['hard_expires'] else None
+
+async def ajamendo_api_request(endpoint, params, cache_timeout=3600, cache_profile=None):
+    """jamendo_api_request 的非同步版本，供 ASGI 下的非同步視圖使用"""
+    cache_key = get_cache_key(endpoint, params)
+    soft_ttl, hard_ttl = get_cache_ttls(cache_profile, cache_timeout)
+    metric_label = cache_profile or endpoint.strip('/')
+
+    def fetch():
+        return afetch_and_cache(endpoint, params, cache_key, soft_ttl, hard_ttl)
+
+    envelope = await aget_cached_envelope(cache_key)
+    if envelope:
+        now = time.time()
+        if now < envelope['soft_expires']:
+            logger.info(f'從緩存返回數據: {endpoint}')
+            cache_requests.inc(metric_label, 'hit')
+            return validated_data(envelope)
+        if now < envelope['hard_expires']:
+            logger.info(f'返回過期緩存並在背景刷新: {endpoint}')
+            cache_requests.inc(metric_label, 'stale')
+            arefresh_in_background(cache_key, fetch)
+            return validated_data(envelope)
+
+    cache_requests.inc(metric_label, 'miss')
+    try:
+        data = await acoalesced_fetch(cache_key, fetch, lambda: aget_cached_data(cache_key))
+    except QuotaExceeded:
+        if not envelope:
+            raise
+        data = None
+    if data is None and envelope:
+        # 上游不可用（斷路器開啟或配額不足）：返回最後一次成功的數據並標記為過期
+        logger.warning(f'上游不可用，返回過期緩存: {endpoint}')
+        cache_requests.inc(metric_label, 'fallback')
+        return validated_data(envelope, stale=True)
+    return data
+
+async def ajamendo_list_request(filters, limit, offset=0, cache_profile=None):
+    """jamendo_list_request 的非同步版本"""
+    pages = []
+    for page in list_page_range(limit, offset):
+        with browse_priority():
+            data = await ajamendo_api_request('tracks', list_page_params(filters, page), cache_profile=cache_profile)
+        if not data:
+            break
+        pages.append(data)
+        if len(data.get('results', [])) < get_list_page_size():
+            break
+    return slice_pages(pages, limit, offset)
+
+async def aget_cached_tracks(track_ids):
+    """get_cached_tracks 的非同步版本"""
+    keys = track_cache_keys(track_ids)
+    try:
+        return assemble_tracks(keys, await acache_call('get_many', list(keys)))
+    except:
+        return {}
+
+async def ajamendo_tracks_request(track_ids):
+    """jamendo_tracks_request 的非同步版本"""
+    soft_ttl, hard_ttl = get_cache_ttls('detail', 3600)
+    envelopes, expired = split_expired(await aget_cached_tracks(track_ids))
+
+    now = time.time()
+    refreshing = [track_id for track_id, envelope in envelopes.items() if now >= envelope['soft_expires']]
+    record_track_lookups(len(envelopes) - len(refreshing), len(refreshing), len(track_ids) - len(envelopes))
+    if refreshing:
+        logger.info(f'返回過期音軌緩存並在背景刷新: {len(refreshing)} 首')
+        batch_key = get_cache_key('tracks', {'id': ' '.join(sorted(refreshing))})
+        arefresh_in_background(batch_key, lambda: afetch_tracks(refreshing, soft_ttl, hard_ttl))
+
+    misses = [track_id for track_id in track_ids if track_id not in envelopes]
+    if misses:
+        async def lookup():
+            found, _ = split_expired(await aget_cached_tracks(misses))
+            return found if len(found) == len(misses) else None
+
+        batch_key = get_cache_key('tracks', {'id': ' '.join(sorted(misses))})
+        try:
+            fetched = await acoalesced_fetch(batch_key, lambda: afetch_tracks(misses, soft_ttl, hard_ttl), lookup)
+            shed = None
+        except QuotaExceeded as e:
+            fetched, shed = None, e
+        if fetched is None:
+            # 上游不可用（斷路器開啟或配額不足）：以保留期內的舊數據備援
+            fallback = {track_id: expired[track_id] for track_id in misses if track_id in expired}
+            if fallback:
+                logger.warning(f'上游不可用，返回過期音軌緩存: {len(fallback)} 首')
+                cache_requests.inc('detail', 'fallback', amount=len(fallback))
+                return batch_response(track_ids, {**envelopes, **fallback}, stale=True)
+            if not envelopes:
+                if shed:
+                    raise shed
+                return None
+        envelopes.update(fetched or {})
+
+    return batch_response(track_ids, envelopes)
+
+async def afetch_tracks(track_ids, soft_ttl, hard_ttl):
+    """fetch_tracks 的非同步版本"""
+    tracks = {}
+    for batch in track_batches(track_ids):
+        params = track_detail_query(batch)
+        try:
+            response = await ajamendo_get('tracks', params)
+            if response.status_code != 200:
+                logger.error(f'Jamendo API 錯誤: {response.status_code} - {response.text}')
+                return None
+            data = normalize_tracks(response.json())
+        except QuotaExceeded:
+            raise
+        except (httpx.HTTPError, ValueError) as e:
+            # ValueError：200 響應不是有效的 JSON（requests 的 JSONDecodeError 屬於 RequestException，httpx 的不是）
+            logger.error(f'Jamendo API 請求異常: {str(e)}')
+            return None
+
+        writes = track_writes(data, soft_ttl, hard_ttl)
+        try:
+            await awrite_cache(writes)
+        except:
+            pass  # 如果緩存失敗，不影響主要功能
+        notify_tracks_fetched('tracks', params, data)
+        track_ids = [str(track['id']) for track in data.get('results', []) if track.get('id')]
+        tracks.update(assemble_tracks(track_cache_keys(track_ids), written_values(writes)))
+    return tracks
+
+async def afetch_and_cache(endpoint, params, cache_key, soft_ttl, hard_ttl):
+    """fetch_and_cache 的非同步版本"""
+    try:
+        response = await ajamendo_get(endpoint, params)
+
+        if response.status_code == 200:
+            data = normalize_tracks(response.json())
+
+            writes = response_writes(endpoint, params, cache_key, data, soft_ttl, hard_ttl)
+            try:
+                await awrite_cache(writes)
+            except:
+                pass  # 如果緩存失敗，不影響主要功能
+            notify_tracks_fetched(endpoint, params, data)
+
+            logger.info(f'Jamendo API 響應成功: {len(data.get("results", []))} 項結果')
+            return written_data(cache_key, writes)
+        else:
+            logger.error(f'Jamendo API 錯誤: {response.status_code} - {response.text}')
+            return None
+
+    except QuotaExceeded:
+        raise
+    except httpx.TimeoutException:
+        logger.error('Jamendo API 請求超時')
+        return None
+    except (httpx.HTTPError, ValueError) as e:
+        logger.error(f'Jamendo API 請求異常: {str(e)}')
+        return None
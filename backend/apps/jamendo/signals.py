@@ -0,0 +1,115 @@
+"""tracks_fetched 信號與其背景發送佇列
+
+接收者（本地曲庫寫入、相似度索引、搜尋建議索引、隨機音軌池）處理一頁 200 首音軌要數十毫秒，
+而且多半要寫 SQLite：不在請求中同步執行，由每個 worker 一個的背景執行緒依序發送。
+佇列超過 JAMENDO_NOTIFY_MAX_PENDING 時丟棄新的通知（這些數據只是本地副本，下次上游取得時會再收到）。
+"""
+import logging
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.dispatch import Signal
+
+from .metrics import Counter, register_collector
+
+logger = logging.getLogger(__name__)
+
+# 從 Jamendo 成功取得數據後發送：sender=None, endpoint, params, data（已後處理的響應）
+tracks_fetched = Signal()
+
+tracks_notifications = Counter(
+    'jamendo_tracks_notifications_total', 'tracks_fetched 通知（queued、dropped、sent）', ('result',),
+)
+
+
+def get_max_pending():
+    return int(getattr(settings, 'JAMENDO_NOTIFY_MAX_PENDING', 100))
+
+
+class NotifyQueue:
+    """進程內的通知佇列與背景發送執行緒"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._thread = None
+        self._pending = deque()
+        self._stats = {'queued': 0, 'dropped': 0, 'sent': 0}
+
+    def put(self, endpoint, params, data):
+        """放入一個通知，不等待接收者；佇列已滿時丟棄並返回 False"""
+        self.ensure_started()
+        with self._lock:
+            if len(self._pending) >= get_max_pending():
+                self._stats['dropped'] += 1
+                tracks_notifications.inc('dropped')
+                return False
+            self._pending.append((endpoint, params, data))
+            self._stats['queued'] += 1
+            self._ready.notify()
+        tracks_notifications.inc('queued')
+        return True
+
+    def send(self, endpoint, params, data):
+        for receiver, result in tracks_fetched.send_robust(sender=None, endpoint=endpoint, params=params, data=data):
+            if isinstance(result, Exception):
+                logger.error(f'處理 Jamendo 數據失敗 ({receiver.__name__}): {str(result)}')
+
+    def drain(self):
+        """在目前執行緒發送所有排隊中的通知，返回發送數（測試與進程結束前使用）"""
+        sent = 0
+        while True:
+            with self._lock:
+                if not self._pending:
+                    return sent
+                item = self._pending.popleft()
+            self.send(*item)
+            self.record_sent()
+            sent += 1
+
+    def record_sent(self):
+        with self._lock:
+            self._stats['sent'] += 1
+        tracks_notifications.inc('sent')
+
+    def run(self):
+        while True:
+            with self._lock:
+                self._ready.wait_for(lambda: self._pending)
+                item = self._pending.popleft()
+            # 背景執行緒不經過請求週期：自行關閉過期或已斷線的資料庫連線
+            close_old_connections()
+            try:
+                self.send(*item)
+            except Exception as e:
+                logger.error(f'發送 Jamendo 數據通知異常: {str(e)}')
+            self.record_sent()
+
+    def ensure_started(self):
+        """第一次放入通知時才啟動背景發送執行緒（每個進程一個）"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self.run, name='jamendo-tracks-notify', daemon=True)
+                self._thread.start()
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, 'pending': len(self._pending)}
+
+
+notify_queue = NotifyQueue()
+
+
+def collect_notify_state():
+    return [('jamendo_tracks_notifications_pending', 'gauge', '等待發送的 tracks_fetched 通知數', [({}, notify_queue.pending())])]
+
+
+register_collector(collect_notify_state)
@@ -0,0 +1,318 @@
+import asyncio
+import logging
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+from .cache import acache_call, shared_cache
+from .client import get_client_setting
+from .governor import background_priority
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    """一次進行中的上游請求"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """同一進程內相同 key 的並發請求只執行一次，其餘等待共享結果"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._refreshing = set()
+        self._executor = None
+        self._stats = {
+            'leader_fetches': 0,
+            'local_coalesced': 0,
+            'remote_coalesced': 0,
+            'lock_wait_timeouts': 0,
+            'background_refreshes': 0,
+        }
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self._stats[name] = self._stats.get(name, 0) + amount
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, 'in_flight': len(self._calls)}
+
+    def do(self, key, fn):
+        """執行 fn()；若已有相同 key 的請求進行中，則等待並共享其結果"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                leader = True
+            else:
+                self._stats['local_coalesced'] += 1
+                leader = False
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._stats['leader_fetches'] += 1
+                del self._calls[key]
+            call.event.set()
+        return call.result
+
+    def refresh(self, key, fn):
+        """在背景執行緒以背景優先順序執行 fn()；同一 key 已在刷新或抓取中時直接略過"""
+        with self._lock:
+            if key in self._refreshing or key in self._calls:
+                return False
+            self._refreshing.add(key)
+            if self._executor is None:
+                workers = int(get_client_setting('JAMENDO_REFRESH_WORKERS', 4))
+                self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='jamendo-refresh')
+            executor = self._executor
+
+        def run():
+            try:
+                with background_priority():
+                    fn()
+            except Exception as e:
+                logger.error(f'背景刷新緩存失敗: {key} - {str(e)}')
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+                    self._stats['background_refreshes'] += 1
+
+        executor.submit(run)
+        return True
+
+
+flight = SingleFlight()
+
+
+def fetch_once(cache_key, fetch, lookup):
+    """跨進程單次抓取：用緩存鎖確保每個 key 只有一個 worker 打上游
+
+    fetch() 負責請求上游並寫入緩存；lookup() 從緩存讀取結果。
+    拿不到鎖的 worker 會短暫輪詢緩存，逾時後才自行請求上游。
+    """
+    lock_key = f'jamendo_lock_{cache_key}'
+    lock_timeout = float(get_client_setting('JAMENDO_FETCH_LOCK_TIMEOUT', 30))
+    try:
+        acquired = shared_cache().add(lock_key, 1, lock_timeout)
+    except:
+        acquired = True  # 緩存不可用時直接請求上游
+
+    if acquired:
+        try:
+            return fetch()
+        finally:
+            try:
+                shared_cache().delete(lock_key)
+            except:
+                pass
+
+    wait = float(get_client_setting('JAMENDO_FETCH_LOCK_WAIT', 3))
+    poll = float(get_client_setting('JAMENDO_FETCH_LOCK_POLL', 0.05))
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        time.sleep(poll)
+        data = lookup()
+        if data is not None:
+            flight.incr('remote_coalesced')
+            return data
+        try:
+            lock_released = shared_cache().get(lock_key) is None
+        except:
+            lock_released = True
+        if lock_released:
+            # 持鎖的 worker 已結束：再確認一次緩存，仍沒有代表它失敗了
+            data = lookup()
+            if data is not None:
+                flight.incr('remote_coalesced')
+                return data
+            break
+
+    flight.incr('lock_wait_timeouts')
+    logger.warning(f'等待其他 worker 抓取逾時，自行請求上游: {cache_key}')
+    return fetch()
+
+
+def coalesced_fetch(cache_key, fetch, lookup):
+    """進程內與跨進程合併同一緩存鍵的上游請求"""
+    return flight.do(cache_key, lambda: fetch_once(cache_key, fetch, lookup))
+
+
+def refresh_in_background(cache_key, fetch):
+    """背景刷新緩存；其他 worker 已持有抓取鎖時不重複請求上游"""
+    def refresh_once():
+        lock_key = f'jamendo_lock_{cache_key}'
+        lock_timeout = float(get_client_setting('JAMENDO_FETCH_LOCK_TIMEOUT', 30))
+        try:
+            if not shared_cache().add(lock_key, 1, lock_timeout):
+                return
+        except:
+            pass
+        try:
+            fetch()
+        finally:
+            try:
+                shared_cache().delete(lock_key)
+            except:
+                pass
+
+    return flight.refresh(cache_key, refresh_once)
+
+
+class AsyncSingleFlight:
+    """SingleFlight 的非同步版本：同一事件迴圈內相同 key 只請求一次上游"""
+
+    def __init__(self):
+        self._calls = weakref.WeakKeyDictionary()
+        self._refreshing = set()
+        self._tasks = set()
+
+    def _loop_calls(self):
+        loop = asyncio.get_running_loop()
+        calls = self._calls.get(loop)
+        if calls is None:
+            calls = self._calls[loop] = {}
+        return calls
+
+    async def do(self, key, fn):
+        """await fn()；若已有相同 key 的請求進行中，則等待並共享其結果"""
+        calls = self._loop_calls()
+        future = calls.get(key)
+        if future is not None:
+            flight.incr('local_coalesced')
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # 被取消的是帶頭的請求（例如客戶端斷線）而不是這個請求：改由自己（或下一個帶頭的）請求上游
+                if not future.cancelled():
+                    raise
+                return await self.do(key, fn)
+
+        future = calls[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            # CancelledError 不是 Exception：必須結束 future，否則等待者永遠等下去
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # 沒有等待者時避免 "never retrieved" 警告
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del calls[key]
+            flight.incr('leader_fetches')
+
+    def refresh(self, key, fn):
+        """以背景 task、背景優先順序執行 await fn()；同一 key 已在刷新或抓取中時直接略過"""
+        if key in self._refreshing or key in self._loop_calls():
+            return False
+        self._refreshing.add(key)
+
+        async def run():
+            try:
+                with background_priority():
+                    await fn()
+            except Exception as e:
+                logger.error(f'背景刷新緩存失敗: {key} - {str(e)}')
+            finally:
+                self._refreshing.discard(key)
+                flight.incr('background_refreshes')
+
+        task = asyncio.get_running_loop().create_task(run())
+        self._tasks.add(task)  # 保留引用，避免 task 被提前回收
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+
+aflight = AsyncSingleFlight()
+
+
+async def afetch_once(cache_key, fetch, lookup):
+    """fetch_once 的非同步版本；fetch 與 lookup 皆為 async 函數"""
+    lock_key = f'jamendo_lock_{cache_key}'
+    lock_timeout = float(get_client_setting('JAMENDO_FETCH_LOCK_TIMEOUT', 30))
+    try:
+        acquired = await acache_call('add', lock_key, 1, lock_timeout, backend=shared_cache())
+    except:
+        acquired = True  # 緩存不可用時直接請求上游
+
+    if acquired:
+        try:
+            return await fetch()
+        finally:
+            try:
+                await acache_call('delete', lock_key, backend=shared_cache())
+            except:
+                pass
+
+    wait = float(get_client_setting('JAMENDO_FETCH_LOCK_WAIT', 3))
+    poll = float(get_client_setting('JAMENDO_FETCH_LOCK_POLL', 0.05))
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        await asyncio.sleep(poll)
+        data = await lookup()
+        if data is not None:
+            flight.incr('remote_coalesced')
+            return data
+        try:
+            lock_released = await acache_call('get', lock_key, backend=shared_cache()) is None
+        except:
+            lock_released = True
+        if lock_released:
+            data = await lookup()
+            if data is not None:
+                flight.incr('remote_coalesced')
+                return data
+            break
+
+    flight.incr('lock_wait_timeouts')
+    logger.warning(f'等待其他 worker 抓取逾時，自行請求上游: {cache_key}')
+    return await fetch()
+
+
+async def acoalesced_fetch(cache_key, fetch, lookup):
+    """coalesced_fetch 的非同步版本"""
+    return await aflight.do(cache_key, lambda: afetch_once(cache_key, fetch, lookup))
+
+
+def arefresh_in_background(cache_key, fetch):
+    """refresh_in_background 的非同步版本；需在事件迴圈中呼叫"""
+    async def refresh_once():
+        lock_key = f'jamendo_lock_{cache_key}'
+        lock_timeout = float(get_client_setting('JAMENDO_FETCH_LOCK_TIMEOUT', 30))
+        try:
+            if not await acache_call('add', lock_key, 1, lock_timeout, backend=shared_cache()):
+                return
+        except:
+            pass
+        try:
+            await fetch()
+        finally:
+            try:
+                await acache_call('delete', lock_key, backend=shared_cache())
+            except:
+                pass
+
+    return aflight.refresh(cache_key, refresh_once)
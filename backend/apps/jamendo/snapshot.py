@@ -0,0 +1,216 @@
+"""Jamendo 緩存與本地曲庫的快照：部署後載入，不必等上游逐一回填
+
+檔案為 gzip 壓縮的 JSON Lines：
+- 第一行是標頭 {format, version, created, api_base, ...}；格式版本或上游不同、
+  或建立時間超過 JAMENDO_SNAPSHOT_MAX_AGE 的快照一律拒絕載入
+- 之後每行一筆 ["cache", 鍵, 緩存項] 或 ["track", 曲庫音軌數據]；音軌實體排在列表項之前
+
+載入時逐行讀取、每 SNAPSHOT_BATCH_SIZE 筆寫入一次，記憶體用量與快照大小無關。
+緩存中已有同樣新或更新的項目時保留現有的。
+"""
+import gzip
+import json
+import logging
+import math
+import os
+import time
+import zlib
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError
+
+from apps.music.catalog import import_tracks
+from apps.music.models import Track
+
+from .cache import is_in_process_cache, iter_cache_keys, shared_cache
+from .client import get_api_base, get_client_setting
+from .services import get_entity_ttl, get_stale_grace, track_cache_key, unwrap_envelope
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 'jamendo-snapshot'
+# 緩存項或緩存鍵的結構改變時遞增，舊快照即被拒絕
+SNAPSHOT_VERSION = 1
+
+SNAPSHOT_BATCH_SIZE = 500
+
+# 一個 worker 載入後，其他 worker 在這段時間內（秒）不再重複載入
+SNAPSHOT_BOOT_LOCK_TIMEOUT = 600
+
+# 音軌實體（jamendo_track_{id}）與詳情字段（jamendo_track_detail_{id}）共用的鍵前綴
+ENTITY_PREFIX = f"jamendo_{track_cache_key('')}"
+
+
+class SnapshotError(Exception):
+    """快照無法使用（格式、版本不符或已過期）"""
+
+
+def get_snapshot_path():
+    return str(get_client_setting('JAMENDO_SNAPSHOT_PATH', os.path.join(settings.BASE_DIR, 'jamendo_snapshot.jsonl.gz')))
+
+def get_snapshot_max_age():
+    """快照的最長有效期（秒）；預設為音軌實體的緩存時間，超過後其中的緩存項必定都已過期"""
+    return float(get_client_setting('JAMENDO_SNAPSHOT_MAX_AGE', None) or get_entity_ttl())
+
+def batched(iterable, size=SNAPSHOT_BATCH_SIZE):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+def iter_cache_records():
+    """[("cache", 鍵, 緩存項)]：先音軌實體，再列表、搜尋等其他緩存項；鎖一類非緩存項略過"""
+    backend = shared_cache()
+    passes = (
+        iter_cache_keys(ENTITY_PREFIX, backend),
+        (key for key in iter_cache_keys('jamendo_', backend) if not key.startswith(ENTITY_PREFIX)),
+    )
+    for keys in passes:
+        for batch in batched(keys):
+            for key, value in backend.get_many(batch).items():
+                if unwrap_envelope(value):
+                    yield ['cache', key, value]
+
+def iter_catalog_records():
+    """[("track", 音軌數據)]：本地曲庫中的所有音軌"""
+    for data in Track.objects.values_list('data', flat=True).iterator(chunk_size=SNAPSHOT_BATCH_SIZE):
+        yield ['track', data]
+
+def dump_snapshot(path=None, include_catalog=True):
+    """把緩存與曲庫寫成快照（先寫暫存檔再改名，寫入中途失敗不會留下不完整的快照），返回統計"""
+    path = path or get_snapshot_path()
+    counts = {'cache': 0, 'track': 0}
+    start = time.monotonic()
+    header = {
+        'format': SNAPSHOT_FORMAT,
+        'version': SNAPSHOT_VERSION,
+        'created': time.time(),
+        'api_base': get_api_base(),
+    }
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    temp_path = f'{path}.tmp'
+    try:
+        with gzip.open(temp_path, 'wt', encoding='utf-8', compresslevel=6) as file:
+            file.write(json.dumps(header) + '\n')
+            sources = [iter_cache_records()]
+            if include_catalog:
+                sources.append(iter_catalog_records())
+            for records in sources:
+                for record in records:
+                    file.write(json.dumps(record, separators=(',', ':'), ensure_ascii=False) + '\n')
+                    counts[record[0]] += 1
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    return {**counts, 'bytes': os.path.getsize(path), 'elapsed': time.monotonic() - start}
+
+def read_header(file):
+    """讀取並檢查標頭；無法使用時拋出 SnapshotError"""
+    try:
+        header = json.loads(file.readline())
+    except (ValueError, OSError, EOFError, zlib.error) as e:
+        raise SnapshotError(f'快照檔案無法讀取: {str(e)}') from e
+    if not isinstance(header, dict) or header.get('format') != SNAPSHOT_FORMAT:
+        raise SnapshotError('不是 Jamendo 快照檔案')
+    if header.get('version') != SNAPSHOT_VERSION:
+        raise SnapshotError(f"快照版本 {header.get('version')} 與目前版本 {SNAPSHOT_VERSION} 不符")
+    if header.get('api_base') != get_api_base():
+        raise SnapshotError(f"快照來自其他上游 ({header.get('api_base')})")
+    age = time.time() - float(header.get('created', 0))
+    if age > get_snapshot_max_age():
+        raise SnapshotError(f'快照已過期（建立於 {age / 3600:.1f} 小時前）')
+    return header
+
+def cache_timeout(key, envelope, now):
+    """緩存項應保留的秒數（與正常寫入時相同），已過備援保留期時返回 None
+
+    向上取整到分鐘，同一批的緩存項可以合併成少數幾次 set_many。
+    """
+    remaining = envelope['hard_expires'] + get_stale_grace() - now
+    if remaining <= 0:
+        return None
+    if key.startswith(ENTITY_PREFIX):
+        remaining = max(remaining, get_entity_ttl())
+    return math.ceil(remaining / 60) * 60
+
+def load_cache_batch(records, counts):
+    """寫入一批緩存項；緩存中已有同樣新或更新的項目時保留現有的"""
+    now = time.time()
+    existing = cache.get_many([key for key, _ in records])
+    groups = {}
+    for key, envelope in records:
+        timeout = cache_timeout(key, envelope, now)
+        current = unwrap_envelope(existing.get(key))
+        if timeout is None:
+            counts['expired'] += 1
+        elif current and current['soft_expires'] >= envelope['soft_expires']:
+            counts['kept'] += 1
+        else:
+            groups.setdefault(timeout, {})[key] = envelope
+    for timeout, values in groups.items():
+        cache.set_many(values, timeout)
+        counts['cache'] += len(values)
+
+def load_catalog_batch(tracks, counts):
+    try:
+        import_tracks(tracks)
+        counts['track'] += len(tracks)
+    except DatabaseError as e:
+        logger.error(f'快照音軌寫入曲庫失敗: {str(e)}')
+        counts['failed'] += len(tracks)
+
+def load_snapshot(path=None, include_catalog=True):
+    """逐行載入快照，返回統計；快照無法使用時拋出 SnapshotError"""
+    path = path or get_snapshot_path()
+    counts = {'cache': 0, 'kept': 0, 'expired': 0, 'track': 0, 'failed': 0}
+    start = time.monotonic()
+    if not os.path.exists(path):
+        raise SnapshotError(f'找不到快照檔案: {path}')
+
+    with gzip.open(path, 'rt', encoding='utf-8') as file:
+        header = read_header(file)
+        pending = {'cache': [], 'track': []}
+        try:
+            for line in file:
+                record = json.loads(line)
+                if record[0] == 'cache':
+                    pending['cache'].append((record[1], record[2]))
+                elif record[0] == 'track' and include_catalog:
+                    pending['track'].append(record[1])
+                if len(pending['cache']) >= SNAPSHOT_BATCH_SIZE:
+                    load_cache_batch(pending['cache'], counts)
+                    pending['cache'] = []
+                if len(pending['track']) >= SNAPSHOT_BATCH_SIZE:
+                    load_catalog_batch(pending['track'], counts)
+                    pending['track'] = []
+        except (ValueError, OSError, EOFError, zlib.error) as e:
+            # 截斷或損壞的快照：已寫入的部分仍然有效
+            logger.warning(f'快照讀取中斷: {str(e)}')
+        if pending['cache']:
+            load_cache_batch(pending['cache'], counts)
+        if pending['track']:
+            load_catalog_batch(pending['track'], counts)
+
+    return {**counts, 'created': header['created'], 'elapsed': time.monotonic() - start}
+
+def load_on_boot():
+    """啟動時載入快照；緩存跨 worker 共用時，同一段時間內只由搶到鎖的 worker 載入"""
+    backend = shared_cache()
+    if not is_in_process_cache(backend) and not backend.add('jamendo_snapshot_loaded', True, SNAPSHOT_BOOT_LOCK_TIMEOUT):
+        logger.info('快照已由其他 worker 載入')
+        return
+    try:
+        report = load_snapshot()
+        logger.info(
+            f"啟動載入快照: {report['cache']} 個緩存項, {report['kept']} 項保留現有, "
+            f"{report['track']} 首曲庫音軌, 耗時 {report['elapsed']:.2f}s"
+        )
+    except SnapshotError as e:
+        logger.warning(f'略過快照: {str(e)}')
+    except Exception as e:
+        logger.error(f'啟動載入快照失敗: {str(e)}')
@@ -0,0 +1,232 @@
+import asyncio
+import tempfile
+import time
+from unittest import mock
+
+import httpx
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from . import governor as governor_module, services
+from .cache import SQLiteCache, TieredCache
+from .governor import INTERACTIVE, UpstreamGovernor
+from .responses import ValidatedData, conditional_json_response
+from .signals import NotifyQueue, tracks_fetched
+from .singleflight import AsyncSingleFlight
+
+
+class AsyncSingleFlightTests(SimpleTestCase):
+    def test_waiter_takes_over_when_leader_is_cancelled(self):
+        """帶頭的請求被取消時，等待同一 key 的請求改為自己請求上游，而不是永遠等待"""
+        calls = []
+
+        async def scenario():
+            group = AsyncSingleFlight()
+            started = asyncio.Event()
+
+            async def fetch():
+                calls.append(len(calls))
+                if len(calls) == 1:
+                    started.set()
+                    await asyncio.sleep(10)
+                return 'result'
+
+            leader = asyncio.create_task(group.do('key', fetch))
+            await started.wait()
+            waiter = asyncio.create_task(group.do('key', fetch))
+            await asyncio.sleep(0)
+            leader.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await leader
+            return await asyncio.wait_for(waiter, timeout=1)
+
+        self.assertEqual(asyncio.run(scenario()), 'result')
+        self.assertEqual(len(calls), 2)
+
+    def test_waiter_cancellation_does_not_affect_leader(self):
+        async def scenario():
+            group = AsyncSingleFlight()
+            release = asyncio.Event()
+
+            async def fetch():
+                await release.wait()
+                return 'result'
+
+            leader = asyncio.create_task(group.do('key', fetch))
+            await asyncio.sleep(0)
+            waiter = asyncio.create_task(group.do('key', fetch))
+            await asyncio.sleep(0)
+            waiter.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiter
+            release.set()
+            return await asyncio.wait_for(leader, timeout=1)
+
+        self.assertEqual(asyncio.run(scenario()), 'result')
+
+
+class NotifyQueueTests(SimpleTestCase):
+    def setUp(self):
+        self.received = []
+        tracks_fetched.connect(self.receiver, dispatch_uid='notify-queue-test')
+        self.addCleanup(tracks_fetched.disconnect, dispatch_uid='notify-queue-test')
+
+    def receiver(self, sender, endpoint, params, data, **kwargs):
+        self.received.append(data)
+
+    @override_settings(JAMENDO_NOTIFY_MAX_PENDING=2)
+    def test_put_does_not_run_receivers_and_drops_when_full(self):
+        queue = NotifyQueue()
+        # albums：其他接收者只處理 tracks 響應，不會寫入資料庫
+        with mock.patch.object(queue, 'ensure_started'):
+            self.assertTrue(queue.put('albums', {}, {'results': [1]}))
+            self.assertTrue(queue.put('albums', {}, {'results': [2]}))
+            self.assertFalse(queue.put('albums', {}, {'results': [3]}))
+        self.assertEqual(self.received, [])
+        self.assertEqual(queue.drain(), 2)
+        self.assertEqual(self.received, [{'results': [1]}, {'results': [2]}])
+        self.assertEqual(queue.stats(), {'queued': 2, 'dropped': 1, 'sent': 2, 'pending': 0})
+
+
+class AsyncFetchTests(SimpleTestCase):
+    def test_non_json_response_is_a_failed_fetch(self):
+        """200 但內容不是 JSON 時與其他上游錯誤一樣返回 None，不讓 JSONDecodeError 傳給所有等待者"""
+        response = httpx.Response(200, text='<html>maintenance</html>')
+        with mock.patch.object(services, 'ajamendo_get', mock.AsyncMock(return_value=response)):
+            self.assertIsNone(asyncio.run(services.afetch_tracks(['1'], 60, 120)))
+            self.assertIsNone(asyncio.run(services.afetch_and_cache('tracks', {'id': '1'}, 'key', 60, 120)))
+
+
+@override_settings(JAMENDO_MAX_CONCURRENCY=1, JAMENDO_QUOTA_RATE=0, JAMENDO_QUEUE_TIMEOUT=0.05)
+class GovernorBackoffTests(SimpleTestCase):
+    def test_backoff_releases_the_slot_while_sleeping(self):
+        governor = UpstreamGovernor()
+        in_flight = []
+        sleep = lambda seconds: in_flight.append(governor.slots.stats()['in_flight'][INTERACTIVE])
+        with mock.patch.object(governor_module.time, 'sleep', side_effect=sleep):
+            with governor.admit():
+                self.assertTrue(governor.backoff(1))
+                self.assertEqual(governor.slots.stats()['in_flight'][INTERACTIVE], 1)
+        self.assertEqual(in_flight, [0])
+        self.assertEqual(governor.slots.stats()['in_flight'][INTERACTIVE], 0)
+
+    def test_retry_is_abandoned_when_the_slot_is_taken_during_backoff(self):
+        governor = UpstreamGovernor()
+        # 退避期間名額被其他請求取走，重新排隊逾時
+        sleep = lambda seconds: governor.slots.try_acquire(INTERACTIVE)
+        with mock.patch.object(governor_module.time, 'sleep', side_effect=sleep):
+            with governor.admit():
+                self.assertFalse(governor.backoff(1))
+        # 離開 admit 時不釋放沒有持有的名額：只剩其他請求的那一個
+        self.assertEqual(governor.slots.stats()['in_flight'][INTERACTIVE], 1)
+
+    def test_async_backoff_releases_the_slot_while_sleeping(self):
+        governor = UpstreamGovernor()
+
+        async def scenario():
+            async with governor.aadmit():
+                task = asyncio.create_task(governor.abackoff(0.05))
+                await asyncio.sleep(0.01)
+                during = governor.slots.stats()['in_flight'][INTERACTIVE]
+                self.assertTrue(await task)
+                return during, governor.slots.stats()['in_flight'][INTERACTIVE]
+
+        self.assertEqual(asyncio.run(scenario()), (0, 1))
+        self.assertEqual(governor.slots.stats()['in_flight'][INTERACTIVE], 0)
+
+
+def list_page(start, count):
+    return ValidatedData({'headers': {'status': 'success'}, 'results': [{'id': str(i)} for i in range(start, start + count)]}, 'etag')
+
+
+@override_settings(JAMENDO_LIST_PAGE_SIZE=10)
+class SlicePagesTests(SimpleTestCase):
+    def test_page_range_covers_the_requested_slice(self):
+        self.assertEqual(list(services.list_page_range(5, 0)), [0])
+        self.assertEqual(list(services.list_page_range(10, 5)), [0, 1])
+        self.assertEqual(list(services.list_page_range(10, 10)), [1])
+        self.assertEqual(list(services.list_page_range(1, 29)), [2])
+
+    def test_slice_across_a_page_boundary(self):
+        data = services.slice_pages([list_page(0, 10), list_page(10, 10)], 10, 5)
+        self.assertEqual([track['id'] for track in data['results']], [str(i) for i in range(5, 15)])
+        self.assertEqual(data['headers']['next_offset'], 15)
+        self.assertEqual(data['headers']['results_count'], 10)
+
+    def test_slice_is_clamped_to_what_upstream_returned(self):
+        # 第二頁不足一整頁：上游只有 13 首
+        data = services.slice_pages([list_page(0, 10), list_page(10, 3)], 10, 8)
+        self.assertEqual([track['id'] for track in data['results']], ['8', '9', '10', '11', '12'])
+        self.assertIsNone(data['headers']['next_offset'])
+
+    def test_offset_inside_a_later_page(self):
+        data = services.slice_pages([list_page(20, 10)], 4, 23)
+        self.assertEqual([track['id'] for track in data['results']], ['23', '24', '25', '26'])
+        self.assertEqual(data['headers']['offset'], 23)
+
+    def test_no_pages(self):
+        self.assertIsNone(services.slice_pages([], 10, 0))
+
+
+class TieredCacheLocalTtlTests(SimpleTestCase):
+    def tiered(self, shared):
+        tiered = TieredCache(f'test-{id(shared)}', {'OPTIONS': {'LOCAL_TTL': 60}})
+        patcher = mock.patch.object(TieredCache, 'shared', new_callable=mock.PropertyMock, return_value=shared)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return tiered
+
+    def local_expires(self, tiered, key):
+        return tiered.local._data[tiered.make_and_validate_key(key)][0] - time.time()
+
+    def check_refill_is_capped(self, shared):
+        tiered = self.tiered(shared)
+        shared.set('short', 1, 5)
+        shared.set('long', 2, 3600)
+        self.assertEqual(tiered.get_many(['short', 'long']), {'short': 1, 'long': 2})
+        self.assertLessEqual(self.local_expires(tiered, 'short'), 5)
+        self.assertGreater(self.local_expires(tiered, 'long'), 55)
+        self.assertLessEqual(self.local_expires(tiered, 'long'), 60)
+
+    def test_refill_from_sqlite_is_capped_at_the_remaining_ttl(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.check_refill_is_capped(SQLiteCache(f'{directory.name}/cache.sqlite3', {}))
+
+    def test_refill_from_locmem_is_capped_at_the_remaining_ttl(self):
+        self.check_refill_is_capped(LocMemCache('tiered-ttl-test', {}))
+
+
+class ConditionalJsonResponseTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.data = ValidatedData({'results': []}, 'abc', max_age=120)
+
+    def test_matching_etag_returns_304_without_building(self):
+        first = conditional_json_response(self.factory.get('/'), self.data, lambda: self.data, 'v1')
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('max-age=120', first['Cache-Control'])
+
+        build = mock.Mock()
+        request = self.factory.get('/', HTTP_IF_NONE_MATCH=first['ETag'])
+        response = conditional_json_response(request, self.data, build, 'v1')
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], first['ETag'])
+        build.assert_not_called()
+
+    def test_weak_etag_from_gzip_still_matches(self):
+        etag = conditional_json_response(self.factory.get('/'), self.data, lambda: self.data)['ETag']
+        request = self.factory.get('/', HTTP_IF_NONE_MATCH=f'W/{etag}')
+        self.assertEqual(conditional_json_response(request, self.data, lambda: self.data).status_code, 304)
+
+    def test_other_variant_does_not_match(self):
+        etag = conditional_json_response(self.factory.get('/'), self.data, lambda: self.data, 'v1')['ETag']
+        request = self.factory.get('/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(conditional_json_response(request, self.data, lambda: self.data, 'v2').status_code, 200)
+
+    def test_data_without_etag_has_no_cache_headers(self):
+        request = self.factory.get('/', HTTP_IF_NONE_MATCH='*')
+        response = conditional_json_response(request, {'results': []}, lambda: {'results': []})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('ETag'))
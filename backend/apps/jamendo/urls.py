@@ -1,22 +1,34 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# ASGI 部署時改用非同步版本的上游視圖
+if getattr(settings, 'JAMENDO_ASYNC_VIEWS', False):
+    from . import async_views as upstream_views
+else:
+    upstream_views = views
+
 urlpatterns = [
     # 基本端點
     path('config/', views.get_jamendo_config, name='jamendo-config'),
     path('health/', views.health_check, name='jamendo-health'),
+    path('stats/', views.cache_stats, name='jamendo-stats'),
+    path('metrics/', views.metrics, name='jamendo-metrics'),
     
     # API 代理端點（如果需要）
     path('proxy/', views.jamendo_api_proxy, name='jamendo-proxy'),
     
     # 專用端點
-    path('search/', views.search_tracks, name='jamendo-search'),
-    path('tracks/tag/', views.tracks_by_tag, name='jamendo-tracks-by-tag'),
-    path('tracks/popular/', views.popular_tracks, name='jamendo-popular'),
-    path('tracks/latest/', views.latest_tracks, name='jamendo-latest'),
-    path('tracks/random/', views.random_tracks, name='jamendo-random'),
-    path('tracks/<int:track_id>/', views.get_track_detail, name='jamendo-track-detail'),
+    path('search/', upstream_views.search_tracks, name='jamendo-search'),
+    path('autocomplete/', upstream_views.autocomplete, name='jamendo-autocomplete'),
+    path('tracks/tag/', upstream_views.tracks_by_tag, name='jamendo-tracks-by-tag'),
+    path('tracks/popular/', upstream_views.popular_tracks, name='jamendo-popular'),
+    path('tracks/latest/', upstream_views.latest_tracks, name='jamendo-latest'),
+    path('tracks/random/', upstream_views.random_tracks, name='jamendo-random'),
+    path('tracks/batch/', upstream_views.batch_tracks, name='jamendo-tracks-batch'),
+    path('tracks/<int:track_id>/', upstream_views.get_track_detail, name='jamendo-track-detail'),
+    path('tracks/<int:track_id>/similar/', views.similar_tracks, name='jamendo-similar-tracks'),
     
     # 新增端點
     path('tags/', views.get_available_tags, name='jamendo-tags'),
-]
\ No newline at end of file
+]
@@ -1,113 +1,41 @@
 
-import requests
-from django.http import JsonResponse
+from django.db import DatabaseError
+from django.http import HttpResponse, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.cache import cache_control, never_cache
+from django.views.decorators.gzip import gzip_page
 from django.views.decorators.http import require_http_methods
-from django.core.cache import cache
-import json
 import logging
-import hashlib
-import os
 
-logger = logging.getLogger(__name__)
-
-# Jamendo API 配置
-JAMENDO_API_BASE = 'https://api.jamendo.com/v3.0'
+from apps.music import similarity
+from apps.music.catalog import search_catalog
 
-def get_jamendo_client_id():
-    """動態獲取 Jamendo Client ID，避免在模組載入時訪問 settings"""
-    try:
-        from django.conf import settings
-        return getattr(settings, 'JAMENDO_CLIENT_ID', None) or os.getenv('JAMENDO_CLIENT_ID', '93957ee4')
-    except:
-        return os.getenv('JAMENDO_CLIENT_ID', '93957ee4')
-
-def get_jamendo_headers():
-    """獲取 Jamendo API 請求標頭"""
-    return {
-        'User-Agent': 'DDM360-Music-Streaming/1.0',
-        'Accept': 'application/json',
-    }
+from .autocomplete import index as suggestions
+from .cache import cache_stats as tier_stats
+from .client import breaker, get_api_base, get_jamendo_client_id
+from .governor import governor
+from .health import probe
+from .metrics import cache_requests, render
+from .random_pool import ensure_pool, pool, random_response
+from .responses import conditional_json_response, json_response, parse_fields, project_track, project_tracks
+from .services import jamendo_api_request, jamendo_list_request, jamendo_tracks_request, tracks_query
+from .singleflight import flight
 
-def get_cache_key(endpoint, params):
-    """生成緩存鍵"""
-    cache_string = f"{endpoint}_{json.dumps(sorted(params.items()))}"
-    return hashlib.md5(cache_string.encode()).hexdigest()
+logger = logging.getLogger(__name__)
 
-def jamendo_api_request(endpoint, params, cache_timeout=3600):
-    """統一的 Jamendo API 請求函數，帶緩存"""
-    # 生成緩存鍵
-    cache_key = get_cache_key(endpoint, params)
-    
-    # 嘗試從緩存獲取
-    try:
-        cached_data = cache.get(f"jamendo_{cache_key}")
-        if cached_data:
-            logger.info(f'從緩存返回數據: {endpoint}')
-            return cached_data
-    except:
-        pass  # 如果緩存失敗，繼續API請求
-    
-    # 添加必要的參數
-    client_id = get_jamendo_client_id()
-    final_params = {
-        'client_id': client_id,
-        'format': 'json',
-        **params
-    }
-    
-    url = f'{JAMENDO_API_BASE}/{endpoint.lstrip("/")}'
-    
-    try:
-        logger.info(f'Jamendo API 請求: {url} with params: {final_params}')
-        
-        response = requests.get(
-            url,
-            params=final_params,
-            headers=get_jamendo_headers(),
-            timeout=30
-        )
-        
-        if response.status_code == 200:
-            data = response.json()
-            
-            # 數據後處理：確保所有曲目都有必要字段
-            if 'results' in data:
-                for track in data['results']:
-                    # 確保圖片字段
-                    if not track.get('image') and track.get('album_image'):
-                        track['image'] = track['album_image']
-                    
-                    # 確保時長字段
-                    if not track.get('duration'):
-                        track['duration'] = 180  # 默認3分鐘
-                    
-                    # 格式化藝人信息
-                    if not track.get('artist_name'):
-                        track['artist_name'] = 'Unknown Artist'
-                    
-                    # 格式化專輯信息
-                    if not track.get('album_name'):
-                        track['album_name'] = 'Unknown Album'
-            
-            # 緩存數據
-            try:
-                cache.set(f"jamendo_{cache_key}", data, cache_timeout)
-            except:
-                pass  # 如果緩存失敗，不影響主要功能
-            
-            logger.info(f'Jamendo API 響應成功: {len(data.get("results", []))} 項結果')
-            return data
-        else:
-            logger.error(f'Jamendo API 錯誤: {response.status_code} - {response.text}')
-            return None
-            
-    except requests.exceptions.Timeout:
-        logger.error('Jamendo API 請求超時')
-        return None
-    except requests.exceptions.RequestException as e:
-        logger.error(f'Jamendo API 請求異常: {str(e)}')
-        return None
+# Jamendo API 官方推薦的曲風標籤
+JAMENDO_FEATURED_GENRES = [
+    'pop',        # 流行音樂 - 最受歡迎的主流音樂
+    'rock',       # 搖滾音樂 - 經典搖滾風格
+    'electronic', # 電子音樂 - 電子合成器音樂
+    'jazz',       # 爵士音樂 - 爵士樂風格
+    'classical',  # 古典音樂 - 古典樂曲
+    'hiphop',     # 嘻哈音樂 - 說唱和節拍音樂
+    'metal',      # 金屬音樂 - 重金屬音樂
+    'world',      # 世界音樂 - 各國民族音樂
+    'soundtrack', # 配樂音樂 - 電影配樂等
+    'lounge'      # 休閒音樂 - 輕鬆氛圍音樂
+]
 
 @csrf_exempt
 @require_http_methods(["GET"])
@@ -117,16 +45,25 @@ def get_jamendo_config(request):
     return JsonResponse({
         'client_id': client_id,
         'available': bool(client_id),
-        'api_base': JAMENDO_API_BASE,
+        'api_base': get_api_base(),
         'status': 'configured' if client_id else 'not_configured'
     })
 
-@csrf_exempt
-@require_http_methods(["GET"])
-def search_tracks(request):
-    """搜尋音軌"""
+def int_param(request, name, default, minimum, maximum=None):
+    """查詢參數中的整數，限制在 [minimum, maximum]；不是整數時返回錯誤響應"""
+    try:
+        value = int(request.GET.get(name, default))
+    except (TypeError, ValueError):
+        return JsonResponse({'error': f'{name} 必須是整數'}, status=400)
+    value = max(value, minimum)
+    return value if maximum is None else min(value, maximum)
+
+def search_params(request):
+    """搜尋音軌的上游參數；參數錯誤時返回錯誤響應"""
     search_query = request.GET.get('q', '')
-    limit = min(int(request.GET.get('limit', 20)), 200)
+    limit = int_param(request, 'limit', 20, 1, 200)
+    if isinstance(limit, HttpResponse):
+        return limit
     
     if not search_query:
         return JsonResponse({'error': '缺少搜尋查詢'}, status=400)
@@ -135,186 +72,275 @@ def search_tracks(request):
     if not client_id:
         return JsonResponse({'error': 'Jamendo 未配置'}, status=500)
     
-    params = {
-        'search': search_query,
-        'include': 'musicinfo',
-        'audioformat': 'mp32',
-        'limit': limit
-    }
+    return tracks_query(limit, search=search_query)
+
+def catalog_search(params):
+    """先查本地曲庫；覆蓋不足或曲庫不可用時返回 None"""
+    try:
+        return search_catalog(params['search'], params['limit'])
+    except DatabaseError as e:
+        logger.error(f'本地曲庫搜尋失敗: {str(e)}')
+        return None
+
+def list_params(request, **filters):
+    """列表端點的查詢：上游篩選條件與請求的 limit/offset；未配置時返回錯誤響應
+
+    上游一律按固定大小的規範頁抓取（見 services.jamendo_list_request），limit/offset 只決定切片。
+    """
+    limit = int_param(request, 'limit', 20, 1, 200)
+    if isinstance(limit, HttpResponse):
+        return limit
+    offset = int_param(request, 'offset', 0, 0)
+    if isinstance(offset, HttpResponse):
+        return offset
     
-    data = jamendo_api_request('tracks', params)
+    client_id = get_jamendo_client_id()
+    if not client_id:
+        return JsonResponse({'error': 'Jamendo 未配置'}, status=500)
     
-    if data:
-        return JsonResponse(data)
-    else:
-        return JsonResponse({'error': 'Jamendo API 錯誤'}, status=500)
+    return {'filters': filters, 'limit': limit, 'offset': offset}
 
-@csrf_exempt
-@require_http_methods(["GET"])
-def tracks_by_tag(request):
-    """按標籤獲取音軌"""
+def tag_params(request):
+    """按標籤獲取音軌的查詢；參數錯誤時返回錯誤響應"""
     tag = request.GET.get('tag', '')
-    limit = min(int(request.GET.get('limit', 20)), 200)
     
     if not tag:
         return JsonResponse({'error': '缺少標籤參數'}, status=400)
     
+    return list_params(request, tags=tag)
+
+def random_params(request):
+    """隨機音軌的查詢：limit、可選的標籤篩選與 session（同一 session 不重複）；參數錯誤或未配置時返回錯誤響應"""
+    limit = int_param(request, 'limit', 20, 1, 200)
+    if isinstance(limit, HttpResponse):
+        return limit
+    
     client_id = get_jamendo_client_id()
     if not client_id:
         return JsonResponse({'error': 'Jamendo 未配置'}, status=500)
     
-    params = {
-        'tags': tag,
-        'include': 'musicinfo',
-        'audioformat': 'mp32',
-        'limit': limit
+    return {
+        'limit': limit,
+        'tag': request.GET.get('tag', '').strip().lower() or None,
+        'session': request.GET.get('session', '')[:64] or None,
     }
-    
-    data = jamendo_api_request('tracks', params, cache_timeout=7200)  # 2小時緩存
-    
-    if data:
-        return JsonResponse(data)
-    else:
-        return JsonResponse({'error': 'Jamendo API 錯誤'}, status=500)
 
-@csrf_exempt
-@require_http_methods(["GET"])
-def popular_tracks(request):
-    """獲取熱門音軌"""
-    limit = min(int(request.GET.get('limit', 20)), 200)
+def autocomplete_params(request):
+    """搜尋建議的查詢字串與 limit；參數錯誤時返回錯誤響應"""
+    limit = int_param(request, 'limit', 8, 1, 20)
+    if isinstance(limit, HttpResponse):
+        return limit
+    return {'query': request.GET.get('q', '')[:100], 'limit': limit}
+
+def autocomplete_response(query, limit):
+    suggestions.ensure_seeded()
+    return json_response({'query': query, 'results': suggestions.suggest(query, limit)})
+
+def track_detail_params(track_id):
+    """音軌詳情要查詢的 id 列表；未配置時返回錯誤響應"""
+    client_id = get_jamendo_client_id()
+    if not client_id:
+        return JsonResponse({'error': 'Jamendo 未配置'}, status=500)
     
+    return [str(track_id)]
+
+def similar_params(request, track_id):
+    """相似音軌的查詢：音軌 id 與 limit；未安裝 numpy 或未配置時返回錯誤響應"""
+    limit = int_param(request, 'limit', 20, 1, 100)
+    if isinstance(limit, HttpResponse):
+        return limit
+    
+    if not similarity.available():
+        return JsonResponse({'error': '相似音軌需要安裝 numpy'}, status=501)
     client_id = get_jamendo_client_id()
     if not client_id:
         return JsonResponse({'error': 'Jamendo 未配置'}, status=500)
     
-    params = {
-        'order': 'popularity_total',
-        'include': 'musicinfo',
-        'audioformat': 'mp32',
-        'limit': limit
-    }
+    return {'track_id': str(track_id), 'limit': limit}
+
+def batch_params(request):
+    """批量音軌詳情的 id 列表（ids=1,2,3，去除重複並保留順序）；參數錯誤時返回錯誤響應"""
+    ids = [track_id for track_id in request.GET.get('ids', '').replace(' ', ',').split(',') if track_id]
     
-    data = jamendo_api_request('tracks', params, cache_timeout=3600)  # 1小時緩存
+    if not ids:
+        return JsonResponse({'error': '缺少 ids 參數'}, status=400)
+    if not all(track_id.isdigit() for track_id in ids):
+        return JsonResponse({'error': 'ids 只能包含數字音軌 ID'}, status=400)
     
-    if data:
-        return JsonResponse(data)
-    else:
-        return JsonResponse({'error': 'Jamendo API 錯誤'}, status=500)
-
-@csrf_exempt
-@require_http_methods(["GET"])
-def latest_tracks(request):
-    """獲取最新音軌"""
-    limit = min(int(request.GET.get('limit', 20)), 200)
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > 200:
+        return JsonResponse({'error': '一次最多查詢 200 首音軌'}, status=400)
     
     client_id = get_jamendo_client_id()
     if not client_id:
         return JsonResponse({'error': 'Jamendo 未配置'}, status=500)
     
-    params = {
-        'order': 'releasedate_desc',
-        'include': 'musicinfo',
-        'audioformat': 'mp32',
-        'limit': limit
-    }
-    
-    data = jamendo_api_request('tracks', params, cache_timeout=1800)  # 30分鐘緩存
-    
+    return ids
+
+def tracks_response(request, data):
+    """音軌列表響應（依 fields= 投影字段；緩存數據帶 ETag，未變更時返回 304）"""
     if data:
-        return JsonResponse(data)
+        fields = parse_fields(request)
+        return conditional_json_response(
+            request, data, lambda: project_tracks(data, fields), ','.join(sorted(fields or ())),
+        )
     else:
         return JsonResponse({'error': 'Jamendo API 錯誤'}, status=500)
 
+def track_detail_response(request, data):
+    """音軌詳情響應（依 fields= 投影字段；緩存數據帶 ETag，未變更時返回 304）"""
+    if data and data.get('results'):
+        track = data['results'][0]
+        fields = parse_fields(request)
+        return conditional_json_response(
+            request, data, lambda: project_track(track, fields) if fields else track, ','.join(sorted(fields or ())),
+        )
+    else:
+        return JsonResponse({'error': '找不到音軌'}, status=404)
+
 @csrf_exempt
 @require_http_methods(["GET"])
-def random_tracks(request):
-    """獲取隨機音軌"""
-    limit = min(int(request.GET.get('limit', 20)), 200)
-    
-    client_id = get_jamendo_client_id()
-    if not client_id:
-        return JsonResponse({'error': 'Jamendo 未配置'}, status=500)
+@gzip_page
+def search_tracks(request):
+    """搜尋音軌"""
+    params = search_params(request)
+    if isinstance(params, HttpResponse):
+        return params
+    
+    # 本地曲庫覆蓋良好時不必請求上游
+    data = catalog_search(params)
+    if data is not None:
+        cache_requests.inc('search', 'catalog')
+        return tracks_response(request, data)
+    
+    data = jamendo_api_request('tracks', params, cache_profile='search')
+    return tracks_response(request, data)
+
+@csrf_exempt
+@require_http_methods(["GET"])
+@cache_control(public=True, max_age=60)
+def autocomplete(request):
+    """輸入時的搜尋建議（音軌、藝人、專輯、標籤），只查進程內索引；完整搜尋在送出時才由 search/ 進行"""
+    params = autocomplete_params(request)
+    if isinstance(params, HttpResponse):
+        return params
+    return autocomplete_response(**params)
+
+@csrf_exempt
+@require_http_methods(["GET"])
+@gzip_page
+def tracks_by_tag(request):
+    """按標籤獲取音軌"""
+    params = tag_params(request)
+    if isinstance(params, HttpResponse):
+        return params
     
-    params = {
-        'order': 'random',
-        'include': 'musicinfo',
-        'audioformat': 'mp32',
-        'limit': limit
-    }
+    data = jamendo_list_request(**params, cache_profile='tag')
+    return tracks_response(request, data)
+
+@csrf_exempt
+@require_http_methods(["GET"])
+@gzip_page
+def popular_tracks(request):
+    """獲取熱門音軌"""
+    params = list_params(request, order='popularity_total')
+    if isinstance(params, HttpResponse):
+        return params
     
-    # 隨機音軌不使用緩存
-    url = f'{JAMENDO_API_BASE}/tracks'
-    final_params = {
-        'client_id': client_id,
-        'format': 'json',
-        **params
-    }
+    data = jamendo_list_request(**params, cache_profile='popular')
+    return tracks_response(request, data)
+
+@csrf_exempt
+@require_http_methods(["GET"])
+@gzip_page
+def latest_tracks(request):
+    """獲取最新音軌"""
+    params = list_params(request, order='releasedate_desc')
+    if isinstance(params, HttpResponse):
+        return params
     
-    try:
-        response = requests.get(url, params=final_params, headers=get_jamendo_headers(), timeout=30)
-        if response.status_code == 200:
-            data = response.json()
-            return JsonResponse(data)
-        else:
-            return JsonResponse({'error': 'Jamendo API 錯誤'}, status=500)
-    except Exception as e:
-        logger.error(f'獲取隨機音軌錯誤: {str(e)}')
-        return JsonResponse({'error': str(e)}, status=500)
+    data = jamendo_list_request(**params, cache_profile='latest')
+    return tracks_response(request, data)
 
 @csrf_exempt
 @require_http_methods(["GET"])
+@never_cache
+@gzip_page
+def random_tracks(request):
+    """獲取隨機音軌"""
+    params = random_params(request)
+    if isinstance(params, HttpResponse):
+        return params
+    
+    # 從進程內的隨機音軌池抽樣，池不足時才請求上游
+    ensure_pool(params['limit'], params['tag'])
+    data = random_response(**params)
+    return tracks_response(request, data)
+
+@csrf_exempt
+@require_http_methods(["GET"])
+@gzip_page
 def get_track_detail(request, track_id):
     """獲取音軌詳情"""
-    client_id = get_jamendo_client_id()
-    if not client_id:
-        return JsonResponse({'error': 'Jamendo 未配置'}, status=500)
-    
-    params = {
-        'id': track_id,
-        'include': 'musicinfo+stats+lyrics',
-        'audioformat': 'mp32'
-    }
-    
-    data = jamendo_api_request('tracks', params, cache_timeout=86400)  # 24小時緩存
+    params = track_detail_params(track_id)
+    if isinstance(params, HttpResponse):
+        return params
     
-    if data and data.get('results'):
-        return JsonResponse(data['results'][0])
-    else:
-        return JsonResponse({'error': '找不到音軌'}, status=404)
+    data = jamendo_tracks_request(params)
+    return track_detail_response(request, data)
+
+@csrf_exempt
+@require_http_methods(["GET"])
+@gzip_page
+def similar_tracks(request, track_id):
+    """與音軌風格相近的音軌（musicinfo 特徵的餘弦相似度，在已緩存的音軌中查找）"""
+    params = similar_params(request, track_id)
+    if isinstance(params, HttpResponse):
+        return params
+    
+    data = similarity.similar_result(**params)
+    if data is None:
+        # 還沒有這首音軌：取得詳情（經 tracks_fetched 寫入曲庫），以它的特徵查詢
+        detail = jamendo_tracks_request([params['track_id']])
+        if not detail or not detail.get('results'):
+            return JsonResponse({'error': '找不到音軌'}, status=404)
+        similarity.index.update(detail['results'])
+        data = similarity.similar_result(**params)
+    return tracks_response(request, data)
+
+@csrf_exempt
+@require_http_methods(["GET"])
+@gzip_page
+def batch_tracks(request):
+    """批量獲取音軌詳情（例如播放佇列、歌單一次取回）"""
+    params = batch_params(request)
+    if isinstance(params, HttpResponse):
+        return params
+    
+    data = jamendo_tracks_request(params)
+    return tracks_response(request, data)
 
 @csrf_exempt  
 @require_http_methods(["GET"])
+@cache_control(public=True, max_age=3600)
 def get_available_tags(request):
     """獲取可用的音樂標籤 - 使用 Jamendo 官方推薦曲風"""
     client_id = get_jamendo_client_id()
     if not client_id:
         return JsonResponse({'error': 'Jamendo 未配置'}, status=500)
     
-    # Jamendo API 官方推薦的曲風標籤
-    jamendo_featured_genres = [
-        'pop',        # 流行音樂 - 最受歡迎的主流音樂
-        'rock',       # 搖滾音樂 - 經典搖滾風格
-        'electronic', # 電子音樂 - 電子合成器音樂
-        'jazz',       # 爵士音樂 - 爵士樂風格
-        'classical',  # 古典音樂 - 古典樂曲
-        'hiphop',     # 嘻哈音樂 - 說唱和節拍音樂
-        'metal',      # 金屬音樂 - 重金屬音樂
-        'world',      # 世界音樂 - 各國民族音樂
-        'soundtrack', # 配樂音樂 - 電影配樂等
-        'lounge'      # 休閒音樂 - 輕鬆氛圍音樂
-    ]
-    
     return JsonResponse({
-        'results': jamendo_featured_genres,
-        'count': len(jamendo_featured_genres),
+        'results': JAMENDO_FEATURED_GENRES,
+        'count': len(JAMENDO_FEATURED_GENRES),
         'source': 'jamendo_official_featured_genres',
         'description': 'Jamendo API 官方推薦的特色曲風標籤'
     })
 
 @csrf_exempt
 @require_http_methods(["GET"])
+@never_cache
 def health_check(request):
-    """健康檢查端點"""
+    """健康檢查端點（讀取背景探測的結果，不直接請求上游）"""
     client_id = get_jamendo_client_id()
     if not client_id:
         return JsonResponse({
@@ -323,33 +349,55 @@ def health_check(request):
             'error': 'JAMENDO_CLIENT_ID 未設置'
         }, status=500)
     
-    # 測試 Jamendo API 連接
-    try:
-        data = jamendo_api_request('tracks', {'limit': 1}, cache_timeout=60)
-        
-        if data:
-            return JsonResponse({
-                'status': 'healthy',
-                'jamendo_api': 'connected',
-                'client_id_configured': True,
-                'api_base': JAMENDO_API_BASE,
-                'cache_enabled': True
-            })
-        else:
-            return JsonResponse({
-                'status': 'error',
-                'jamendo_api': 'failed',
-                'error': 'API 請求失敗',
-                'client_id_configured': True
-            }, status=500)
-            
-    except Exception as e:
-        return JsonResponse({
-            'status': 'error',
-            'jamendo_api': 'failed',
-            'error': str(e),
-            'client_id_configured': bool(client_id)
-        }, status=500)
+    # 上游故障時仍返回 200：本服務可以用緩存繼續回應，不應被負載平衡器摘除
+    upstream = probe.status()
+    return JsonResponse({
+        'status': upstream['status'],
+        'jamendo_api': 'connected' if upstream['ok'] else ('unknown' if upstream['ok'] is None else 'failed'),
+        'upstream': upstream,
+        'client_id_configured': True,
+        'api_base': get_api_base(),
+        'cache_enabled': True
+    })
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def cache_stats(request):
+    """各緩存層命中率與記憶體、上游請求合併、斷路器與准入控制的統計數據"""
+    return JsonResponse({
+        'cache': tier_stats(),
+        'singleflight': flight.stats(),
+        'random_pool': pool.stats(),
+        'autocomplete': suggestions.stats(),
+        'breaker': breaker.stats(),
+        'governor': governor.stats(),
+    })
+
+def collect_jamendo_state():
+    """輸出指標時才讀取的狀態：各緩存層、斷路器與隨機音軌池"""
+    tiers = tier_stats()
+    breaker_stats = breaker.stats()
+    metrics = [
+        ('jamendo_breaker_open', 'gauge', '斷路器是否開啟（半開也算 1）', [({}, int(breaker_stats['state'] != breaker.CLOSED))]),
+        ('jamendo_breaker_trips_total', 'counter', '斷路器開啟次數', [({}, breaker_stats['trips'])]),
+        ('jamendo_random_pool_tracks', 'gauge', '隨機音軌池中的音軌數', [({}, pool.stats()['size'])]),
+    ]
+    for tier in ('l1', 'l2'):
+        if tier in tiers:
+            stats = tiers[tier]
+            metrics += [
+                (f'jamendo_cache_{tier}_entries', 'gauge', f'{tier.upper()} 緩存條目數', [({}, stats.get('entries'))]),
+                (f'jamendo_cache_{tier}_bytes', 'gauge', f'{tier.upper()} 緩存佔用位元組', [({}, stats.get('bytes'))]),
+                (f'jamendo_cache_{tier}_hits_total', 'counter', f'{tier.upper()} 緩存命中數', [({}, stats['hits'])]),
+                (f'jamendo_cache_{tier}_misses_total', 'counter', f'{tier.upper()} 緩存未命中數', [({}, stats['misses'])]),
+            ]
+    return metrics
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def metrics(request):
+    """Prometheus 文字格式的指標（本 worker）"""
+    return HttpResponse(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 @csrf_exempt
 @require_http_methods(["POST"])    
@@ -0,0 +1,112 @@
+"""Jamendo 緩存預熱：部署或清空緩存後，先把首頁常用的列表抓進緩存"""
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .client import get_client_setting
+from .governor import QuotaExceeded, background_priority
+from .services import (
+    fetch_and_cache,
+    get_cache_key,
+    get_cache_ttls,
+    get_cached_data,
+    get_cached_envelope,
+    list_page_params,
+)
+from .singleflight import coalesced_fetch
+from .snapshot import load_on_boot
+from .views import JAMENDO_FEATURED_GENRES
+
+logger = logging.getLogger(__name__)
+
+
+def warm_targets(pages, genres=None):
+    """返回要預熱的 (名稱, 上游參數, 緩存設定檔) 列表
+
+    列表端點只緩存規範頁，預熱前 pages 頁即可覆蓋這些頁內任意 limit/offset 的請求。
+    """
+    genres = JAMENDO_FEATURED_GENRES if genres is None else genres
+    targets = []
+    for page in range(pages):
+        targets.append((f'popular?page={page}', list_page_params({'order': 'popularity_total'}, page), 'popular'))
+        targets.append((f'latest?page={page}', list_page_params({'order': 'releasedate_desc'}, page), 'latest'))
+        for genre in genres:
+            targets.append((f'tag={genre}?page={page}', list_page_params({'tags': genre}, page), 'tag'))
+    return targets
+
+def is_fresh(params):
+    """緩存中是否已有未過軟 TTL 的數據"""
+    envelope = get_cached_envelope(get_cache_key('tracks', params))
+    return bool(envelope) and time.time() < envelope['soft_expires']
+
+def warm_one(name, params, cache_profile, force=False):
+    """預熱單一列表，返回 (名稱, 狀態, 耗時秒數)；狀態為 hit / fetched / failed"""
+    start = time.monotonic()
+    if not force and is_fresh(params):
+        return name, 'hit', time.monotonic() - start
+
+    cache_key = get_cache_key('tracks', params)
+    soft_ttl, hard_ttl = get_cache_ttls(cache_profile, 3600)
+    try:
+        with background_priority():
+            data = coalesced_fetch(
+                cache_key,
+                lambda: fetch_and_cache('tracks', params, cache_key, soft_ttl, hard_ttl),
+                lambda: get_cached_data(cache_key),
+            )
+    except QuotaExceeded:
+        data = None  # 配額留給使用者請求
+    return name, 'fetched' if data else 'failed', time.monotonic() - start
+
+def warm_cache(pages=None, genres=None, concurrency=None, force=False):
+    """以有限並發預熱熱門、最新與各曲風列表，返回統計報告"""
+    pages = pages or int(get_client_setting('JAMENDO_WARM_PAGES', 1))
+    concurrency = concurrency or int(get_client_setting('JAMENDO_WARM_CONCURRENCY', 4))
+    targets = warm_targets(pages, genres)
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='jamendo-warm') as executor:
+        results = list(executor.map(lambda target: warm_one(*target, force=force), targets))
+    elapsed = time.monotonic() - start
+
+    counts = {'hit': 0, 'fetched': 0, 'failed': 0}
+    for _, status, _ in results:
+        counts[status] += 1
+    return {
+        'targets': len(targets),
+        **counts,
+        'coverage': (counts['hit'] + counts['fetched']) / len(targets) if targets else 1.0,
+        'elapsed': elapsed,
+        'results': results,
+    }
+
+def should_warm_on_boot():
+    """JAMENDO_WARM_ON_BOOT 或 JAMENDO_SNAPSHOT_ON_BOOT 開啟且目前進程是伺服器（而非 migrate 等管理命令）時才預熱"""
+    if not (get_client_setting('JAMENDO_WARM_ON_BOOT', False) or get_client_setting('JAMENDO_SNAPSHOT_ON_BOOT', False)):
+        return False
+    if os.path.basename(sys.argv[0]) == 'manage.py':
+        # runserver 的自動重載父進程不處理請求，只在子進程預熱
+        return sys.argv[1:2] == ['runserver'] and os.environ.get('RUN_MAIN') == 'true'
+    return True
+
+def warm_on_boot():
+    """在背景執行緒預熱，不阻塞 worker 啟動；先載入快照，預熱時就只需抓取快照中沒有或已過期的列表"""
+    def run():
+        time.sleep(float(get_client_setting('JAMENDO_WARM_ON_BOOT_DELAY', 1)))
+        if get_client_setting('JAMENDO_SNAPSHOT_ON_BOOT', False):
+            load_on_boot()
+        if not get_client_setting('JAMENDO_WARM_ON_BOOT', False):
+            return
+        try:
+            report = warm_cache()
+            logger.info(
+                f"啟動預熱完成: {report['fetched']} 項抓取, {report['hit']} 項已在緩存, "
+                f"{report['failed']} 項失敗, 耗時 {report['elapsed']:.2f}s"
+            )
+        except Exception as e:
+            logger.error(f'啟動預熱失敗: {str(e)}')
+
+    threading.Thread(target=run, name='jamendo-warm-on-boot', daemon=True).start()
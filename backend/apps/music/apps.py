@@ -0,0 +1,16 @@
+from django.apps import AppConfig
+
+
+class MusicConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.music'
+
+    def ready(self):
+        from apps.jamendo.signals import tracks_fetched
+        from .catalog import ingest_jamendo_response
+        from .similarity import update_similarity_index
+
+        # 每次從 Jamendo 取得新數據時寫入本地曲庫
+        tracks_fetched.connect(ingest_jamendo_response, dispatch_uid='music-catalog-ingest')
+        # 接收者依連接順序執行：相似音軌索引在曲庫寫入之後更新
+        tracks_fetched.connect(update_similarity_index, dispatch_uid='music-similarity-index')
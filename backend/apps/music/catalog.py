@@ -0,0 +1,260 @@
+"""本地曲庫：從 Jamendo 響應建立 Track/Artist/Album/Tag，並提供全文搜尋
+
+SQLite 下使用 FTS5（trigram 分詞，中英文皆可做子字串比對）索引音軌名、藝人、專輯與標籤；
+其他資料庫退回 icontains 查詢。
+"""
+import logging
+import re
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.jamendo.responses import ValidatedData, combine_etags
+from apps.jamendo.services import DETAIL_ONLY_FIELDS
+
+from .models import Album, Artist, SearchCoverage, Tag, Track
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'music_track_fts'
+
+# trigram 分詞至少需要 3 個字元
+FTS_MIN_TOKEN_LENGTH = 3
+
+# 查詢與音軌文字的字詞（判斷是否完整字詞命中）
+WORD_PATTERN = re.compile(r'\w+')
+
+_fts_ready = False
+
+# SQLite 同時只允許一個寫入者：進程內先排隊，避免並發預熱時互相鎖表
+_ingest_lock = threading.Lock()
+
+
+def fts_available():
+    """FTS5 索引表是否可用（只在 SQLite 且已執行遷移時成立）"""
+    global _fts_ready
+    if not _fts_ready and connection.vendor == 'sqlite':
+        _fts_ready = FTS_TABLE in connection.introspection.table_names()
+    return _fts_ready
+
+def normalize_query(query):
+    return ' '.join(query.lower().split())
+
+def track_tags(track):
+    """從 musicinfo 取出 (標籤名, 類型) 列表"""
+    tags = (track.get('musicinfo') or {}).get('tags') or {}
+    result = []
+    for key, kind in (('genres', Tag.GENRE), ('instruments', Tag.INSTRUMENT), ('vartags', Tag.VARTAG)):
+        for name in tags.get(key) or []:
+            if name:
+                result.append((name[:100], kind))
+    return result
+
+def ingest_jamendo_response(sender, endpoint, params, data, **kwargs):
+    """tracks_fetched 信號接收者：把 Jamendo tracks 響應寫入本地曲庫"""
+    if endpoint.strip('/') != 'tracks' or not isinstance(data, dict):
+        return
+    results = data.get('results') or []
+    with _ingest_lock:
+        if results:
+            ingest_tracks(results)
+        if params.get('search'):
+            SearchCoverage.objects.update_or_create(
+                query=normalize_query(str(params['search']))[:255],
+                defaults={
+                    'limit': int(params.get('limit', 20)),
+                    'result_count': len(results),
+                    'track_ids': [str(track['id']) for track in results if track.get('id')],
+                },
+            )
+
+def import_tracks(tracks):
+    """批量寫入音軌數據（例如從快照載入）；與信號接收者共用同一個寫入佇列"""
+    with _ingest_lock:
+        ingest_tracks(tracks)
+
+@transaction.atomic
+def ingest_tracks(tracks):
+    """批量寫入音軌及其藝人、專輯、標籤，並更新全文索引"""
+    tracks = [track for track in tracks if track.get('id')]
+    if not tracks:
+        return
+
+    artists = {
+        str(track['artist_id']): track.get('artist_name') or ''
+        for track in tracks if track.get('artist_id')
+    }
+    Artist.objects.bulk_create(
+        [Artist(jamendo_id=jamendo_id, name=name[:255]) for jamendo_id, name in artists.items()],
+        update_conflicts=True, unique_fields=['jamendo_id'], update_fields=['name'],
+    )
+    artist_pks = dict(Artist.objects.filter(jamendo_id__in=artists).values_list('jamendo_id', 'pk'))
+
+    albums = {}
+    for track in tracks:
+        if track.get('album_id'):
+            albums[str(track['album_id'])] = Album(
+                jamendo_id=str(track['album_id']),
+                name=(track.get('album_name') or '')[:255],
+                image=(track.get('album_image') or '')[:500],
+                artist_id=artist_pks.get(str(track.get('artist_id'))),
+            )
+    Album.objects.bulk_create(
+        list(albums.values()),
+        update_conflicts=True, unique_fields=['jamendo_id'], update_fields=['name', 'image', 'artist'],
+    )
+    album_pks = dict(Album.objects.filter(jamendo_id__in=albums).values_list('jamendo_id', 'pk'))
+
+    tag_keys = {tag for track in tracks for tag in track_tags(track)}
+    Tag.objects.bulk_create([Tag(name=name, kind=kind) for name, kind in tag_keys], ignore_conflicts=True)
+    tag_pks = {}
+    for pk, name, kind in Tag.objects.filter(name__in={name for name, _ in tag_keys}).values_list('pk', 'name', 'kind'):
+        tag_pks[(name, kind)] = pk
+
+    Track.objects.bulk_create(
+        [
+            Track(
+                jamendo_id=str(track['id']),
+                name=(track.get('name') or '')[:255],
+                artist_id=artist_pks.get(str(track.get('artist_id'))),
+                album_id=album_pks.get(str(track.get('album_id'))),
+                duration=int(track.get('duration') or 0),
+                data={key: value for key, value in track.items() if key not in DETAIL_ONLY_FIELDS},
+            )
+            for track in tracks
+        ],
+        update_conflicts=True,
+        unique_fields=['jamendo_id'],
+        update_fields=['name', 'artist', 'album', 'duration', 'data', 'updated_at'],
+    )
+    track_pks = dict(Track.objects.filter(jamendo_id__in=[str(track['id']) for track in tracks]).values_list('jamendo_id', 'pk'))
+
+    TrackTag = Track.tags.through
+    TrackTag.objects.filter(track_id__in=track_pks.values()).delete()
+    TrackTag.objects.bulk_create([
+        TrackTag(track_id=track_pks[str(track['id'])], tag_id=tag_pks[tag])
+        for track in tracks
+        for tag in set(track_tags(track))
+        if tag in tag_pks
+    ])
+
+    if fts_available():
+        rows = [
+            (
+                track_pks[str(track['id'])],
+                track.get('name') or '',
+                track.get('artist_name') or '',
+                track.get('album_name') or '',
+                ' '.join(name for name, _ in track_tags(track)),
+            )
+            for track in tracks
+        ]
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(row[0],) for row in rows])
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, artist_name, album_name, tags) VALUES (%s, %s, %s, %s, %s)',
+                rows,
+            )
+
+def search_track_pks(query, limit):
+    """在本地曲庫全文搜尋，返回依相關度排序的 Track 主鍵"""
+    tokens = query.split()
+    fts_tokens = [token for token in tokens if len(token) >= FTS_MIN_TOKEN_LENGTH]
+    if fts_available() and fts_tokens and len(fts_tokens) == len(tokens):
+        match = ' '.join('"{}"'.format(token.replace('"', '""')) for token in fts_tokens)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s ORDER BY bm25({FTS_TABLE}) LIMIT %s',
+                [match, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    condition = Q()
+    for token in tokens:
+        condition &= (
+            Q(name__icontains=token)
+            | Q(artist__name__icontains=token)
+            | Q(album__name__icontains=token)
+            | Q(tags__name__icontains=token)
+        )
+    return list(Track.objects.filter(condition).values_list('pk', flat=True).distinct()[:limit])
+
+def catalog_response(tracks):
+    """組成與 Jamendo API 相同格式的響應"""
+    return {
+        'headers': {
+            'status': 'success',
+            'code': 0,
+            'error_message': '',
+            'warnings': '',
+            'results_count': len(tracks),
+            'source': 'catalog',
+        },
+        'results': tracks,
+    }
+
+def catalog_result(tracks):
+    """由 Track 組成響應；ETag 取自音軌 id 與更新時間，不必序列化即可做條件請求"""
+    return ValidatedData(
+        catalog_response([track.data for track in tracks]),
+        combine_etags(*(f'{track.jamendo_id}:{track.updated_at.timestamp()}' for track in tracks)),
+    )
+
+def whole_word_matches(track, tokens):
+    """每個查詢字詞都是音軌名、藝人、專輯或標籤中的一個完整字詞（trigram 索引也會命中字詞的一部分）"""
+    words = set(WORD_PATTERN.findall(' '.join([
+        track.data.get('name') or '',
+        track.data.get('artist_name') or '',
+        track.data.get('album_name') or '',
+        *(name for name, _ in track_tags(track.data)),
+    ]).lower()))
+    return all(token in words for token in tokens)
+
+def search_fts(query, limit):
+    """以全文索引回答：完整字詞命中的音軌至少有 MUSIC_CATALOG_SEARCH_MIN_HITS 首（也不少於 limit）時
+    返回依相關度排序的前 limit 首，否則返回 None"""
+    tokens = WORD_PATTERN.findall(query)
+    if not fts_available() or not tokens or any(len(token) < FTS_MIN_TOKEN_LENGTH for token in tokens):
+        return None
+    min_hits = max(limit, int(getattr(settings, 'MUSIC_CATALOG_SEARCH_MIN_HITS', 50)))
+    # 部分字詞命中的候選會被過濾掉，多取一些
+    pks = search_track_pks(' '.join(tokens), min_hits * 2)
+    if len(pks) < min_hits:
+        return None
+    candidates = Track.objects.in_bulk(pks)
+    tracks = [candidates[pk] for pk in pks if pk in candidates and whole_word_matches(candidates[pk], tokens)]
+    if len(tracks) < min_hits:
+        return None
+    return catalog_result(tracks[:limit])
+
+def search_catalog(query, limit):
+    """本地曲庫能回答時返回搜尋結果，否則返回 None（由呼叫端改查上游）
+
+    依序嘗試：
+    - 同一搜尋詞近期已向上游查詢過，且當時的 limit 足夠（或上游結果已全部取得）：依上游當時的順序返回
+    - 全文索引中每個查詢字詞都以完整字詞命中的音軌至少有 MUSIC_CATALOG_SEARCH_MIN_HITS 首：
+      依相關度（bm25）返回，結果與順序可能與上游不同；熱門的藝人、標籤等查詢不必消耗上游配額
+    """
+    if not getattr(settings, 'MUSIC_CATALOG_SEARCH', True):
+        return None
+
+    normalized = normalize_query(query)
+    if not normalized:
+        return None
+
+    coverage_ttl = getattr(settings, 'MUSIC_CATALOG_COVERAGE_TTL', 7 * 24 * 3600)
+    coverage = SearchCoverage.objects.filter(
+        query=normalized[:255],
+        fetched_at__gte=timezone.now() - timedelta(seconds=coverage_ttl),
+    ).first()
+    if coverage is not None and (coverage.limit >= limit or coverage.result_count < coverage.limit):
+        track_ids = coverage.track_ids[:limit]
+        tracks = Track.objects.in_bulk(track_ids, field_name='jamendo_id')
+        if len(tracks) == len(track_ids):
+            return catalog_result([tracks[jamendo_id] for jamendo_id in track_ids])
+
+    return search_fts(normalized, limit)
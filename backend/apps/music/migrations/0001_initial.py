@@ -0,0 +1,69 @@
+# Generated by Django 5.2.3 on 2026-10-17 17:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Artist',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jamendo_id', models.CharField(max_length=32, unique=True)),
+                ('name', models.CharField(max_length=255)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SearchCoverage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('query', models.CharField(max_length=255, unique=True)),
+                ('limit', models.PositiveIntegerField()),
+                ('result_count', models.PositiveIntegerField()),
+                ('track_ids', models.JSONField(default=list)),
+                ('fetched_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Album',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jamendo_id', models.CharField(max_length=32, unique=True)),
+                ('name', models.CharField(max_length=255)),
+                ('image', models.URLField(blank=True, max_length=500)),
+                ('artist', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='albums', to='music.artist')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('kind', models.CharField(choices=[('genre', '曲風'), ('instrument', '樂器'), ('vartag', '其他')], default='genre', max_length=16)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('name', 'kind'), name='music_tag_unique_name_kind')],
+            },
+        ),
+        migrations.CreateModel(
+            name='Track',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jamendo_id', models.CharField(max_length=32, unique=True)),
+                ('name', models.CharField(max_length=255)),
+                ('duration', models.PositiveIntegerField(default=0)),
+                ('data', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('album', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='tracks', to='music.album')),
+                ('artist', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='tracks', to='music.artist')),
+                ('tags', models.ManyToManyField(blank=True, related_name='tracks', to='music.tag')),
+            ],
+        ),
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations
+
+FTS_TABLE = 'music_track_fts'
+
+
+def create_fts_table(apps, schema_editor):
+    """只在 SQLite 建立 FTS5 索引表；其他資料庫由 catalog 退回 icontains 查詢"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+        f"USING fts5(name, artist_name, album_name, tags, tokenize='trigram')"
+    )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -0,0 +1,71 @@
+from django.db import models
+
+
+class Artist(models.Model):
+    """Jamendo 藝人"""
+    jamendo_id = models.CharField(max_length=32, unique=True)
+    name = models.CharField(max_length=255)
+
+    def __str__(self):
+        return self.name
+
+
+class Album(models.Model):
+    """Jamendo 專輯"""
+    jamendo_id = models.CharField(max_length=32, unique=True)
+    name = models.CharField(max_length=255)
+    image = models.URLField(max_length=500, blank=True)
+    artist = models.ForeignKey(Artist, null=True, blank=True, on_delete=models.SET_NULL, related_name='albums')
+
+    def __str__(self):
+        return self.name
+
+
+class Tag(models.Model):
+    """音樂標籤（來自 musicinfo 的 genres / instruments / vartags）"""
+    GENRE = 'genre'
+    INSTRUMENT = 'instrument'
+    VARTAG = 'vartag'
+    KIND_CHOICES = [
+        (GENRE, '曲風'),
+        (INSTRUMENT, '樂器'),
+        (VARTAG, '其他'),
+    ]
+
+    name = models.CharField(max_length=100)
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES, default=GENRE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['name', 'kind'], name='music_tag_unique_name_kind'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class Track(models.Model):
+    """Jamendo 音軌；data 保存與 Jamendo API 相同格式的音軌數據，直接用於響應"""
+    jamendo_id = models.CharField(max_length=32, unique=True)
+    name = models.CharField(max_length=255)
+    artist = models.ForeignKey(Artist, null=True, blank=True, on_delete=models.SET_NULL, related_name='tracks')
+    album = models.ForeignKey(Album, null=True, blank=True, on_delete=models.SET_NULL, related_name='tracks')
+    duration = models.PositiveIntegerField(default=0)
+    tags = models.ManyToManyField(Tag, blank=True, related_name='tracks')
+    data = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
+
+
+class SearchCoverage(models.Model):
+    """記錄已向上游查詢過的搜尋詞，用於判斷本地曲庫能否直接回答"""
+    query = models.CharField(max_length=255, unique=True)
+    limit = models.PositiveIntegerField()
+    result_count = models.PositiveIntegerField()
+    track_ids = models.JSONField(default=list)
+    fetched_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.query
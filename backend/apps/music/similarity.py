@@ -0,0 +1,278 @@
+"""相似音軌：以 musicinfo（曲風、樂器、其他標籤、人聲/純音樂、速度）建立特徵向量，用餘弦相似度找最近鄰
+
+- 特徵以雜湊映射到固定的 FEATURE_DIMENSIONS 維（不需要維護標籤詞表，出現新標籤時矩陣形狀不變），
+  每首音軌一個 float32 向量並正規化為單位長度，內積即餘弦相似度
+- 所有音軌的向量放在同一個連續的 NumPy 矩陣中，按維度存放（每一維一行、每首音軌一欄）；
+  查詢向量只有十幾個非零維，一次查詢只讀取這幾行做批量內積，再以 argpartition 取前幾名
+- 矩陣容量按倍數增長：新音軌寫入尾端的空欄，已有的音軌原地覆寫所在的欄，不重建整個矩陣
+- 每個 worker 第一次查詢時從本地曲庫載入；之後本 worker 取得的音軌經 tracks_fetched 信號即時更新，
+  其他 worker 寫入曲庫的音軌每隔 MUSIC_SIMILAR_SYNC_INTERVAL 秒按 updated_at 增量同步
+
+NumPy 是可選依賴：第一次使用時才匯入（worker 啟動時不載入）；未安裝時 available() 為 False，相似音軌端點返回錯誤。
+"""
+import logging
+import threading
+import time
+import zlib
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.db.models import Max
+from django.db.models.fields.json import KT
+
+from apps.jamendo.responses import loads
+
+from .catalog import catalog_result
+from .models import Track
+
+# 由 available() 匯入；索引載入之前不會用到
+np = None
+
+logger = logging.getLogger(__name__)
+
+# 雜湊特徵的維度：128 維 float32 每首音軌 512 bytes，10 萬首約 50MB（查詢只讀取其中的非零維）
+FEATURE_DIMENSIONS = 128
+
+# (musicinfo.tags 的鍵, 權重)：曲風最能代表風格，樂器與其他標籤次之
+TAG_WEIGHTS = (('genres', 1.0), ('instruments', 0.6), ('vartags', 0.6))
+
+# (musicinfo 的鍵, 權重)
+ATTRIBUTE_WEIGHTS = (('vocalinstrumental', 0.8), ('speed', 0.5))
+
+# 矩陣的初始容量（音軌數）
+INITIAL_CAPACITY = 1024
+
+# 從曲庫載入時每次讀取的行數
+LOAD_CHUNK_SIZE = 2000
+
+# 增量同步時重新讀取上次同步時間之前的這段時間
+SYNC_OVERLAP = timedelta(seconds=60)
+
+
+def available():
+    """匯入 NumPy，未安裝時返回 False（不提供相似音軌）"""
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            return False
+        np = numpy
+    return True
+
+def get_sync_interval():
+    return float(getattr(settings, 'MUSIC_SIMILAR_SYNC_INTERVAL', 300))
+
+def musicinfo_features(musicinfo):
+    """musicinfo 的 [(來源鍵, 值, 權重)]"""
+    if not isinstance(musicinfo, dict):
+        return []
+    tags = musicinfo.get('tags') or {}
+    features = [
+        (key, name, weight)
+        for key, weight in TAG_WEIGHTS
+        for name in tags.get(key) or []
+        if name and isinstance(name, str)
+    ]
+    for key, weight in ATTRIBUTE_WEIGHTS:
+        if musicinfo.get(key) and isinstance(musicinfo[key], str):
+            features.append((key, musicinfo[key], weight))
+    return features
+
+@lru_cache(maxsize=65536)
+def feature_slot(key, value, weight):
+    """特徵對應的 (維度, 帶正負號的權重)
+
+    特徵名是來源鍵加上小寫的值（不同類型的同名標籤不相撞）；crc32 在各進程間穩定，正負號抵銷雜湊碰撞的偏差。
+    """
+    digest = zlib.crc32(f'{key}:{value.lower()}'.encode())
+    return digest % FEATURE_DIMENSIONS, weight if digest & 0x80000000 else -weight
+
+def feature_vectors(musicinfos):
+    """一批 musicinfo 的特徵矩陣（每行已正規化；沒有任何特徵的行全為 0）"""
+    rows, columns, values = [], [], []
+    for row, musicinfo in enumerate(musicinfos):
+        for feature in musicinfo_features(musicinfo):
+            column, value = feature_slot(*feature)
+            rows.append(row)
+            columns.append(column)
+            values.append(value)
+    vectors = np.zeros((len(musicinfos), FEATURE_DIMENSIONS), dtype=np.float32)
+    # 同一行的多個特徵可能落在同一維，必須累加而不是覆寫
+    np.add.at(vectors, (np.asarray(rows, dtype=np.intp), np.asarray(columns, dtype=np.intp)), values)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+
+class SimilarityIndex:
+    """進程內的音軌特徵矩陣與 id 對照"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._matrix = None  # (FEATURE_DIMENSIONS, 容量)，前 len(self._ids) 欄有效
+        self._ids = []
+        self._rows = {}
+        self._loaded = False
+        self._synced_at = None  # 已同步到的曲庫 updated_at
+        self._next_sync = 0.0
+        self._stats = {'queries': 0, 'updates': 0, 'syncs': 0, 'load_ms': None}
+
+    def _write(self, track_ids, vectors):
+        """寫入向量（呼叫端持有鎖）：已有的音軌覆寫原欄，新音軌追加到尾端，容量不足時按倍數擴充"""
+        new_ids = [track_id for track_id in dict.fromkeys(track_ids) if track_id not in self._rows]
+        needed = len(self._ids) + len(new_ids)
+        capacity = 0 if self._matrix is None else self._matrix.shape[1]
+        if needed > capacity:
+            capacity = max(capacity, INITIAL_CAPACITY)
+            while capacity < needed:
+                capacity *= 2
+            matrix = np.zeros((FEATURE_DIMENSIONS, capacity), dtype=np.float32)
+            if self._matrix is not None:
+                matrix[:, :len(self._ids)] = self._matrix[:, :len(self._ids)]
+            # 進行中的查詢仍使用舊矩陣，不受影響
+            self._matrix = matrix
+        for track_id in new_ids:
+            self._rows[track_id] = len(self._ids)
+            self._ids.append(track_id)
+        # 同一批中重複的 id 只保留其中一次的向量
+        self._matrix[:, [self._rows[track_id] for track_id in track_ids]] = vectors.T
+
+    def _read_catalog(self, since=None):
+        """從曲庫讀取 [(音軌 id, musicinfo 的 JSON 文字)] 與讀取前曲庫中最新的 updated_at
+
+        只讀 musicinfo（不取出整份音軌數據），也不經過 JSONField 的逐行轉換；解析留給 _apply_catalog 分批進行。
+        """
+        queryset = Track.objects.all()
+        if since is not None:
+            # updated_at 在交易提交前就已決定：多讀一段重疊時間，涵蓋上次同步時還沒提交的寫入
+            queryset = queryset.filter(updated_at__gte=since - SYNC_OVERLAP)
+        latest = queryset.aggregate(latest=Max('updated_at'))['latest'] or since
+        rows = list(queryset.values_list('jamendo_id', KT('data__musicinfo')).iterator(chunk_size=LOAD_CHUNK_SIZE))
+        return rows, latest
+
+    def _apply_catalog(self, rows):
+        """分批解析並寫入曲庫讀到的音軌；每批只在寫入時持有鎖，大量同步時不會長時間阻塞查詢"""
+        for offset in range(0, len(rows), LOAD_CHUNK_SIZE):
+            # 解析後的 dict 只存在於這一批（同時存在幾十萬個小物件會讓垃圾回收反覆掃描）
+            chunk = [(track_id, loads(musicinfo) if musicinfo else None) for track_id, musicinfo in rows[offset:offset + LOAD_CHUNK_SIZE]]
+            vectors = feature_vectors([musicinfo for _, musicinfo in chunk])
+            with self._lock:
+                self._write([track_id for track_id, _ in chunk], vectors)
+
+    def ensure_loaded(self):
+        """第一次使用時從曲庫載入（同一進程只載入一次，並發的請求等待同一次載入）"""
+        if self._loaded:
+            return
+        with self._load_lock:
+            if self._loaded or not available():
+                return
+            start = time.perf_counter()
+            rows, latest = self._read_catalog()
+            self._apply_catalog(rows)
+            with self._lock:
+                self._synced_at = latest
+                self._loaded = True
+                self._next_sync = time.monotonic() + get_sync_interval()
+                self._stats['load_ms'] = round((time.perf_counter() - start) * 1000, 1)
+        logger.info(f'相似音軌索引已載入: {len(rows)} 首音軌, {self._stats["load_ms"]} ms')
+
+    def sync(self):
+        """增量讀取上次同步以來曲庫中新增或更新的音軌（例如其他 worker 寫入的）"""
+        with self._lock:
+            since = self._synced_at
+        rows, latest = self._read_catalog(since)
+        self._apply_catalog(rows)
+        with self._lock:
+            if latest is not None and (self._synced_at is None or latest > self._synced_at):
+                self._synced_at = latest
+            self._stats['syncs'] += 1
+        return len(rows)
+
+    def maybe_sync(self):
+        """距上次同步超過 MUSIC_SIMILAR_SYNC_INTERVAL 秒時在背景同步"""
+        if time.monotonic() < self._next_sync:
+            return
+        from apps.jamendo.singleflight import flight
+
+        self._next_sync = time.monotonic() + get_sync_interval()
+        flight.refresh('music-similar-sync', self.sync)
+
+    def update(self, tracks):
+        """更新 Jamendo 格式的音軌（沒有 musicinfo 的略過）；尚未載入時不需要，載入時會從曲庫讀到"""
+        if not self._loaded:
+            return
+        rows = [
+            (str(track['id']), track['musicinfo'])
+            for track in tracks
+            if track.get('id') and isinstance(track.get('musicinfo'), dict)
+        ]
+        if not rows:
+            return
+        vectors = feature_vectors([musicinfo for _, musicinfo in rows])
+        with self._lock:
+            self._write([track_id for track_id, _ in rows], vectors)
+            self._stats['updates'] += len(rows)
+
+    def similar(self, track_id, limit):
+        """與音軌最相似的 [(音軌 id, 相似度)]，依相似度由高到低（不含自身與相似度為 0 的）
+
+        索引中沒有這首音軌時返回 None。
+        """
+        self.ensure_loaded()
+        self.maybe_sync()
+        with self._lock:
+            row = self._rows.get(track_id)
+            if row is None:
+                return None
+            # 只在鎖內取出矩陣與查詢向量；計算期間的更新寫入尾端的空欄或新矩陣，不影響這次查詢
+            count = len(self._ids)
+            matrix, ids = self._matrix, self._ids
+            vector = matrix[:, row].copy()
+            self._stats['queries'] += 1
+
+        dimensions = np.flatnonzero(vector)
+        if count < 2 or not len(dimensions):
+            return []
+        # 其他維度的乘積都是 0：只取查詢向量的非零維（各是連續的一行）
+        scores = vector[dimensions] @ matrix[dimensions, :count]
+        scores[row] = -np.inf
+        limit = min(limit, count - 1)
+        top = np.argpartition(scores, count - limit)[count - limit:]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(ids[i], float(scores[i])) for i in top if scores[i] > 0]
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._stats,
+                'tracks': len(self._ids),
+                'capacity': 0 if self._matrix is None else self._matrix.shape[1],
+                'bytes': 0 if self._matrix is None else self._matrix.nbytes,
+                'loaded': self._loaded,
+            }
+
+
+index = SimilarityIndex()
+
+
+def similar_result(track_id, limit):
+    """相似音軌的 Jamendo 格式響應（headers.similarity 為各音軌的相似度）；索引中沒有這首音軌時返回 None"""
+    neighbours = index.similar(track_id, limit)
+    if neighbours is None:
+        return None
+    found = Track.objects.only('jamendo_id', 'data', 'updated_at').in_bulk(
+        [neighbour_id for neighbour_id, _ in neighbours], field_name='jamendo_id',
+    )
+    neighbours = [(found[neighbour_id], score) for neighbour_id, score in neighbours if neighbour_id in found]
+    result = catalog_result([track for track, _ in neighbours])
+    result['headers'].update(source='similar', similarity=[round(score, 4) for _, score in neighbours])
+    return result
+
+def update_similarity_index(sender, endpoint, params, data, **kwargs):
+    """tracks_fetched 信號接收者：在曲庫寫入之後把音軌的特徵向量寫入索引（索引尚未載入時 update 直接返回，不匯入 NumPy）"""
+    if endpoint.strip('/') != 'tracks' or not isinstance(data, dict):
+        return
+    index.update(data.get('results') or [])
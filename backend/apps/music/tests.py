@@ -0,0 +1,40 @@
+from django.test import TestCase, override_settings
+
+from .catalog import ingest_tracks, search_catalog
+from .models import SearchCoverage
+
+
+def make_track(track_id, name, artist_name='Someone', genres=()):
+    return {
+        'id': str(track_id),
+        'name': name,
+        'artist_id': str(track_id),
+        'artist_name': artist_name,
+        'album_id': str(track_id),
+        'album_name': 'Album',
+        'musicinfo': {'tags': {'genres': list(genres)}},
+    }
+
+
+@override_settings(MUSIC_CATALOG_SEARCH=True, MUSIC_CATALOG_SEARCH_MIN_HITS=5)
+class SearchCatalogTests(TestCase):
+    def test_replays_covered_query_in_upstream_order(self):
+        ingest_tracks([make_track(i, f'Song {i}') for i in range(3)])
+        SearchCoverage.objects.create(query='song', limit=20, result_count=3, track_ids=['2', '0', '1'])
+        result = search_catalog('Song', 20)
+        self.assertEqual([track['id'] for track in result['results']], ['2', '0', '1'])
+
+    def test_answers_from_fts_with_enough_whole_word_hits(self):
+        ingest_tracks([make_track(i, f'Track {i}', genres=['jazz']) for i in range(6)])
+        result = search_catalog('jazz', 3)
+        self.assertEqual(len(result['results']), 3)
+        self.assertEqual(result['headers']['source'], 'catalog')
+
+    def test_partial_word_hits_do_not_count(self):
+        # trigram 索引中 'jazz' 也命中 'jazzy'，但不是完整字詞
+        ingest_tracks([make_track(i, f'Track {i}', genres=['jazzy']) for i in range(6)])
+        self.assertIsNone(search_catalog('jazz', 3))
+
+    def test_too_few_hits_go_upstream(self):
+        ingest_tracks([make_track(i, f'Track {i}', genres=['jazz']) for i in range(4)])
+        self.assertIsNone(search_catalog('jazz', 3))
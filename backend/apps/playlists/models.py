@@ -0,0 +1,43 @@
+import uuid
+
+from django.db import models
+
+
+class Playlist(models.Model):
+    """伺服器端歌單；以 uuid 分享，持有編輯權杖（只保存雜湊）者才能修改"""
+    uuid = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    name = models.CharField(max_length=255)
+    description = models.TextField(blank=True)
+    is_public = models.BooleanField(default=False)
+    edit_token_hash = models.CharField(max_length=64)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['is_public', '-updated_at'], name='playlist_public_recent'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class PlaylistItem(models.Model):
+    """歌單中的一首音軌
+
+    順序由 rank 決定（間隔編號）：移動或插入時取前後兩項 rank 的中點，只更新一行；
+    中點用完時才重新分布附近一小段項目。track_id 是 Jamendo 音軌 id，不要求已在本地曲庫中。
+    """
+    playlist = models.ForeignKey(Playlist, on_delete=models.CASCADE, related_name='items')
+    track_id = models.CharField(max_length=32)
+    rank = models.BigIntegerField()
+    added_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['rank', 'id']
+        indexes = [
+            models.Index(fields=['playlist', 'rank', 'id'], name='playlist_item_order'),
+        ]
+
+    def __str__(self):
+        return f'{self.playlist_id}:{self.track_id}'
@@ -0,0 +1,219 @@
+"""歌單的排序、增刪與音軌數據的批量取回
+
+排序用間隔編號（rank）：新項目之間相隔 RANK_GAP，插入或移動時取前後兩項 rank 的中點，
+只寫入一行；同一位置反覆插入直到中點用完（約 16 次）時，才把附近一小段項目重新平均分布。
+
+讀取歌單時，本地曲庫中的音軌數據與項目在同一個查詢中取回（以 jamendo_id 關聯的子查詢）；
+不在曲庫的音軌合併成一次批量詳情查詢（逐首緩存，未命中的每 100 首一個上游請求）。
+"""
+import hashlib
+import hmac
+import logging
+import secrets
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery
+from django.utils import timezone
+
+from apps.jamendo.client import get_jamendo_client_id
+from apps.jamendo.governor import QuotaExceeded
+from apps.jamendo.services import jamendo_tracks_request
+from apps.music.models import Track
+
+from .models import Playlist, PlaylistItem
+
+logger = logging.getLogger(__name__)
+
+# 新項目之間 rank 的間隔
+RANK_GAP = 1 << 16
+
+# 重新分布時的初始窗口（兩側各幾項）與重新分布後相鄰 rank 的最小間隔
+RESPACE_WINDOW = 16
+MIN_RESPACE_STEP = 1 << 8
+
+# 批量寫入時每次 INSERT / UPDATE 的行數
+RESPACE_BATCH_SIZE = 500
+
+
+class PlaylistError(Exception):
+    """無效的歌單操作（例如目標項目不存在）"""
+
+
+class PlaylistFull(PlaylistError):
+    """歌單音軌數超過 PLAYLIST_MAX_ITEMS"""
+
+
+def get_max_items():
+    return int(getattr(settings, 'PLAYLIST_MAX_ITEMS', 10000))
+
+def get_page_size():
+    return int(getattr(settings, 'PLAYLIST_PAGE_SIZE', 100))
+
+def hash_token(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def check_edit_token(playlist, token):
+    """編輯權杖是否正確（只比對雜湊，資料庫中不保存權杖本身）"""
+    return bool(token) and hmac.compare_digest(hash_token(token), playlist.edit_token_hash)
+
+def ordered_items(playlist):
+    return PlaylistItem.objects.filter(playlist=playlist).order_by('rank', 'id')
+
+def touch(playlist):
+    """更新歌單的修改時間
+
+    每個修改操作在交易開頭先做這次 UPDATE：PostgreSQL 上會鎖住歌單這一行，SQLite 上會取得寫鎖，
+    同一歌單的修改因此依序執行，不會有兩個操作算出同一個中點。
+    """
+    playlist.updated_at = timezone.now()
+    Playlist.objects.filter(pk=playlist.pk).update(updated_at=playlist.updated_at)
+
+def spread_ranks(low, high, count):
+    """low 與 high 之間平均分布的 count 個 rank；None 代表歌單開頭或結尾，間隔不足時返回 None"""
+    if low is None and high is None:
+        low = 0
+    if high is None:
+        return [low + RANK_GAP * (i + 1) for i in range(count)]
+    if low is None:
+        return [high - RANK_GAP * (count - i) for i in range(count)]
+    step = (high - low) // (count + 1)
+    if step < 1:
+        return None
+    return [low + step * (i + 1) for i in range(count)]
+
+def preceding_rank(items, anchor):
+    """依 (rank, id) 順序排在 anchor 之前的一項的 rank；anchor 是第一項時返回 None"""
+    before = items.filter(Q(rank__lt=anchor.rank) | Q(rank=anchor.rank, pk__lt=anchor.pk))
+    return before.order_by('-rank', '-id').values_list('rank', flat=True).first()
+
+def following_rank(items, anchor):
+    """依 (rank, id) 順序排在 anchor 之後的一項的 rank；anchor 是最後一項時返回 None"""
+    after = items.filter(Q(rank__gt=anchor.rank) | Q(rank=anchor.rank, pk__gt=anchor.pk))
+    return after.order_by('rank', 'id').values_list('rank', flat=True).first()
+
+def target_gap(playlist, exclude=None, before=None, after=None, position=None):
+    """目標位置前後兩項的 rank (low, high)
+
+    before / after 是項目 id，position 是從 0 起算的位置（超出長度時放到最後）；
+    都未指定時加到歌單最後。exclude 是正在移動的項目，計算位置時不算在內。
+    """
+    items = ordered_items(playlist)
+    if exclude is not None:
+        items = items.exclude(pk=exclude)
+
+    if before is not None or after is not None:
+        try:
+            anchor = items.get(pk=before if before is not None else after)
+        except PlaylistItem.DoesNotExist:
+            raise PlaylistError('找不到 before/after 指定的項目')
+        if before is not None:
+            return preceding_rank(items, anchor), anchor.rank
+        return anchor.rank, following_rank(items, anchor)
+
+    if position is not None:
+        if position == 0:
+            return None, items.values_list('rank', flat=True).first()
+        ranks = list(items.values_list('rank', flat=True)[position - 1:position + 1])
+        if ranks:
+            return ranks[0], ranks[1] if len(ranks) > 1 else None
+
+    return items.order_by('-rank', '-id').values_list('rank', flat=True).first(), None
+
+def respace(playlist, low, high, count, exclude=None):
+    """low 與 high 之間放不下時，把附近一段項目重新平均分布，返回 count 個新項目的 rank
+
+    從兩側各 RESPACE_WINDOW 項開始，每次擴大 4 倍，直到窗口外側兩項的間隔足夠
+    （新的相鄰間隔至少 MIN_RESPACE_STEP）；窗口碰到歌單開頭或結尾時以 RANK_GAP 向外延伸，一定放得下。
+    """
+    items = ordered_items(playlist)
+    if exclude is not None:
+        items = items.exclude(pk=exclude)
+
+    size = RESPACE_WINDOW
+    while True:
+        before = list(items.filter(rank__lte=low).order_by('-rank', '-id').values_list('pk', 'rank')[:size + 1])
+        after = list(items.filter(rank__gte=high).values_list('pk', 'rank')[:size + 1])
+        lower = before[size][1] if len(before) > size else None
+        upper = after[size][1] if len(after) > size else None
+        window_before = [pk for pk, _ in reversed(before[:size])]
+        window_after = [pk for pk, _ in after[:size]]
+        slots = len(window_before) + count + len(window_after)
+        if lower is None or upper is None or (upper - lower) // (slots + 1) >= MIN_RESPACE_STEP:
+            break
+        size *= 4
+
+    ranks = spread_ranks(lower, upper, slots)
+    new_ranks = ranks[len(window_before):len(window_before) + count]
+    window = zip(window_before + window_after, ranks[:len(window_before)] + ranks[len(window_before) + count:])
+    PlaylistItem.objects.bulk_update(
+        [PlaylistItem(pk=pk, rank=rank) for pk, rank in window], ['rank'], batch_size=RESPACE_BATCH_SIZE,
+    )
+    logger.info(f'歌單 {playlist.uuid} 重新分布 {len(window_before) + len(window_after)} 項')
+    return new_ranks
+
+def allocate_ranks(playlist, count, exclude=None, **target):
+    """目標位置上 count 個依序排列的新 rank；中點用完時先重新分布附近的項目"""
+    low, high = target_gap(playlist, exclude, **target)
+    return spread_ranks(low, high, count) or respace(playlist, low, high, count, exclude)
+
+def create_playlist(name, description='', is_public=False, track_ids=()):
+    """建立歌單，返回 (歌單, 編輯權杖)；權杖只在建立時返回一次"""
+    token = secrets.token_urlsafe(24)
+    with transaction.atomic():
+        playlist = Playlist.objects.create(
+            name=name, description=description, is_public=is_public, edit_token_hash=hash_token(token),
+        )
+        if track_ids:
+            add_tracks(playlist, track_ids)
+    return playlist, token
+
+def add_tracks(playlist, track_ids, **target):
+    """把音軌依序加到目標位置（預設為最後），返回新項目"""
+    with transaction.atomic():
+        touch(playlist)
+        max_items = get_max_items()
+        if PlaylistItem.objects.filter(playlist=playlist).count() + len(track_ids) > max_items:
+            raise PlaylistFull(f'歌單最多 {max_items} 首音軌')
+        ranks = allocate_ranks(playlist, len(track_ids), **target)
+        return PlaylistItem.objects.bulk_create(
+            [PlaylistItem(playlist=playlist, track_id=track_id, rank=rank) for track_id, rank in zip(track_ids, ranks)],
+            batch_size=RESPACE_BATCH_SIZE,
+        )
+
+def move_item(playlist, item_id, **target):
+    """把項目移到目標位置：只更新這一行的 rank（除非需要重新分布）"""
+    with transaction.atomic():
+        touch(playlist)
+        item = PlaylistItem.objects.get(playlist=playlist, pk=item_id)
+        [item.rank] = allocate_ranks(playlist, 1, exclude=item.pk, **target)
+        PlaylistItem.objects.filter(pk=item.pk).update(rank=item.rank)
+    return item
+
+def remove_item(playlist, item_id):
+    with transaction.atomic():
+        touch(playlist)
+        deleted, _ = PlaylistItem.objects.filter(playlist=playlist, pk=item_id).delete()
+    if not deleted:
+        raise PlaylistItem.DoesNotExist
+
+def fetch_uncatalogued_tracks(track_ids):
+    """不在本地曲庫的音軌經批量詳情取回，返回 {id: 音軌數據}；上游不可用且沒有緩存時返回空 dict"""
+    if not track_ids or not get_jamendo_client_id():
+        return {}
+    try:
+        data = jamendo_tracks_request(track_ids)
+    except QuotaExceeded:
+        logger.warning(f'上游配額不足，歌單中 {len(track_ids)} 首音軌暫無數據')
+        return {}
+    return {str(track['id']): track for track in (data or {}).get('results', [])}
+
+def playlist_page(playlist, offset, limit):
+    """一頁歌單項目 [(項目, 音軌數據或 None)]
+
+    曲庫中的音軌數據以子查詢與項目一起取回；其餘音軌（去除重複）一次批量查詢。
+    """
+    catalog_data = Track.objects.filter(jamendo_id=OuterRef('track_id')).values('data')[:1]
+    items = list(ordered_items(playlist).annotate(track_data=Subquery(catalog_data))[offset:offset + limit])
+    fetched = fetch_uncatalogued_tracks(list(dict.fromkeys(item.track_id for item in items if item.track_data is None)))
+    return [(item, item.track_data or fetched.get(item.track_id)) for item in items]
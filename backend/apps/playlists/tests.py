@@ -0,0 +1,69 @@
+from django.test import SimpleTestCase, TestCase
+
+from . import services
+from .models import PlaylistItem
+from .services import RANK_GAP, add_tracks, create_playlist, move_item, ordered_items, spread_ranks
+
+
+def track_order(playlist):
+    return list(ordered_items(playlist).values_list('track_id', flat=True))
+
+
+class SpreadRanksTests(SimpleTestCase):
+    def test_empty_playlist_and_ends(self):
+        self.assertEqual(spread_ranks(None, None, 2), [RANK_GAP, 2 * RANK_GAP])
+        self.assertEqual(spread_ranks(100, None, 2), [100 + RANK_GAP, 100 + 2 * RANK_GAP])
+        self.assertEqual(spread_ranks(None, 100, 2), [100 - 2 * RANK_GAP, 100 - RANK_GAP])
+
+    def test_between_two_ranks(self):
+        self.assertEqual(spread_ranks(0, 100, 3), [25, 50, 75])
+
+    def test_no_room_left(self):
+        self.assertIsNone(spread_ranks(10, 11, 1))
+        self.assertIsNone(spread_ranks(0, 3, 3))
+
+
+class PlaylistOrderTests(TestCase):
+    def setUp(self):
+        self.playlist, _ = create_playlist('test', track_ids=['1', '2', '3', '4'])
+
+    def item(self, track_id):
+        return PlaylistItem.objects.get(playlist=self.playlist, track_id=track_id)
+
+    def test_move_item_before_after_and_position(self):
+        move_item(self.playlist, self.item('4').pk, before=self.item('1').pk)
+        self.assertEqual(track_order(self.playlist), ['4', '1', '2', '3'])
+        move_item(self.playlist, self.item('4').pk, after=self.item('2').pk)
+        self.assertEqual(track_order(self.playlist), ['1', '2', '4', '3'])
+        move_item(self.playlist, self.item('1').pk, position=99)
+        self.assertEqual(track_order(self.playlist), ['2', '4', '3', '1'])
+        move_item(self.playlist, self.item('1').pk, position=0)
+        self.assertEqual(track_order(self.playlist), ['1', '2', '4', '3'])
+
+    def test_move_only_updates_the_moved_row(self):
+        ranks = dict(ordered_items(self.playlist).values_list('track_id', 'rank'))
+        move_item(self.playlist, self.item('4').pk, before=self.item('2').pk)
+        moved = dict(ordered_items(self.playlist).values_list('track_id', 'rank'))
+        self.assertEqual({key for key in ranks if ranks[key] != moved[key]}, {'4'})
+        self.assertTrue(ranks['1'] < moved['4'] < ranks['2'])
+
+    def test_repeated_inserts_at_one_spot_respace_neighbours(self):
+        """同一位置反覆插入，中點用完後重新分布附近的項目，順序不變"""
+        expected = ['1']
+        for i in range(40):
+            track_id = f'x{i}'
+            add_tracks(self.playlist, [track_id], before=self.item('2').pk)
+            expected.append(track_id)
+        self.assertEqual(track_order(self.playlist), expected + ['2', '3', '4'])
+        ranks = list(ordered_items(self.playlist).values_list('rank', flat=True))
+        self.assertEqual(len(set(ranks)), len(ranks))
+
+    def test_respace_makes_room_between_adjacent_ranks(self):
+        first, second = ordered_items(self.playlist)[:2]
+        PlaylistItem.objects.filter(pk=second.pk).update(rank=first.rank + 1)
+        [rank] = services.respace(self.playlist, first.rank, first.rank + 1, 1)
+        items = list(ordered_items(self.playlist).values_list('track_id', 'rank'))
+        self.assertEqual([track_id for track_id, _ in items], ['1', '2', '3', '4'])
+        self.assertTrue(items[0][1] < rank < items[1][1])
+        steps = [b - a for (_, a), (_, b) in zip(items, items[1:])]
+        self.assertTrue(all(step >= services.MIN_RESPACE_STEP for step in steps))
@@ -1,9 +1,10 @@
 from django.urls import path
-from django.http import JsonResponse
-
-def playlists_health_check(request):
-    return JsonResponse({'status': 'healthy', 'app': 'playlists'})
+from . import views
 
 urlpatterns = [
-    path('health/', playlists_health_check, name='playlists-health'),
-]
\ No newline at end of file
+    path('health/', views.playlists_health_check, name='playlists-health'),
+    path('', views.playlists, name='playlists'),
+    path('<uuid:playlist_id>/', views.playlist_detail, name='playlist-detail'),
+    path('<uuid:playlist_id>/items/', views.playlist_items, name='playlist-items'),
+    path('<uuid:playlist_id>/items/<int:item_id>/', views.playlist_item, name='playlist-item'),
+]
@@ -0,0 +1,254 @@
+from django.db.models import Count
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_http_methods
+import json
+import logging
+
+from apps.jamendo.responses import json_response, parse_fields, project_track
+
+from .models import Playlist, PlaylistItem
+from .services import (
+    PlaylistError, PlaylistFull, add_tracks, check_edit_token, create_playlist,
+    get_page_size, move_item, playlist_page, remove_item,
+)
+
+logger = logging.getLogger(__name__)
+
+# 修改歌單時須帶上建立時返回的編輯權杖
+TOKEN_HEADER = 'HTTP_X_PLAYLIST_TOKEN'
+
+# 一次加入的音軌數上限（建立歌單時的 track_ids 也適用）
+MAX_TRACKS_PER_REQUEST = 1000
+
+# 一次讀取的項目數上限：不在曲庫中的音軌須同步向上游批量查詢（每 100 首一次），
+# 匿名請求不經過 api/jamendo/ 的每客戶端限流，不能一次觸發太多上游請求；其餘以 next_offset 分頁
+MAX_PAGE_LIMIT = 200
+
+
+def playlists_health_check(request):
+    return JsonResponse({'status': 'healthy', 'app': 'playlists'})
+
+def json_payload(request):
+    """請求的 JSON 物件；不是有效的 JSON 物件時返回錯誤響應"""
+    try:
+        payload = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'error': '請求內容不是有效的 JSON'}, status=400)
+    if not isinstance(payload, dict):
+        return JsonResponse({'error': '請求內容必須是 JSON 物件'}, status=400)
+    return payload
+
+def track_ids_param(payload, required=True):
+    """payload 中的 track_ids（數字音軌 ID 列表，保留順序與重複）；參數錯誤時返回錯誤響應"""
+    track_ids = payload.get('track_ids', [])
+    if not isinstance(track_ids, list) or (required and not track_ids):
+        return JsonResponse({'error': '缺少 track_ids 參數'}, status=400)
+    track_ids = [str(track_id) for track_id in track_ids]
+    if not all(track_id.isdigit() for track_id in track_ids):
+        return JsonResponse({'error': 'track_ids 只能包含數字音軌 ID'}, status=400)
+    if len(track_ids) > MAX_TRACKS_PER_REQUEST:
+        return JsonResponse({'error': f'一次最多加入 {MAX_TRACKS_PER_REQUEST} 首音軌'}, status=400)
+    return track_ids
+
+def target_params(payload):
+    """目標位置：before / after（項目 id）或 position（從 0 起算）至多一個；參數錯誤時返回錯誤響應"""
+    target = {key: payload[key] for key in ('before', 'after', 'position') if payload.get(key) is not None}
+    if len(target) > 1:
+        return JsonResponse({'error': 'before、after、position 只能指定一個'}, status=400)
+    if not all(isinstance(value, int) and not isinstance(value, bool) and value >= 0 for value in target.values()):
+        return JsonResponse({'error': 'before、after、position 必須是非負整數'}, status=400)
+    return target
+
+def playlist_fields(payload, partial=False):
+    """歌單的 name、description、is_public；參數錯誤時返回錯誤響應"""
+    fields = {}
+    if 'name' in payload or not partial:
+        name = payload.get('name')
+        if not isinstance(name, str) or not name.strip():
+            return JsonResponse({'error': '缺少歌單名稱'}, status=400)
+        fields['name'] = name.strip()[:255]
+    if 'description' in payload:
+        if not isinstance(payload['description'], str):
+            return JsonResponse({'error': 'description 必須是字串'}, status=400)
+        fields['description'] = payload['description']
+    if 'is_public' in payload:
+        if not isinstance(payload['is_public'], bool):
+            return JsonResponse({'error': 'is_public 必須是布林值'}, status=400)
+        fields['is_public'] = payload['is_public']
+    return fields
+
+def page_params(request):
+    """歌單項目的 offset/limit（limit 最多 MAX_PAGE_LIMIT）"""
+    try:
+        limit = int(request.GET.get('limit', get_page_size()))
+        offset = int(request.GET.get('offset', 0))
+    except ValueError:
+        return JsonResponse({'error': 'limit、offset 必須是整數'}, status=400)
+    return {'offset': max(offset, 0), 'limit': min(max(limit, 1), MAX_PAGE_LIMIT)}
+
+def get_playlist(playlist_id):
+    try:
+        return Playlist.objects.get(uuid=playlist_id)
+    except Playlist.DoesNotExist:
+        return JsonResponse({'error': '找不到歌單'}, status=404)
+
+def editable_playlist(request, playlist_id):
+    """編輯權杖正確的歌單；找不到或權杖錯誤時返回錯誤響應"""
+    playlist = get_playlist(playlist_id)
+    if isinstance(playlist, HttpResponse):
+        return playlist
+    if not check_edit_token(playlist, request.META.get(TOKEN_HEADER, '')):
+        return JsonResponse({'error': '編輯權杖錯誤'}, status=403)
+    return playlist
+
+def playlist_summary(playlist, item_count):
+    return {
+        'id': str(playlist.uuid),
+        'name': playlist.name,
+        'description': playlist.description,
+        'is_public': playlist.is_public,
+        'item_count': item_count,
+        'created_at': playlist.created_at.isoformat(),
+        'updated_at': playlist.updated_at.isoformat(),
+    }
+
+def item_summary(item, position=None, track=None, fields=None):
+    summary = {'id': item.pk, 'track_id': item.track_id, 'added_at': item.added_at.isoformat()}
+    if position is not None:
+        summary['position'] = position
+        summary['track'] = project_track(track, fields) if track and fields else track
+    return summary
+
+def item_count(playlist):
+    return PlaylistItem.objects.filter(playlist=playlist).count()
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+def playlists(request):
+    """GET：最近更新的公開歌單；POST：建立歌單（可同時加入 track_ids），返回編輯權杖"""
+    if request.method == 'GET':
+        params = page_params(request)
+        if isinstance(params, HttpResponse):
+            return params
+        public = (
+            Playlist.objects.filter(is_public=True).annotate(item_count=Count('items'))
+            .order_by('-updated_at')[params['offset']:params['offset'] + min(params['limit'], 100)]
+        )
+        return JsonResponse({'results': [playlist_summary(playlist, playlist.item_count) for playlist in public]})
+
+    payload = json_payload(request)
+    if isinstance(payload, HttpResponse):
+        return payload
+    fields = playlist_fields(payload)
+    if isinstance(fields, HttpResponse):
+        return fields
+    track_ids = track_ids_param(payload, required=False)
+    if isinstance(track_ids, HttpResponse):
+        return track_ids
+
+    try:
+        playlist, token = create_playlist(**fields, track_ids=track_ids)
+    except PlaylistFull as e:
+        return JsonResponse({'error': str(e)}, status=409)
+    return JsonResponse({**playlist_summary(playlist, len(track_ids)), 'edit_token': token}, status=201)
+
+@csrf_exempt
+@require_http_methods(["GET", "PATCH", "DELETE"])
+@gzip_page
+def playlist_detail(request, playlist_id):
+    """GET：歌單與一頁項目（含音軌數據，支援 fields=）；PATCH：修改名稱、描述、是否公開；DELETE：刪除歌單"""
+    if request.method == 'GET':
+        playlist = get_playlist(playlist_id)
+        if isinstance(playlist, HttpResponse):
+            return playlist
+        params = page_params(request)
+        if isinstance(params, HttpResponse):
+            return params
+
+        fields = parse_fields(request)
+        page = playlist_page(playlist, **params)
+        count = item_count(playlist)
+        next_offset = params['offset'] + len(page)
+        return json_response({
+            **playlist_summary(playlist, count),
+            'offset': params['offset'],
+            'next_offset': next_offset if next_offset < count else None,
+            'items': [
+                item_summary(item, params['offset'] + i, track, fields) for i, (item, track) in enumerate(page)
+            ],
+            'missing': [item.track_id for item, track in page if track is None],
+        })
+
+    playlist = editable_playlist(request, playlist_id)
+    if isinstance(playlist, HttpResponse):
+        return playlist
+
+    if request.method == 'DELETE':
+        playlist.delete()
+        return HttpResponse(status=204)
+
+    payload = json_payload(request)
+    if isinstance(payload, HttpResponse):
+        return payload
+    fields = playlist_fields(payload, partial=True)
+    if isinstance(fields, HttpResponse):
+        return fields
+    for key, value in fields.items():
+        setattr(playlist, key, value)
+    playlist.save(update_fields=[*fields, 'updated_at'])
+    return JsonResponse(playlist_summary(playlist, item_count(playlist)))
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def playlist_items(request, playlist_id):
+    """依序加入音軌（JSON：{"track_ids": [...]}，可加上 before / after / position，預設加到最後）"""
+    playlist = editable_playlist(request, playlist_id)
+    if isinstance(playlist, HttpResponse):
+        return playlist
+    payload = json_payload(request)
+    if isinstance(payload, HttpResponse):
+        return payload
+    track_ids = track_ids_param(payload)
+    if isinstance(track_ids, HttpResponse):
+        return track_ids
+    target = target_params(payload)
+    if isinstance(target, HttpResponse):
+        return target
+
+    try:
+        items = add_tracks(playlist, track_ids, **target)
+    except PlaylistFull as e:
+        return JsonResponse({'error': str(e)}, status=409)
+    except PlaylistError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'results': [item_summary(item) for item in items]}, status=201)
+
+@csrf_exempt
+@require_http_methods(["PATCH", "DELETE"])
+def playlist_item(request, playlist_id, item_id):
+    """PATCH：把項目移到 before / after / position 指定的位置（只更新一行）；DELETE：移除項目"""
+    playlist = editable_playlist(request, playlist_id)
+    if isinstance(playlist, HttpResponse):
+        return playlist
+
+    try:
+        if request.method == 'DELETE':
+            remove_item(playlist, item_id)
+            return HttpResponse(status=204)
+
+        payload = json_payload(request)
+        if isinstance(payload, HttpResponse):
+            return payload
+        target = target_params(payload)
+        if isinstance(target, HttpResponse):
+            return target
+        if not target:
+            return JsonResponse({'error': '缺少 before、after 或 position 參數'}, status=400)
+        item = move_item(playlist, item_id, **target)
+    except PlaylistItem.DoesNotExist:
+        return JsonResponse({'error': '找不到歌單項目'}, status=404)
+    except PlaylistError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(item_summary(item))
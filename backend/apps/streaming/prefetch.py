@@ -0,0 +1,123 @@
+"""播放佇列預取：預先把接下來幾首音軌的數據與開頭一段音訊抓進緩存
+
+- 音軌數據：一次批量請求（jamendo_tracks_request）寫入音軌實體緩存
+- 音訊：每首抓取開頭 STREAMING_PREFETCH_BYTES 位元組所在的區塊
+- 背景執行緒池最多 STREAMING_PREFETCH_WORKERS 個並發；排隊中的音訊位元組超過
+  STREAMING_PREFETCH_MAX_PENDING_BYTES 時新的預取直接略過
+- 已在緩存或已在排隊的音軌不重複預取
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from apps.jamendo.governor import background_priority
+from apps.jamendo.services import jamendo_tracks_request
+
+from .store import store
+from .upstream import AudioUnavailable, ensure_chunks, ensure_meta
+
+logger = logging.getLogger(__name__)
+
+
+class Prefetcher:
+    """有並發與位元組上限的預取佇列；每個進程一個實例"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pending = set()
+        self._pending_bytes = 0
+        self._stats = {'queued': 0, 'cached': 0, 'deduplicated': 0, 'shed': 0, 'completed': 0, 'failed': 0}
+
+    def max_tracks(self):
+        return int(getattr(settings, 'STREAMING_PREFETCH_TRACKS', 3))
+
+    def prefetch_chunks(self):
+        """每首音軌預取的區塊數（至少一塊）"""
+        prefetch_bytes = int(getattr(settings, 'STREAMING_PREFETCH_BYTES', 256 * 1024))
+        return max(1, -(-prefetch_bytes // store.chunk_size()))
+
+    def last_chunk(self, meta, chunks):
+        """要預取的最後一個區塊（短音軌不超過檔案結尾）"""
+        return min(chunks - 1, (meta['size'] - 1) // store.chunk_size())
+
+    def is_cached(self, track_id, chunks):
+        meta = store.meta(track_id)
+        return bool(meta) and not store.missing_chunks(track_id, 0, self.last_chunk(meta, chunks))
+
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                workers = int(getattr(settings, 'STREAMING_PREFETCH_WORKERS', 2))
+                self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='streaming-prefetch')
+            return self._executor
+
+    def submit(self, track_ids):
+        """預取佇列中接下來的音軌，返回 {track_id: 狀態}
+
+        狀態：cached（已在緩存）、queued（已排入）、pending（已在排隊）、shed（超過位元組上限而略過）。
+        """
+        track_ids = list(dict.fromkeys(str(track_id) for track_id in track_ids))[:self.max_tracks()]
+        chunks = self.prefetch_chunks()
+        budget = int(getattr(settings, 'STREAMING_PREFETCH_MAX_PENDING_BYTES', 16 * 1024 * 1024))
+        cost = chunks * store.chunk_size()
+
+        cached = {track_id for track_id in track_ids if self.is_cached(track_id, chunks)}
+        statuses = {}
+        queued = []
+        with self._lock:
+            for track_id in track_ids:
+                if track_id in self._pending:
+                    statuses[track_id] = 'pending'
+                    self._stats['deduplicated'] += 1
+                elif track_id in cached:
+                    statuses[track_id] = 'cached'
+                    self._stats['cached'] += 1
+                elif self._pending_bytes + cost > budget:
+                    statuses[track_id] = 'shed'
+                    self._stats['shed'] += 1
+                else:
+                    statuses[track_id] = 'queued'
+                    self._stats['queued'] += 1
+                    self._pending.add(track_id)
+                    self._pending_bytes += cost
+                    queued.append(track_id)
+
+        if queued:
+            self.executor().submit(self.run, queued, chunks, cost)
+        return statuses
+
+    def run(self, track_ids, chunks, cost):
+        """先批量抓取音軌數據，再依佇列順序抓取每首的開頭區塊（上游請求以背景優先順序送出）"""
+        with background_priority():
+            self.prefetch(track_ids, chunks, cost)
+
+    def prefetch(self, track_ids, chunks, cost):
+        try:
+            jamendo_tracks_request(track_ids)
+        except Exception as e:
+            logger.error(f'預取音軌數據失敗: {str(e)}')
+        for track_id in track_ids:
+            try:
+                meta = ensure_meta(track_id)
+                ensure_chunks(track_id, 0, self.last_chunk(meta, chunks))
+                result = 'completed'
+            except AudioUnavailable as e:
+                logger.warning(f'預取音訊失敗: {track_id} - {str(e)}')
+                result = 'failed'
+            except Exception as e:
+                logger.error(f'預取音訊異常: {track_id} - {str(e)}')
+                result = 'failed'
+            with self._lock:
+                self._pending.discard(track_id)
+                self._pending_bytes -= cost
+                self._stats[result] += 1
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, 'pending': len(self._pending), 'pending_bytes': self._pending_bytes}
+
+
+prefetcher = Prefetcher()
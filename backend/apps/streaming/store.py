@@ -0,0 +1,241 @@
+"""音訊區塊的磁碟緩存
+
+<STREAMING_CACHE_DIR>/<track_id>/ 下每個區塊一個檔案（<編號>.chunk，固定 STREAMING_CHUNK_SIZE 位元組，
+最後一塊可能較短），另有 meta.json 記錄總長度、Content-Type 與寫入時的區塊大小。
+
+- 區塊按編號定址：meta 中的區塊大小與目前的 STREAMING_CHUNK_SIZE 不同時，整個音軌的緩存作廢重新抓取
+
+- 區塊先寫入暫存檔再 os.replace，多個 worker 同時寫同一區塊也不會讀到半個檔案
+- 讀取時更新區塊的 mtime；總大小超過 STREAMING_CACHE_MAX_BYTES 時依 mtime 淘汰最久未讀取的區塊，
+  音軌的最後一個區塊被淘汰時連同 meta.json 與目錄一起刪除
+"""
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class FileSlice:
+    """只讀出檔案中 [offset, offset + length) 的檔案物件
+
+    保留 fileno()：gunicorn 等支援 wsgi.file_wrapper 的伺服器會從目前位置以 sendfile
+    送出 Content-Length 個位元組（零拷貝）；其他伺服器逐塊呼叫 read()。
+    """
+
+    def __init__(self, file, offset, length):
+        self._file = file
+        self._remaining = length
+        file.seek(offset)
+
+    def read(self, size=-1):
+        if self._remaining <= 0:
+            return b''
+        size = self._remaining if size is None or size < 0 else min(size, self._remaining)
+        data = self._file.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def close(self):
+        self._file.close()
+
+
+class ChunkStore:
+    """磁碟區塊緩存；每個進程一個實例，磁碟上的檔案由所有 worker 共用"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 本進程自上次淘汰後寫入的位元組數；超過上限的一小部分才重新掃描目錄
+        self._written = 0
+        self._usage = None
+        self._stats = {'hits': 0, 'misses': 0, 'evicted_bytes': 0}
+
+    def root(self):
+        return Path(getattr(settings, 'STREAMING_CACHE_DIR', Path(tempfile.gettempdir()) / 'ddm360-audio'))
+
+    def chunk_size(self):
+        return int(getattr(settings, 'STREAMING_CHUNK_SIZE', 1024 * 1024))
+
+    def max_bytes(self):
+        return int(getattr(settings, 'STREAMING_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+
+    def track_dir(self, track_id):
+        return self.root() / str(track_id)
+
+    def chunk_path(self, track_id, index):
+        return self.track_dir(track_id) / f'{index}.chunk'
+
+    def chunk_range(self, meta, index):
+        """區塊 index 涵蓋的 (起始位元組, 結束位元組)（含結束位元組）"""
+        start = index * self.chunk_size()
+        return start, min(start + self.chunk_size(), meta['size']) - 1
+
+    def meta(self, track_id):
+        """音訊的總長度與 Content-Type；尚未抓取過，或緩存以不同的區塊大小寫入（已作廢）時返回 None"""
+        try:
+            with open(self.track_dir(track_id) / 'meta.json', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get('chunk_size') != self.chunk_size():
+            # 以舊的區塊大小寫入的區塊按新的位移讀取會得到錯誤的音訊
+            logger.info(f'音軌 {track_id} 的音訊緩存區塊大小已變更，重新抓取')
+            self.drop_track(track_id)
+            return None
+        return meta
+
+    def write_meta(self, track_id, meta):
+        meta = {**meta, 'chunk_size': self.chunk_size()}
+        self._write_atomic(self.track_dir(track_id) / 'meta.json', json.dumps(meta).encode('utf-8'))
+
+    def drop_track(self, track_id):
+        """刪除音軌的所有區塊與 meta"""
+        shutil.rmtree(self.track_dir(track_id), ignore_errors=True)
+        with self._lock:
+            self._usage = None
+
+    def has_chunk(self, track_id, index):
+        return self.chunk_path(track_id, index).exists()
+
+    def missing_chunks(self, track_id, first, last):
+        return [index for index in range(first, last + 1) if not self.has_chunk(track_id, index)]
+
+    def write_chunk(self, track_id, index, data):
+        self._write_atomic(self.chunk_path(track_id, index), data)
+        with self._lock:
+            self._written += len(data)
+            if self._usage is not None:
+                self._usage += len(data)
+            due = self._written >= self.max_bytes() // 20
+        if due:
+            self.evict()
+
+    def open_slice(self, track_id, index, offset, length):
+        """打開區塊中的一段；區塊不在緩存時返回 None"""
+        path = self.chunk_path(track_id, index)
+        try:
+            file = open(path, 'rb')
+        except FileNotFoundError:
+            with self._lock:
+                self._stats['misses'] += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self._stats['hits'] += 1
+        return FileSlice(file, offset, length)
+
+    def read_slice(self, track_id, index, offset, length):
+        """讀出區塊中的一段 bytes；區塊不在緩存時返回 None"""
+        chunk = self.open_slice(track_id, index, offset, length)
+        if chunk is None:
+            return None
+        try:
+            return chunk.read()
+        finally:
+            chunk.close()
+
+    def _write_atomic(self, path, data):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def _scan(self):
+        """返回 [(mtime, 大小, 路徑)]，包括所有 worker 寫入的區塊"""
+        chunks = []
+        root = self.root()
+        if not root.exists():
+            return chunks
+        for track_dir in root.iterdir():
+            if not track_dir.is_dir():
+                continue
+            for entry in os.scandir(track_dir):
+                if entry.name.endswith('.chunk'):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    chunks.append((stat.st_mtime, stat.st_size, entry.path))
+        return chunks
+
+    def evict(self):
+        """總大小超過上限時，淘汰最久未讀取的區塊直到低於上限的 90%"""
+        with self._lock:
+            self._written = 0
+        chunks = self._scan()
+        usage = sum(size for _, size, _ in chunks)
+        limit = self.max_bytes()
+        evicted = 0
+        if usage > limit:
+            target = limit * 0.9
+            track_dirs = set()
+            for _, size, path in sorted(chunks):
+                if usage <= target:
+                    break
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    continue
+                usage -= size
+                evicted += size
+                track_dirs.add(os.path.dirname(path))
+            for track_dir in track_dirs:
+                self._remove_if_empty(track_dir)
+            logger.info(f'音訊緩存淘汰 {evicted} 位元組，剩餘 {usage} 位元組')
+        with self._lock:
+            self._usage = usage
+            self._stats['evicted_bytes'] += evicted
+        return evicted
+
+    def _remove_if_empty(self, track_dir):
+        """音軌已沒有任何區塊時刪除 meta.json 與目錄（其他 worker 同時寫入新區塊時保留）"""
+        try:
+            if any(entry.name.endswith('.chunk') for entry in os.scandir(track_dir)):
+                return
+            os.unlink(os.path.join(track_dir, 'meta.json'))
+        except FileNotFoundError:
+            pass
+        except OSError:
+            return
+        try:
+            os.rmdir(track_dir)
+        except OSError:
+            # 目錄中還有暫存檔或剛寫入的區塊
+            pass
+
+    def stats(self):
+        """目前佔用的磁碟空間（所有 worker 共用）與本進程的命中統計"""
+        if self._usage is None:
+            usage = sum(size for _, size, _ in self._scan())
+            with self._lock:
+                self._usage = usage
+        with self._lock:
+            return {
+                'bytes': self._usage,
+                'max_bytes': self.max_bytes(),
+                'chunk_size': self.chunk_size(),
+                **self._stats,
+            }
+
+
+store = ChunkStore()
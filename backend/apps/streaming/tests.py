@@ -0,0 +1,39 @@
+from django.test import SimpleTestCase, override_settings
+
+from .views import parse_range, resolve_range
+
+
+class ParseRangeTests(SimpleTestCase):
+    def test_single_ranges(self):
+        self.assertEqual(parse_range('bytes=0-99'), (0, 99))
+        self.assertEqual(parse_range('bytes=100-'), (100, None))
+        self.assertEqual(parse_range('bytes=-500'), (None, 500))
+
+    def test_unsupported_or_malformed_ranges_are_ignored(self):
+        for header in (None, '', 'bytes=-', 'bytes=0-1,5-9', 'items=0-1', 'bytes=a-b'):
+            self.assertIsNone(parse_range(header), header)
+
+
+@override_settings(STREAMING_CHUNK_SIZE=100)
+class ResolveRangeTests(SimpleTestCase):
+    def test_no_range_is_the_whole_file(self):
+        self.assertEqual(resolve_range(None, 250), (0, 249))
+
+    def test_open_ended_range_stops_at_the_chunk_end(self):
+        self.assertEqual(resolve_range((0, None), 250), (0, 99))
+        self.assertEqual(resolve_range((150, None), 250), (150, 199))
+        # 最後一個區塊不足一整塊
+        self.assertEqual(resolve_range((220, None), 250), (220, 249))
+
+    def test_closed_range_is_clamped_to_the_file(self):
+        self.assertEqual(resolve_range((50, 180), 250), (50, 180))
+        self.assertEqual(resolve_range((200, 999), 250), (200, 249))
+
+    def test_suffix_range(self):
+        self.assertEqual(resolve_range((None, 50), 250), (200, 249))
+        self.assertEqual(resolve_range((None, 999), 250), (0, 249))
+        self.assertIsNone(resolve_range((None, 0), 250))
+
+    def test_unsatisfiable_ranges(self):
+        self.assertIsNone(resolve_range((250, None), 250))
+        self.assertIsNone(resolve_range((100, 50), 250))
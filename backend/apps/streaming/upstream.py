@@ -0,0 +1,114 @@
+"""從 Jamendo 抓取音訊區塊寫入磁碟緩存"""
+import logging
+import re
+
+import requests
+from django.conf import settings
+
+from apps.jamendo.client import jamendo_stream
+from apps.jamendo.services import jamendo_tracks_request
+from apps.jamendo.singleflight import flight
+
+from .store import store
+
+logger = logging.getLogger(__name__)
+
+CONTENT_RANGE_RE = re.compile(r'bytes (\d+)-(\d+)/(\d+)')
+
+
+class AudioUnavailable(Exception):
+    """上游無法提供音訊"""
+
+
+class AudioNotFound(AudioUnavailable):
+    """找不到音軌或音軌沒有音訊網址"""
+
+
+def resolve_audio_url(track_id):
+    """從音軌數據（通常已在緩存）取得音訊網址"""
+    data = jamendo_tracks_request([str(track_id)])
+    results = (data or {}).get('results') or []
+    url = results[0].get('audio') if results else None
+    if not url:
+        raise AudioNotFound(f'找不到音軌 {track_id} 的音訊')
+    return url
+
+def response_offset_and_size(response):
+    """上游響應的 (起始位元組, 總長度)；206 取自 Content-Range，200 從 0 開始"""
+    if response.status_code == 206:
+        match = CONTENT_RANGE_RE.match(response.headers.get('Content-Range', ''))
+        if match:
+            return int(match.group(1)), int(match.group(3))
+    elif response.status_code == 200 and response.headers.get('Content-Length'):
+        return 0, int(response.headers['Content-Length'])
+    raise AudioUnavailable(f'上游音訊響應無法使用: {response.status_code}')
+
+def fetch_chunks(track_id, first, last):
+    """以一個 Range 請求抓取區塊 first..last（上游忽略 Range 時從頭讀到 last 為止），返回 meta"""
+    url = resolve_audio_url(track_id)
+    chunk_size = store.chunk_size()
+    headers = {'Range': f'bytes={first * chunk_size}-{(last + 1) * chunk_size - 1}', 'Accept': '*/*'}
+    try:
+        # 斷路器開啟或配額不足時拋出的也是 RequestException
+        response = jamendo_stream(url, headers)
+    except requests.exceptions.RequestException as e:
+        raise AudioUnavailable(f'上游音訊請求失敗: {str(e)}') from e
+
+    with response:
+        if response.status_code == 416:
+            # 起點超過檔案結尾：只記下總長度
+            match = re.match(r'bytes \*/(\d+)', response.headers.get('Content-Range', ''))
+            if not match:
+                raise AudioUnavailable('上游音訊響應無法使用: 416')
+            meta = {'size': int(match.group(1)), 'content_type': 'audio/mpeg'}
+            store.write_meta(track_id, meta)
+            return meta
+
+        offset, size = response_offset_and_size(response)
+        if offset % chunk_size:
+            raise AudioUnavailable(f'上游音訊範圍未對齊區塊: {offset}')
+        meta = {'size': size, 'content_type': response.headers.get('Content-Type') or 'audio/mpeg'}
+        store.write_meta(track_id, meta)
+
+        index = offset // chunk_size
+        buffer = bytearray()
+        try:
+            for data in response.iter_content(64 * 1024):
+                buffer += data
+                while len(buffer) >= chunk_size and index <= last:
+                    store.write_chunk(track_id, index, bytes(buffer[:chunk_size]))
+                    del buffer[:chunk_size]
+                    index += 1
+                if index > last:
+                    break
+        except requests.exceptions.RequestException as e:
+            raise AudioUnavailable(f'上游音訊讀取中斷: {str(e)}') from e
+        # 最後一塊比區塊大小短
+        if buffer and index <= last and index * chunk_size + len(buffer) == size:
+            store.write_chunk(track_id, index, bytes(buffer))
+    return meta
+
+def ensure_meta(track_id, first=0):
+    """返回音訊 meta；還沒有時抓取區塊 first（順便得到總長度）"""
+    meta = store.meta(track_id)
+    if meta is None:
+        meta = flight.do(f'audio_{track_id}_{first}', lambda: fetch_chunks(track_id, first, first))
+    return meta
+
+def ensure_chunks(track_id, first, last):
+    """確保區塊 first..last 都在磁碟緩存；連續缺少的區塊合併成一個上游請求
+
+    同一進程內對同一段區塊的並發請求只抓一次。
+    """
+    max_run = max(1, int(getattr(settings, 'STREAMING_FETCH_CHUNKS', 4)))
+    missing = store.missing_chunks(track_id, first, last)
+    while missing:
+        run_start = missing[0]
+        run_end = run_start
+        while run_end + 1 in missing and run_end - run_start + 1 < max_run:
+            run_end += 1
+        flight.do(f'audio_{track_id}_{run_start}', lambda: fetch_chunks(track_id, run_start, run_end))
+        if not store.has_chunk(track_id, run_start):
+            raise AudioUnavailable(f'上游沒有返回音軌 {track_id} 的區塊 {run_start}')
+        # 同一 key 的並發請求可能只抓了較短的一段，重新檢查剩下的區塊
+        missing = store.missing_chunks(track_id, run_start + 1, last)
@@ -1,5 +1,9 @@
 from django.urls import path
+from . import views
 
 urlpatterns = [
-    # 暫時空的，後續可以添加串流相關的端點
-]
\ No newline at end of file
+    # 音訊代理（支援 Range，區塊緩存在本機磁碟）
+    path('tracks/<int:track_id>/audio/', views.track_audio, name='streaming-track-audio'),
+    path('prefetch/', views.prefetch_tracks, name='streaming-prefetch'),
+    path('stats/', views.streaming_stats, name='streaming-stats'),
+]
@@ -0,0 +1,141 @@
+import json
+import logging
+import re
+
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+
+from .prefetch import prefetcher
+from .store import store
+from .upstream import AudioNotFound, AudioUnavailable, ensure_chunks, ensure_meta
+
+logger = logging.getLogger(__name__)
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# 音訊內容不會改變，瀏覽器與 CDN 可以長時間緩存
+AUDIO_CACHE_CONTROL = 'public, max-age=86400'
+
+
+def parse_range(header):
+    """解析單一範圍的 Range 標頭，返回 (start, end)，缺少的一端為 None
+
+    沒有 Range、多重範圍或格式錯誤時返回 None（依 RFC 9110 忽略 Range，返回完整內容）。
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    return (int(start) if start else None, int(end) if end else None)
+
+def resolve_range(requested, size):
+    """把請求的範圍換算成 (start, end)（含 end）；無法滿足時返回 None
+
+    開放結尾的範圍（bytes=a-）只送到 a 所在區塊的結尾：瀏覽器會接著請求下一段，
+    每個響應都能從單一區塊檔案直接送出。
+    """
+    if requested is None:
+        return 0, size - 1
+    start, end = requested
+    if start is None:
+        # bytes=-n：最後 n 個位元組
+        return (max(size - end, 0), size - 1) if end else None
+    if start >= size or (end is not None and end < start):
+        return None
+    if end is None:
+        chunk_size = store.chunk_size()
+        end = (start // chunk_size + 1) * chunk_size - 1
+    return start, min(end, size - 1)
+
+def iter_range(track_id, start, end):
+    """逐區塊讀出 [start, end]；缺少的區塊在送出前才向上游抓取"""
+    chunk_size = store.chunk_size()
+    position = start
+    while position <= end:
+        index = position // chunk_size
+        try:
+            ensure_chunks(track_id, index, end // chunk_size)
+        except AudioUnavailable as e:
+            # 響應標頭已送出，只能提前結束；客戶端會從中斷處重新請求
+            logger.error(f'音訊串流中斷: {track_id} - {str(e)}')
+            return
+        length = min(end, (index + 1) * chunk_size - 1) - position + 1
+        data = store.read_slice(track_id, index, position - index * chunk_size, length)
+        if data is None:
+            logger.error(f'音訊區塊在讀取前被淘汰: {track_id}/{index}')
+            return
+        yield data
+        position += len(data)
+
+def audio_response(track_id, meta, start, end):
+    """範圍在單一區塊內時以檔案響應送出（支援 sendfile），否則逐區塊串流"""
+    chunk_size = store.chunk_size()
+    first, last = start // chunk_size, end // chunk_size
+    ensure_chunks(track_id, first, first)
+    if first == last:
+        body = store.open_slice(track_id, first, start - first * chunk_size, end - start + 1)
+        if body is not None:
+            return FileResponse(body, content_type=meta['content_type'])
+    return StreamingHttpResponse(iter_range(track_id, start, end), content_type=meta['content_type'])
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def track_audio(request, track_id):
+    """音訊代理：支援 Range 請求，已緩存的區塊直接從本機磁碟送出"""
+    requested = parse_range(request.META.get('HTTP_RANGE', ''))
+    try:
+        first = requested[0] // store.chunk_size() if requested and requested[0] is not None else 0
+        meta = ensure_meta(track_id, first)
+        byte_range = resolve_range(requested, meta['size'])
+        if byte_range is None:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f"bytes */{meta['size']}"
+            return response
+        start, end = byte_range
+        response = audio_response(track_id, meta, start, end)
+    except AudioNotFound as e:
+        return JsonResponse({'error': str(e)}, status=404)
+    except AudioUnavailable as e:
+        logger.error(f'音訊代理失敗: {track_id} - {str(e)}')
+        return JsonResponse({'error': '無法取得音訊'}, status=502)
+
+    if requested is not None:
+        response.status_code = 206
+        response['Content-Range'] = f"bytes {start}-{end}/{meta['size']}"
+    response['Content-Length'] = end - start + 1
+    response['Accept-Ranges'] = 'bytes'
+    response['Cache-Control'] = AUDIO_CACHE_CONTROL
+    return response
+
+def prefetch_params(request):
+    """預取請求的音軌 id 列表（JSON：{"track_ids": [...]}，依播放順序）；參數錯誤時返回錯誤響應"""
+    try:
+        payload = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'error': '請求內容不是有效的 JSON'}, status=400)
+    
+    track_ids = payload.get('track_ids') if isinstance(payload, dict) else None
+    if not isinstance(track_ids, list) or not track_ids:
+        return JsonResponse({'error': '缺少 track_ids 參數'}, status=400)
+    track_ids = [str(track_id) for track_id in track_ids[:50]]
+    if not all(track_id.isdigit() for track_id in track_ids):
+        return JsonResponse({'error': 'track_ids 只能包含數字音軌 ID'}, status=400)
+    
+    return track_ids
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def prefetch_tracks(request):
+    """預取播放佇列中接下來幾首音軌的數據與開頭音訊（背景執行，立即返回）"""
+    params = prefetch_params(request)
+    if isinstance(params, HttpResponse):
+        return params
+    
+    return JsonResponse({'results': prefetcher.submit(params)}, status=202)
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def streaming_stats(request):
+    """音訊區塊緩存與預取的統計數據"""
+    return JsonResponse({'cache': store.stats(), 'prefetch': prefetcher.stats()})
@@ -0,0 +1,241 @@
+"""收聽紀錄的寫入：事件先放在進程內緩衝區，累積到一定數量或時間後批量寫入
+
+- 每個 worker 一個緩衝區與一個背景寫入執行緒；緩衝區達 USERS_HISTORY_FLUSH_SIZE 時立即喚醒，
+  否則每 USERS_HISTORY_FLUSH_INTERVAL 秒寫入一次；進程結束時寫入剩餘的事件
+- 一次寫入是一個交易：原始事件以 executemany 批量 INSERT（緩衝區中存的是欄位值的 tuple，
+  不經過模型實例與 bulk_create 的逐欄轉換）；同一批事件先在記憶體中按（聽眾, 音軌）合併，
+  再以 INSERT ... ON CONFLICT DO UPDATE 累加到 PlayCount（SQLite 與 PostgreSQL 語法相同）
+- 寫入失敗時事件放回緩衝區等下次重試；資料庫拒絕的事件（約束或數據錯誤，重試也不會成功）
+  以二分找出後丟棄，其餘照常寫入；緩衝區超過 USERS_HISTORY_MAX_PENDING 時丟棄新事件
+
+事件寫入資料庫前只存在於記憶體中，統計最多落後一個寫入間隔。
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, DataError, IntegrityError, close_old_connections, connection, transaction
+from django.utils import timezone
+
+from apps.jamendo.metrics import Counter, register_collector
+
+from .models import PlayCount, PlayEvent
+
+logger = logging.getLogger(__name__)
+
+# 播放位置在這個秒數以內的 play 事件才算一次播放（之後的是暫停後繼續）
+PLAY_START_POSITION = 3.0
+
+# 緩衝區中每個事件的欄位（PlayEvent 的欄位名與資料庫欄位名相同）
+EVENT_COLUMNS = ('listener', 'track_id', 'event', 'position', 'elapsed', 'occurred_at', 'received_at')
+
+# 每次 executemany 送出的行數
+WRITE_BATCH_SIZE = 1000
+
+# 積壓很多事件時分成多個交易寫入，每個交易最多這麼多事件（SQLite 寫鎖不會一次佔用太久）
+MAX_TRANSACTION_EVENTS = 5000
+
+play_events = Counter(
+    'play_events_total', '收聽事件（accepted、rejected、dropped、written、failed、discarded）', ('result',),
+)
+
+
+def get_flush_size():
+    return int(getattr(settings, 'USERS_HISTORY_FLUSH_SIZE', 500))
+
+def get_flush_interval():
+    return float(getattr(settings, 'USERS_HISTORY_FLUSH_INTERVAL', 5))
+
+def get_max_pending():
+    return int(getattr(settings, 'USERS_HISTORY_MAX_PENDING', 50000))
+
+def aggregate(events):
+    """按（聽眾, 音軌）合併一批事件，返回 {(聽眾, 音軌): [播放, 完播, 收聽秒數, 最後播放時間]}"""
+    totals = {}
+    for listener, track_id, event, position, elapsed, occurred_at, _ in events:
+        total = totals.get((listener, track_id))
+        if total is None:
+            total = totals[listener, track_id] = [0, 0, 0.0, occurred_at]
+        if event == PlayEvent.PLAY and position < PLAY_START_POSITION:
+            total[0] += 1
+        elif event == PlayEvent.ENDED:
+            total[1] += 1
+        total[2] += elapsed
+        if occurred_at > total[3]:
+            total[3] = occurred_at
+    return totals
+
+def insert_sql():
+    table = connection.ops.quote_name(PlayEvent._meta.db_table)
+    return f"INSERT INTO {table} ({', '.join(EVENT_COLUMNS)}) VALUES ({', '.join(['%s'] * len(EVENT_COLUMNS))})"
+
+def upsert_sql():
+    table = connection.ops.quote_name(PlayCount._meta.db_table)
+    return (
+        f'INSERT INTO {table} (listener, track_id, plays, completions, seconds_listened, last_played_at) '
+        f'VALUES (%s, %s, %s, %s, %s, %s) '
+        f'ON CONFLICT (listener, track_id) DO UPDATE SET '
+        f'plays = {table}.plays + excluded.plays, '
+        f'completions = {table}.completions + excluded.completions, '
+        f'seconds_listened = {table}.seconds_listened + excluded.seconds_listened, '
+        f'last_played_at = CASE WHEN excluded.last_played_at > {table}.last_played_at '
+        f'THEN excluded.last_played_at ELSE {table}.last_played_at END'
+    )
+
+def execute_batched(cursor, sql, rows):
+    for start in range(0, len(rows), WRITE_BATCH_SIZE):
+        cursor.executemany(sql, rows[start:start + WRITE_BATCH_SIZE])
+
+@transaction.atomic
+def write_events(events):
+    """寫入一批事件（EVENT_COLUMNS 順序的 tuple）並累加統計"""
+    adapted = {}
+
+    def adapt(value):
+        # 同一個請求的事件共用 received_at，轉換一次即可
+        if value not in adapted:
+            adapted[value] = connection.ops.adapt_datetimefield_value(value)
+        return adapted[value]
+
+    event_rows = [(*event[:5], adapt(event[5]), adapt(event[6])) for event in events]
+    count_rows = [
+        (listener, track_id, plays, completions, seconds, adapt(last_played_at))
+        for (listener, track_id), (plays, completions, seconds, last_played_at) in aggregate(events).items()
+    ]
+    with connection.cursor() as cursor:
+        execute_batched(cursor, insert_sql(), event_rows)
+        execute_batched(cursor, upsert_sql(), count_rows)
+
+
+class PlayEventBuffer:
+    """進程內的事件緩衝區與背景寫入執行緒"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pending = []
+        self._dropped = 0  # 上次寫入以來丟棄的事件數（每次寫入時記錄一次，避免過載時每個請求都寫日誌）
+        self._stats = {'accepted': 0, 'dropped': 0, 'written': 0, 'discarded': 0, 'flushes': 0, 'failed_flushes': 0, 'last_flush_ms': None}
+
+    def add(self, events):
+        """放入事件，返回接受的數量（緩衝區已滿時丟棄其餘的）"""
+        self.ensure_started()
+        with self._lock:
+            accepted = events[:max(get_max_pending() - len(self._pending), 0)]
+            self._pending.extend(accepted)
+            self._stats['accepted'] += len(accepted)
+            self._stats['dropped'] += len(events) - len(accepted)
+            self._dropped += len(events) - len(accepted)
+            full = len(self._pending) >= get_flush_size()
+        play_events.inc('accepted', amount=len(accepted))
+        if len(events) > len(accepted):
+            play_events.inc('dropped', amount=len(events) - len(accepted))
+        if full:
+            self._wake.set()
+        return len(accepted)
+
+    def flush(self):
+        """把目前緩衝的事件寫入資料庫，返回寫入數；同一進程同時只有一個寫入"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+                dropped, self._dropped = self._dropped, 0
+            if dropped:
+                logger.warning(f'收聽事件緩衝區已滿，上次寫入以來丟棄 {dropped} 個事件')
+            if not batch:
+                return 0
+
+            start = time.perf_counter()
+            chunks = [batch[offset:offset + MAX_TRANSACTION_EVENTS] for offset in range(0, len(batch), MAX_TRANSACTION_EVENTS)]
+            written = discarded = 0
+            while chunks:
+                chunk = chunks[0]
+                try:
+                    write_events(chunk)
+                    written += len(chunk)
+                except (IntegrityError, DataError) as e:
+                    if len(chunk) > 1:
+                        # 資料庫拒絕其中某些事件：二分找出被拒絕的，其餘照常寫入
+                        middle = len(chunk) // 2
+                        chunks[:1] = [chunk[:middle], chunk[middle:]]
+                        continue
+                    logger.error(f'收聽事件被資料庫拒絕，已丟棄: {chunk[0][:3]} - {str(e)}')
+                    discarded += 1
+                except DatabaseError as e:
+                    failed = [event for chunk in chunks for event in chunk]
+                    logger.error(f'收聽事件寫入失敗，{len(failed)} 個事件留待重試: {str(e)}')
+                    play_events.inc('failed', amount=len(failed))
+                    self.record_written(written, discarded)
+                    with self._lock:
+                        # 放回緩衝區前面（保持順序），仍受緩衝區上限限制
+                        self._pending = failed[:max(get_max_pending() - len(self._pending), 0)] + self._pending
+                        self._stats['failed_flushes'] += 1
+                    return written
+                chunks.pop(0)
+
+            self.record_written(written, discarded)
+            with self._lock:
+                self._stats['flushes'] += 1
+                self._stats['last_flush_ms'] = round((time.perf_counter() - start) * 1000, 1)
+            return written
+
+    def record_written(self, written, discarded):
+        if written:
+            play_events.inc('written', amount=written)
+        if discarded:
+            play_events.inc('discarded', amount=discarded)
+        with self._lock:
+            self._stats['written'] += written
+            self._stats['discarded'] += discarded
+
+    def run(self):
+        while True:
+            self._wake.wait(get_flush_interval())
+            self._wake.clear()
+            # 背景執行緒不經過請求週期：自行關閉過期或已斷線的資料庫連線
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f'收聽事件寫入異常: {str(e)}')
+
+    def ensure_started(self):
+        """第一次放入事件時才啟動背景寫入執行緒（每個進程一個），並在進程結束時寫入剩餘的事件"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None:
+                atexit.register(self.flush)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self.run, name='users-history-flush', daemon=True)
+                self._thread.start()
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, 'pending': len(self._pending)}
+
+
+buffer = PlayEventBuffer()
+
+
+def record_events(listener, events):
+    """把已驗證的事件 [{type, track_id, position, elapsed, occurred_at}] 放入緩衝區，返回接受的數量"""
+    received_at = timezone.now()
+    return buffer.add([
+        (listener, event['track_id'], event['type'], event['position'], event['elapsed'], event['occurred_at'], received_at)
+        for event in events
+    ])
+
+def collect_buffer_state():
+    return [('play_events_pending', 'gauge', '等待寫入資料庫的收聽事件數', [({}, buffer.pending())])]
+
+
+register_collector(collect_buffer_state)
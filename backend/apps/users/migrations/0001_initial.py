@@ -0,0 +1,46 @@
+# Generated by Django 5.2.3 on 2026-10-17 18:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlayCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('listener', models.CharField(max_length=64)),
+                ('track_id', models.CharField(max_length=32)),
+                ('plays', models.PositiveIntegerField(default=0)),
+                ('completions', models.PositiveIntegerField(default=0)),
+                ('seconds_listened', models.FloatField(default=0)),
+                ('last_played_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['listener', '-last_played_at'], name='users_playcount_recent'), models.Index(fields=['listener', '-plays'], name='users_playcount_top')],
+                'constraints': [models.UniqueConstraint(fields=('listener', 'track_id'), name='users_playcount_unique_listener_track')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PlayEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('listener', models.CharField(max_length=64)),
+                ('track_id', models.CharField(max_length=32)),
+                ('event', models.CharField(choices=[('play', '播放'), ('pause', '暫停'), ('timeupdate', '播放進度'), ('ended', '播放完畢')], max_length=16)),
+                ('position', models.FloatField(default=0)),
+                ('elapsed', models.FloatField(default=0)),
+                ('occurred_at', models.DateTimeField()),
+                ('received_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['listener', 'occurred_at'], name='users_play_event_listener')],
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+from django.db import models
+
+
+class PlayEvent(models.Model):
+    """播放器送出的原始事件（只追加）；統計請查 PlayCount，不必掃描這張表
+
+    listener 是聽眾 id（前端產生並保存的匿名 id）。
+    """
+    PLAY = 'play'
+    PAUSE = 'pause'
+    TIMEUPDATE = 'timeupdate'
+    ENDED = 'ended'
+    EVENT_CHOICES = [
+        (PLAY, '播放'),
+        (PAUSE, '暫停'),
+        (TIMEUPDATE, '播放進度'),
+        (ENDED, '播放完畢'),
+    ]
+
+    listener = models.CharField(max_length=64)
+    track_id = models.CharField(max_length=32)
+    event = models.CharField(max_length=16, choices=EVENT_CHOICES)
+    position = models.FloatField(default=0)  # 事件發生時的播放位置（秒）
+    elapsed = models.FloatField(default=0)  # 距離同一首音軌的上一個事件實際收聽的秒數
+    occurred_at = models.DateTimeField()
+    received_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['listener', 'occurred_at'], name='users_play_event_listener'),
+        ]
+
+    def __str__(self):
+        return f'{self.listener}:{self.track_id}:{self.event}'
+
+
+class PlayCount(models.Model):
+    """每位聽眾、每首音軌的累計播放統計；寫入事件時在同一個交易中增量更新"""
+    listener = models.CharField(max_length=64)
+    track_id = models.CharField(max_length=32)
+    plays = models.PositiveIntegerField(default=0)
+    completions = models.PositiveIntegerField(default=0)
+    seconds_listened = models.FloatField(default=0)
+    last_played_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['listener', 'track_id'], name='users_playcount_unique_listener_track'),
+        ]
+        indexes = [
+            models.Index(fields=['listener', '-last_played_at'], name='users_playcount_recent'),
+            models.Index(fields=['listener', '-plays'], name='users_playcount_top'),
+        ]
+
+    def __str__(self):
+        return f'{self.listener}:{self.track_id}'
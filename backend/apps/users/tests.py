@@ -0,0 +1,83 @@
+import json
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .history import PlayEventBuffer, aggregate, buffer
+from .models import PlayCount, PlayEvent
+from .views import parse_event
+
+
+def event_row(listener, track_id, event, position=0.0, elapsed=0.0, occurred_at=None):
+    now = timezone.now()
+    return (listener, track_id, event, position, elapsed, occurred_at or now, now)
+
+
+class ParseEventTests(TestCase):
+    def test_rejects_non_finite_numbers(self):
+        now = timezone.now()
+        for field in ('position', 'elapsed'):
+            for value in (float('nan'), float('inf'), float('-inf')):
+                event = {'type': 'play', 'track_id': '1', field: value}
+                self.assertIsNone(parse_event(event, now), f'{field}={value}')
+
+    def test_clamps_position_and_elapsed(self):
+        now = timezone.now()
+        event = parse_event({'type': 'timeupdate', 'track_id': '1', 'position': -5, 'elapsed': 99999}, now)
+        self.assertEqual(event['position'], 0.0)
+        self.assertEqual(event['elapsed'], 3600)
+
+
+# 背景寫入執行緒不在測試期間寫入：測試自己呼叫 flush
+@override_settings(USERS_HISTORY_FLUSH_INTERVAL=3600)
+class PlayEventBufferTests(TestCase):
+    def test_aggregate_counts_plays_completions_and_seconds(self):
+        earlier = timezone.now() - timedelta(minutes=5)
+        later = timezone.now()
+        totals = aggregate([
+            event_row('a', '1', PlayEvent.PLAY, position=0.0, occurred_at=earlier),
+            event_row('a', '1', PlayEvent.PLAY, position=42.0, occurred_at=earlier),  # 暫停後繼續
+            event_row('a', '1', PlayEvent.TIMEUPDATE, elapsed=30.0, occurred_at=later),
+            event_row('a', '1', PlayEvent.ENDED, elapsed=12.5, occurred_at=earlier),
+            event_row('b', '1', PlayEvent.PLAY, occurred_at=earlier),
+        ])
+        self.assertEqual(totals['a', '1'], [1, 1, 42.5, later])
+        self.assertEqual(totals['b', '1'], [1, 0, 0.0, earlier])
+
+    def test_flush_accumulates_counts_across_batches(self):
+        events = PlayEventBuffer()
+        events.add([event_row('a', '1', PlayEvent.PLAY), event_row('a', '1', PlayEvent.TIMEUPDATE, elapsed=10.0)])
+        self.assertEqual(events.flush(), 2)
+        events.add([event_row('a', '1', PlayEvent.PLAY), event_row('a', '1', PlayEvent.ENDED, elapsed=5.0)])
+        self.assertEqual(events.flush(), 2)
+
+        count = PlayCount.objects.get(listener='a', track_id='1')
+        self.assertEqual((count.plays, count.completions, count.seconds_listened), (2, 1, 15.0))
+        self.assertEqual(PlayEvent.objects.count(), 4)
+
+    def test_rejected_event_is_dropped_and_the_rest_written(self):
+        events = PlayEventBuffer()
+        events.add([
+            event_row('a', '1', PlayEvent.PLAY),
+            event_row('a', '2', PlayEvent.PLAY, position=float('nan')),  # SQLite 把 NaN 當成 NULL，NOT NULL 約束失敗
+            event_row('a', '3', PlayEvent.PLAY),
+        ])
+        self.assertEqual(events.flush(), 2)
+        self.assertEqual(events.pending(), 0)
+        self.assertEqual(events.stats()['discarded'], 1)
+        self.assertEqual(sorted(PlayEvent.objects.values_list('track_id', flat=True)), ['1', '3'])
+
+    def test_nan_event_does_not_block_later_events(self):
+        buffer.flush()
+        for position in ('NaN', '0'):
+            response = self.client.post(
+                '/api/users/history/events/',
+                '{"listener": "a", "events": [{"type": "play", "track_id": "7", "position": %s}]}' % position,
+                content_type='application/json',
+            )
+            self.assertEqual(response.status_code, 202)
+        self.assertEqual(json.loads(response.content)['accepted'], 1)
+        buffer.flush()
+        self.assertEqual(buffer.pending(), 0)
+        self.assertEqual(PlayEvent.objects.count(), 1)
@@ -1,9 +1,10 @@
 from django.urls import path
-from django.http import JsonResponse
-
-def users_health_check(request):
-    return JsonResponse({'status': 'healthy', 'app': 'users'})
+from . import views
 
 urlpatterns = [
-    path('health/', users_health_check, name='users-health'),
-]
\ No newline at end of file
+    path('health/', views.users_health_check, name='users-health'),
+    # 收聽紀錄：事件批量寫入（緩衝後寫入資料庫）與累計統計
+    path('history/events/', views.ingest_events, name='users-history-events'),
+    path('history/', views.listening_history, name='users-history'),
+    path('history/stats/', views.history_stats, name='users-history-stats'),
+]
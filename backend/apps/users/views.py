@@ -0,0 +1,158 @@
+from datetime import datetime, timezone as dt_timezone
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+from django.views.decorators.cache import never_cache
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+import json
+import logging
+import math
+import re
+
+from .history import buffer, play_events, record_events
+from .models import PlayCount, PlayEvent
+
+logger = logging.getLogger(__name__)
+
+# 一次請求最多帶的事件數（前端應每隔幾秒或累積一批後送出）
+MAX_EVENTS_PER_REQUEST = 500
+
+# 事件時間早於這個秒數的拒絕（例如離線很久後才送出的紀錄）；晚於伺服器時間的視為現在
+MAX_EVENT_AGE = 7 * 24 * 3600
+
+# 單一事件的收聽秒數上限（超過的視為客戶端計時錯誤）
+MAX_ELAPSED = 3600
+
+# 播放統計一次最多返回的音軌數
+MAX_HISTORY_LIMIT = 200
+
+LISTENER_PATTERN = re.compile(r'^[A-Za-z0-9_:.-]{1,64}$')
+EVENT_TYPES = {choice for choice, _ in PlayEvent.EVENT_CHOICES}
+
+
+def users_health_check(request):
+    return JsonResponse({'status': 'healthy', 'app': 'users'})
+
+def listener_param(value):
+    """聽眾 id（前端產生並保存的匿名 id）；格式錯誤時返回錯誤響應"""
+    if not isinstance(value, str) or not LISTENER_PATTERN.match(value):
+        return JsonResponse({'error': 'listener 必須是 1-64 個英數字元'}, status=400)
+    return value
+
+def limit_param(value):
+    """查詢的 limit，限制在 1 到 MAX_HISTORY_LIMIT；不是整數時返回錯誤響應"""
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        return JsonResponse({'error': 'limit 必須是整數'}, status=400)
+    return min(max(limit, 1), MAX_HISTORY_LIMIT)
+
+def parse_event(event, now):
+    """驗證並正規化一個事件；無效時返回 None"""
+    if not isinstance(event, dict) or event.get('type') not in EVENT_TYPES:
+        return None
+    track_id = str(event.get('track_id', ''))
+    if not track_id.isdigit() or len(track_id) > 32:
+        return None
+    try:
+        position = float(event.get('position') or 0)
+        elapsed = float(event.get('elapsed') or 0)
+        at = event.get('at')
+        occurred_at = datetime.fromtimestamp(float(at), dt_timezone.utc) if at is not None else now
+    except (TypeError, ValueError, OverflowError, OSError):
+        return None
+    # json.loads 接受 NaN 與 Infinity，float() 也會保留
+    if not math.isfinite(position) or not math.isfinite(elapsed):
+        return None
+    if (now - occurred_at).total_seconds() > MAX_EVENT_AGE:
+        return None
+    return {
+        'type': event['type'],
+        'track_id': track_id,
+        'position': max(position, 0.0),
+        'elapsed': min(max(elapsed, 0.0), MAX_ELAPSED),
+        'occurred_at': min(occurred_at, now),
+    }
+
+def events_params(request):
+    """事件請求（JSON：{"listener": "...", "events": [{"type", "track_id", "position", "elapsed", "at"}]}）
+
+    at 是事件發生的 Unix 時間（秒）。返回 (聽眾, 有效事件, 無效事件數)；請求格式錯誤時返回錯誤響應。
+    """
+    try:
+        payload = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'error': '請求內容不是有效的 JSON'}, status=400)
+    if not isinstance(payload, dict):
+        return JsonResponse({'error': '請求內容必須是 JSON 物件'}, status=400)
+
+    listener = listener_param(payload.get('listener'))
+    if isinstance(listener, HttpResponse):
+        return listener
+    events = payload.get('events')
+    if not isinstance(events, list) or not events:
+        return JsonResponse({'error': '缺少 events 參數'}, status=400)
+    if len(events) > MAX_EVENTS_PER_REQUEST:
+        return JsonResponse({'error': f'一次最多送出 {MAX_EVENTS_PER_REQUEST} 個事件'}, status=400)
+
+    now = timezone.now()
+    parsed = [parse_event(event, now) for event in events]
+    valid = [event for event in parsed if event is not None]
+    return listener, valid, len(parsed) - len(valid)
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def ingest_events(request):
+    """接收播放器批量送出的收聽事件（放入緩衝區後立即返回，稍後批量寫入）"""
+    params = events_params(request)
+    if isinstance(params, HttpResponse):
+        return params
+
+    listener, events, rejected = params
+    accepted = record_events(listener, events) if events else 0
+    if rejected:
+        play_events.inc('rejected', amount=rejected)
+    return JsonResponse({
+        'accepted': accepted,
+        'rejected': rejected,
+        'dropped': len(events) - accepted,
+    }, status=202)
+
+@csrf_exempt
+@require_http_methods(["GET"])
+@never_cache
+def listening_history(request):
+    """聽眾的播放統計（讀取累計表）：order=recent 依最後播放時間，order=top 依播放次數"""
+    listener = listener_param(request.GET.get('listener'))
+    if isinstance(listener, HttpResponse):
+        return listener
+    order = request.GET.get('order', 'recent')
+    if order not in ('recent', 'top'):
+        return JsonResponse({'error': 'order 只能是 recent 或 top'}, status=400)
+    limit = limit_param(request.GET.get('limit', 50))
+    if isinstance(limit, HttpResponse):
+        return limit
+
+    counts = PlayCount.objects.filter(listener=listener).order_by(
+        '-last_played_at' if order == 'recent' else '-plays', 'track_id',
+    )[:limit]
+    return JsonResponse({
+        'listener': listener,
+        'order': order,
+        'results': [
+            {
+                'track_id': count.track_id,
+                'plays': count.plays,
+                'completions': count.completions,
+                'seconds_listened': round(count.seconds_listened, 1),
+                'last_played_at': count.last_played_at.isoformat(),
+            }
+            for count in counts
+        ],
+    })
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def history_stats(request):
+    """本 worker 的收聽事件緩衝區統計"""
+    return JsonResponse({'buffer': buffer.stats()})
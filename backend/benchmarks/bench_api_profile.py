@@ -0,0 +1,144 @@
+"""完整設定與只提供 API 的部署設定（DJANGO_API_ONLY）的比較：worker 啟動時間與每個請求的框架開銷
+
+每種設定啟動多個新進程，每個進程量測：
+- 啟動：從匯入 Django 到 WSGI application 建立完成（django.setup、載入中介層與 URL 設定）並處理完第一個請求的時間，
+  以及啟動後已載入的模組數與常駐記憶體
+- 每個請求：直接呼叫 WSGI application（不經過網路與伺服器）處理不需要上游與資料庫的 Jamendo 端點，
+  量到的幾乎全是中介層、URL 解析與響應的開銷
+
+    python -m benchmarks.bench_api_profile --boots 5 --requests 20000 --json api_profile.json
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from io import BytesIO
+from pathlib import Path
+
+from .bench_asgi import BACKEND_DIR
+
+PROFILES = (('full', 'False'), ('api', 'True'))
+
+# (名稱, 路徑, 查詢字串)：都只在進程內處理
+ROUTES = (
+    ('config', '/api/jamendo/config/', ''),
+    ('autocomplete', '/api/jamendo/autocomplete/', 'q=da&limit=8'),
+)
+
+
+def make_environ(path, query):
+    return {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'SERVER_NAME': '127.0.0.1',
+        'SERVER_PORT': '8000',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': '127.0.0.1:8000',
+        'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+
+def call(application, path, query):
+    status = []
+    body = application(make_environ(path, query), lambda code, headers: status.append(code))
+    b''.join(body)
+    body.close()
+    return status[0]
+
+def child(requests):
+    """在新進程中量測一種設定（由父進程以環境變數選擇），結果以 JSON 寫到標準輸出"""
+    start = time.perf_counter()
+    from django.conf import settings
+    from django.core.wsgi import get_wsgi_application
+
+    application = get_wsgi_application()
+    # 搜尋建議索引不從曲庫載入：只量測框架開銷
+    from apps.jamendo.autocomplete import index
+    index._seeded = True
+    assert call(application, *ROUTES[0][1:]).startswith('200')
+    boot_ms = (time.perf_counter() - start) * 1000
+
+    result = {
+        'boot_ms': round(boot_ms, 1),
+        'modules': len(sys.modules),
+        'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'installed_apps': len(settings.INSTALLED_APPS),
+        'middleware': len(settings.MIDDLEWARE),
+    }
+    for name, path, query in ROUTES:
+        for _ in range(min(requests // 10, 1000)):
+            call(application, path, query)
+        timings = []
+        for _ in range(requests):
+            begin = time.perf_counter()
+            status = call(application, path, query)
+            timings.append(time.perf_counter() - begin)
+        assert status.startswith('200'), status
+        result[name] = {
+            'p50_us': round(statistics.median(timings) * 1e6, 1),
+            'mean_us': round(statistics.fmean(timings) * 1e6, 1),
+        }
+    print(json.dumps(result))
+
+def run_profile(api_only, boots, requests):
+    env = {
+        **os.environ,
+        'DJANGO_SETTINGS_MODULE': 'music_streaming.settings',
+        'DJANGO_API_ONLY': api_only,
+        'DEBUG': 'False',
+        # 所有請求來自同一位址，不做每客戶端限流；避免意外請求真正的 Jamendo
+        'API_THROTTLE_RATE': '0',
+        'JAMENDO_API_BASE': 'http://127.0.0.1:9/v3.0',
+    }
+    runs = []
+    for i in range(boots):
+        # 只有第一個進程量測請求開銷，其餘只量測啟動
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.bench_api_profile', '--child', '--requests', str(requests if i == 0 else 1)],
+            cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+        ).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    result = {**runs[0], 'boot_ms': round(statistics.median(run['boot_ms'] for run in runs), 1)}
+    result['boot_ms_runs'] = [run['boot_ms'] for run in runs]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='API 部署設定基準測試')
+    parser.add_argument('--boots', type=int, default=5, help='每種設定啟動的進程數（啟動時間取中位數）')
+    parser.add_argument('--requests', type=int, default=20000, help='每個端點的請求數')
+    parser.add_argument('--json', help='將結果寫入 JSON 檔案')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.requests)
+        return
+
+    results = {}
+    for name, api_only in PROFILES:
+        result = results[name] = run_profile(api_only, args.boots, args.requests)
+        print(
+            f"{name:<5} 啟動 {result['boot_ms']:>7} ms  模組 {result['modules']:>5}  RSS {result['max_rss_mb']:>6} MB  "
+            f"apps {result['installed_apps']:>2}  中介層 {result['middleware']:>2}"
+        )
+        for route, *_ in ROUTES:
+            print(f"      {route:<13} p50 {result[route]['p50_us']:>7} µs  平均 {result[route]['mean_us']:>7} µs")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""WSGI 與 ASGI 下 Jamendo 視圖的並發能力比較
+
+對本地 stub 上游（固定延遲）發出不重複的搜尋請求，讓每個請求都要等上游，
+比較同步視圖（gunicorn gthread）與非同步視圖（uvicorn）在相同 worker 數下的吞吐量與延遲。
+
+需要額外安裝 gunicorn 與 uvicorn：
+    pip install gunicorn uvicorn
+    python -m benchmarks.bench_asgi --requests 400 --concurrency 200 --json results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+
+from .stub_jamendo import spawn_stub
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'伺服器未在 {timeout}s 內啟動 (port {port})')
+
+
+def server_command(mode, port, threads):
+    if mode == 'wsgi':
+        return [
+            sys.executable, '-m', 'gunicorn', 'music_streaming.wsgi:application',
+            '--bind', f'127.0.0.1:{port}', '--workers', '1',
+            '--worker-class', 'gthread', '--threads', str(threads), '--log-level', 'warning',
+        ]
+    return [
+        sys.executable, '-m', 'uvicorn', 'music_streaming.asgi:application',
+        '--host', '127.0.0.1', '--port', str(port), '--workers', '1', '--log-level', 'warning',
+    ]
+
+
+async def drive(base_url, total, concurrency):
+    """以固定並發數發出 total 個不重複的搜尋請求，返回每個請求的延遲"""
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    run_id = uuid.uuid4().hex[:8]
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        async def one(i):
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get('/api/jamendo/search/', params={'q': f'{run_id}-{i}', 'limit': 20})
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - start
+    return latencies, errors, elapsed
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_mode(mode, api_base, args):
+    port = free_port()
+    env = {
+        **os.environ,
+        'DJANGO_SETTINGS_MODULE': 'music_streaming.settings',
+        'JAMENDO_API_BASE': api_base,
+        'JAMENDO_ASYNC_VIEWS': 'True' if mode == 'asgi' else 'False',
+        'DEBUG': 'False',
+        # 壓測客戶端只有一個位址、stub 也沒有配額：關閉限流，量測的是緩存與視圖本身
+        'JAMENDO_QUOTA_RATE': '0',
+        'API_THROTTLE_RATE': '0',
+    }
+    process = subprocess.Popen(server_command(mode, port, args.threads), cwd=BACKEND_DIR, env=env)
+    try:
+        wait_for_port(port)
+        latencies, errors, elapsed = asyncio.run(drive(f'http://127.0.0.1:{port}', args.requests, args.concurrency))
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+    return {
+        'mode': mode,
+        'requests': args.requests,
+        'concurrency': args.concurrency,
+        'errors': errors,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(args.requests / elapsed, 1),
+        'p50_ms': round(statistics.median(latencies) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='WSGI vs ASGI Jamendo 視圖並發基準測試')
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.2, help='stub 上游延遲（秒）')
+    parser.add_argument('--threads', type=int, default=8, help='WSGI gthread worker 的執行緒數')
+    parser.add_argument('--modes', default='wsgi,asgi')
+    parser.add_argument('--json', help='將結果寫入 JSON 檔案')
+    args = parser.parse_args()
+
+    stub_port = free_port()
+    stub, api_base = spawn_stub(stub_port, latency=args.latency)
+    try:
+        wait_for_port(stub_port)
+        results = [run_mode(mode, api_base, args) for mode in args.modes.split(',')]
+    finally:
+        stub.terminate()
+        stub.wait(timeout=10)
+
+    for result in results:
+        print(
+            f"{result['mode']:>5}: {result['throughput_rps']:>8} req/s  "
+            f"p50 {result['p50_ms']:>8} ms  p99 {result['p99_ms']:>8} ms  errors {result['errors']}"
+        )
+    if args.json:
+        Path(args.json).write_text(json.dumps({'upstream_latency_s': args.latency, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
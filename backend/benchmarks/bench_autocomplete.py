@@ -0,0 +1,204 @@
+"""搜尋建議（autocomplete/）的查詢延遲、增量更新與記憶體用量
+
+以合成的音軌（隨機音節組成的音軌名、藝人、專輯，長尾分布的標籤）模擬上游的熱門度列表響應填滿索引，
+直到建議數達到 AUTOCOMPLETE_MAX_ENTRIES（之後持續淘汰），然後量測：
+- 查詢：模擬逐字輸入，對隨機建議取 1 到 12 個字元的前綴（部分查詢含兩個字詞）的 p50/p99，
+  只計算索引查找與經過整個端點（Django 測試客戶端）兩種
+- 更新：加入一頁（200 首）上游響應的時間，以及另一執行緒持續加入時的查詢延遲
+- 記憶體：tracemalloc 量到的索引大小（以同樣的種子另外建立一次，避免 tracemalloc 影響計時）
+
+    python -m benchmarks.bench_autocomplete --tracks 100000 --max-entries 50000 --json autocomplete.json
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+from urllib.parse import quote
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'music_streaming.settings')
+# 查詢只讀進程內索引；避免意外請求真正的 Jamendo
+os.environ.setdefault('JAMENDO_API_BASE', 'http://127.0.0.1:9/v3.0')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.test import Client  # noqa: E402
+
+from apps.jamendo.autocomplete import AutocompleteIndex, response_popularity  # noqa: E402
+
+from .bench_asgi import percentile  # noqa: E402
+
+PAGE_SIZE = 200
+SYLLABLES = [a + b for a in 'bcdfghjklmnprstvwz' for b in 'aeiou'] + ['ar', 'el', 'in', 'on', 'ur']
+TAGS = [f'tag{i}' for i in range(300)]
+
+
+def make_word(rng):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 4)))
+
+def make_name(rng, words):
+    return ' '.join(make_word(rng).capitalize() for _ in range(rng.randint(1, words)))
+
+def make_page(rng, start, artists, albums):
+    tracks = []
+    for track_id in range(start, start + PAGE_SIZE):
+        artist = rng.randrange(len(artists))
+        album = rng.randrange(len(albums))
+        tracks.append({
+            'id': str(track_id),
+            'name': make_name(rng, 4),
+            'artist_id': str(artist),
+            'artist_name': artists[artist],
+            'album_id': str(album),
+            'album_name': albums[album],
+            'musicinfo': {'tags': {
+                'genres': [TAGS[min(int(rng.paretovariate(1.0)) - 1, 99)]],
+                'instruments': [TAGS[100 + rng.randrange(50)]],
+                'vartags': [TAGS[150 + rng.randrange(150)]],
+            }},
+        })
+    return tracks
+
+def make_pages(count, rng):
+    """依熱門度排序、不同 offset 的列表頁 [(參數, 音軌)]（不同來源的列表名次互相重疊）"""
+    artists = [make_name(rng, 2) for _ in range(count // 20 + 1)]
+    albums = [make_name(rng, 3) for _ in range(count // 8 + 1)]
+    for start in range(0, count, PAGE_SIZE):
+        offset = rng.randrange(0, max(count // 4, PAGE_SIZE), PAGE_SIZE)
+        yield {'order': 'popularity_total', 'offset': offset}, make_page(rng, start, artists, albums)
+
+def build_index(count, seed):
+    """返回 (填滿的索引, 每頁加入時間)"""
+    index = AutocompleteIndex()
+    timings = []
+    for params, page in make_pages(count, random.Random(seed)):
+        start = time.perf_counter()
+        index.add(page, response_popularity(params, len(page)))
+        timings.append(time.perf_counter() - start)
+    return index, timings
+
+def index_memory(count, seed):
+    """以同樣的數據另外建立一次索引，返回 tracemalloc 量到的位元組"""
+    tracemalloc.start()
+    index = AutocompleteIndex()
+    for params, page in make_pages(count, random.Random(seed)):
+        index.add(page, response_popularity(params, len(page)))
+        del page
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size
+
+def make_queries(index, rng, count):
+    """從索引中的建議取前綴，模擬輸入到一半的查詢"""
+    texts = [suggestion.text for suggestion in index._suggestions.values()]
+    queries = []
+    for _ in range(count):
+        text = rng.choice(texts)
+        words = text.split()
+        if len(words) > 1 and rng.random() < 0.3:
+            query = f'{words[0]} {words[1][:rng.randint(1, len(words[1]))]}'
+        else:
+            query = text[:rng.randint(1, min(len(text), 12))]
+        queries.append(query)
+    return queries
+
+def summary(timings):
+    return {
+        'p50_us': round(percentile(timings, 50) * 1e6, 1),
+        'p99_us': round(percentile(timings, 99) * 1e6, 1),
+        'mean_us': round(statistics.fmean(timings) * 1e6, 1),
+    }
+
+def measure_suggest(index, queries, limit):
+    timings, results = [], 0
+    for query in queries:
+        start = time.perf_counter()
+        results += len(index.suggest(query, limit))
+        timings.append(time.perf_counter() - start)
+    return {**summary(timings), 'mean_results': round(results / len(queries), 2)}
+
+def measure_suggest_during_updates(index, queries, limit, seed):
+    """另一個執行緒不斷加入新的列表頁（並觸發淘汰）時的查詢延遲"""
+    stop = threading.Event()
+
+    def update():
+        for params, page in make_pages(10 ** 7, random.Random(seed + 1)):
+            if stop.is_set():
+                return
+            index.add(page, response_popularity(params, len(page)))
+
+    updater = threading.Thread(target=update)
+    updater.start()
+    try:
+        return measure_suggest(index, queries, limit)
+    finally:
+        stop.set()
+        updater.join()
+
+def measure_endpoint(index, queries, limit):
+    from apps.jamendo import autocomplete
+
+    # 端點使用模組層級的索引：換成已填滿的索引，並略過從曲庫載入
+    autocomplete.index._suggestions, autocomplete.index._prefixes = index._suggestions, index._prefixes
+    autocomplete.index._seeded = True
+    client = Client()
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        response = client.get(f'/api/jamendo/autocomplete/?q={quote(query)}&limit={limit}')
+        timings.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.content[:200]
+    return summary(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='搜尋建議基準測試')
+    parser.add_argument('--tracks', type=int, default=100000, help='加入索引的音軌數（超過上限的部分會被淘汰）')
+    parser.add_argument('--max-entries', type=int, default=50000, help='AUTOCOMPLETE_MAX_ENTRIES')
+    parser.add_argument('--queries', type=int, default=20000)
+    parser.add_argument('--limit', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='將結果寫入 JSON 檔案')
+    args = parser.parse_args()
+
+    settings.AUTOCOMPLETE_MAX_ENTRIES = args.max_entries
+    rng = random.Random(args.seed)
+
+    index, add_timings = build_index(args.tracks, args.seed)
+    size = index_memory(args.tracks, args.seed)
+    stats = index.stats()
+    results = {
+        'tracks': args.tracks,
+        'suggestions': stats['suggestions'],
+        'prefixes': stats['prefixes'],
+        'evicted': stats['evicted'],
+        'memory_mb': round(size / 1024 ** 2, 1),
+        'add_page_ms': {key.replace('_us', '_ms'): round(value / 1000, 3) for key, value in summary(add_timings).items()},
+    }
+    print(
+        f"索引: {stats['suggestions']} 個建議（淘汰 {stats['evicted']}）, {stats['prefixes']} 個前綴, "
+        f"{results['memory_mb']} MB; 每頁 {PAGE_SIZE} 首加入 p50 {results['add_page_ms']['p50_ms']} ms "
+        f"p99 {results['add_page_ms']['p99_ms']} ms"
+    )
+
+    queries = make_queries(index, rng, args.queries)
+    results['suggest'] = measure_suggest(index, queries, args.limit)
+    results['suggest_during_updates'] = measure_suggest_during_updates(index, queries, args.limit, args.seed)
+    results['endpoint'] = measure_endpoint(index, queries[:2000], args.limit)
+    for name in ('suggest', 'suggest_during_updates', 'endpoint'):
+        result = results[name]
+        print(f"{name:<22} p50 {result['p50_us']:>8} µs  p99 {result['p99_us']:>8} µs  平均 {result['mean_us']:>8} µs")
+    print(f"每次查詢平均 {results['suggest']['mean_results']} 個建議")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+"""api/jamendo/ 各端點在冷緩存與熱緩存下的吞吐量、延遲與上游請求數
+
+上游換成本地 stub（可設定延遲、錯誤率與響應大小）。每個（端點, 並發數）組合都啟動
+一個新的伺服器進程與新的 SQLite 緩存檔案，先跑一輪冷緩存，再以相同的請求跑一輪熱緩存；
+上游請求數取自 stub 的 /_stats。結果可寫成 JSON（含 git commit），用來比較不同提交。
+
+需要額外安裝 gunicorn（--mode asgi 時為 uvicorn）：
+    pip install gunicorn uvicorn
+    python -m benchmarks.bench_endpoints --concurrency 1,16,64 --requests 200 --json results.json
+    python -m benchmarks.bench_endpoints --endpoints search,detail --error-rate 0.05 --peaks 2000
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from .bench_asgi import BACKEND_DIR, free_port, percentile, server_command, wait_for_port
+from .stub_jamendo import spawn_stub
+
+ENDPOINTS = ('search', 'tag', 'popular', 'latest', 'random', 'detail', 'batch', 'tags')
+GENRES = ('rock', 'pop', 'jazz', 'electronic', 'classical', 'hiphop', 'metal', 'folk', 'ambient', 'blues')
+
+
+def endpoint_requests(name, keys):
+    """端點的 keys 個不同請求 [(路徑, 參數)]；冷熱兩輪都依序循環使用"""
+    if name == 'search':
+        return [('/api/jamendo/search/', {'q': f'bench {i}', 'limit': 20}) for i in range(keys)]
+    if name == 'tag':
+        return [
+            ('/api/jamendo/tracks/tag/', {'tag': GENRES[i % len(GENRES)], 'limit': 20, 'offset': i // len(GENRES) * 20})
+            for i in range(keys)
+        ]
+    if name in ('popular', 'latest'):
+        return [(f'/api/jamendo/tracks/{name}/', {'limit': 20, 'offset': i * 20}) for i in range(keys)]
+    if name == 'random':
+        return [('/api/jamendo/tracks/random/', {'limit': 20, 'session': f'bench-{i}'}) for i in range(keys)]
+    if name == 'detail':
+        return [(f'/api/jamendo/tracks/{i + 1}/', {}) for i in range(keys)]
+    if name == 'batch':
+        # 相鄰的批量請求有一半音軌重疊，熱緩存輪次之前就會有部分命中
+        return [
+            ('/api/jamendo/tracks/batch/', {'ids': ','.join(str(i * 10 + j + 1) for j in range(20))})
+            for i in range(keys)
+        ]
+    if name == 'tags':
+        return [('/api/jamendo/tags/', {})]
+    raise ValueError(f'未知的端點: {name}')
+
+
+async def drive(client, requests, total, concurrency):
+    """以固定並發數循環發出 total 個請求，返回 (延遲列表, 錯誤數, 總時間)"""
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        nonlocal errors
+        path, params = requests[i % len(requests)]
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.get(path, params=params)
+                failed = response.status_code != 200
+            except httpx.HTTPError:
+                failed = True
+            latencies.append(time.perf_counter() - start)
+            errors += failed
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return latencies, errors, time.perf_counter() - start
+
+
+def upstream_calls(stub_url):
+    return httpx.get(f'{stub_url}/_stats', timeout=10).json()['calls']
+
+
+def summarize(latencies, errors, elapsed, calls):
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(statistics.median(latencies) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'upstream_calls': calls,
+    }
+
+
+async def run_passes(base_url, stub_url, requests, args, concurrency):
+    """同一個伺服器上依序跑冷緩存與熱緩存兩輪"""
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    passes = {}
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        for phase in ('cold', 'warm'):
+            before = upstream_calls(stub_url)
+            latencies, errors, elapsed = await drive(client, requests, args.requests, concurrency)
+            passes[phase] = summarize(latencies, errors, elapsed, upstream_calls(stub_url) - before)
+    return passes
+
+
+def run_endpoint(name, concurrency, api_base, args):
+    """以新的伺服器進程與空的緩存測試一個端點"""
+    port = free_port()
+    with tempfile.TemporaryDirectory(prefix='bench-cache-') as cache_dir:
+        env = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': 'music_streaming.settings',
+            'JAMENDO_API_BASE': api_base,
+            'JAMENDO_ASYNC_VIEWS': 'True' if args.mode == 'asgi' else 'False',
+            'DEBUG': 'False',
+            # 壓測客戶端只有一個位址、stub 也沒有配額：關閉限流，量測的是緩存與視圖本身
+            'JAMENDO_QUOTA_RATE': '0',
+            'API_THROTTLE_RATE': '0',
+            'CACHE_SQLITE_PATH': str(Path(cache_dir) / 'cache.sqlite3'),
+            'CACHE_REDIS_URL': '',
+        }
+        # 伺服器日誌（每個上游請求一行）不輸出到終端，以免蓋過結果
+        process = subprocess.Popen(
+            server_command(args.mode, port, args.threads), cwd=BACKEND_DIR, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_for_port(port)
+            passes = asyncio.run(run_passes(
+                f'http://127.0.0.1:{port}', api_base.rsplit('/v3.0', 1)[0],
+                endpoint_requests(name, args.keys), args, concurrency,
+            ))
+        finally:
+            process.terminate()
+            process.wait(timeout=10)
+    return [{'endpoint': name, 'concurrency': concurrency, 'cache': phase, **result} for phase, result in passes.items()]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='api/jamendo/ 端點冷熱緩存基準測試')
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS), help=f'逗號分隔，可選: {",".join(ENDPOINTS)}')
+    parser.add_argument('--concurrency', default='1,16,64', help='逗號分隔的並發數')
+    parser.add_argument('--requests', type=int, default=200, help='每一輪（冷或熱）的請求數')
+    parser.add_argument('--keys', type=int, default=50, help='每個端點的不同請求數（查詢詞、頁碼或音軌 id）')
+    parser.add_argument('--latency', type=float, default=0.05, help='stub 上游延遲（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='stub 返回 503 的比例（0-1）')
+    parser.add_argument('--peaks', type=int, default=960, help='每首音軌 waveform 的峰值數（控制上游響應大小）')
+    parser.add_argument('--mode', choices=('wsgi', 'asgi'), default='wsgi')
+    parser.add_argument('--threads', type=int, default=16, help='WSGI gthread worker 的執行緒數')
+    parser.add_argument('--json', help='將結果寫入 JSON 檔案')
+    args = parser.parse_args()
+
+    stub_port = free_port()
+    stub, api_base = spawn_stub(stub_port, latency=args.latency, error_rate=args.error_rate, peaks=args.peaks)
+    results = []
+    try:
+        wait_for_port(stub_port)
+        for name in args.endpoints.split(','):
+            for concurrency in (int(level) for level in args.concurrency.split(',')):
+                for result in run_endpoint(name, concurrency, api_base, args):
+                    results.append(result)
+                    print(
+                        f"{result['endpoint']:>8} c={result['concurrency']:<4} {result['cache']:>4}: "
+                        f"{result['throughput_rps']:>8} req/s  p50 {result['p50_ms']:>8} ms  "
+                        f"p99 {result['p99_ms']:>8} ms  upstream {result['upstream_calls']:>5}  errors {result['errors']}"
+                    )
+    finally:
+        stub.terminate()
+        stub.wait(timeout=10)
+
+    if args.json:
+        config = {
+            key: getattr(args, key)
+            for key in ('mode', 'threads', 'requests', 'keys', 'latency', 'error_rate', 'peaks')
+        }
+        Path(args.json).write_text(json.dumps({'commit': git_commit(), 'config': config, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Jamendo 列表響應的大小與序列化 CPU 比較
+
+以 stub 產生的 200 首音軌（與 Jamendo 回應格式相同）比較：
+完整數據 + JsonResponse、完整數據 + 快速序列化器、各 fields 設定檔，以及 gzip 後的大小。
+
+    python -m benchmarks.bench_payload --limit 200 --rounds 200 --json payload.json
+"""
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'music_streaming.settings')
+django.setup()
+
+from django.http import JsonResponse  # noqa: E402
+from django.utils.text import compress_string  # noqa: E402
+
+from apps.jamendo.responses import FIELD_PROFILES, json_response, orjson, project_tracks  # noqa: E402
+
+from .stub_jamendo import make_track  # noqa: E402
+
+
+def measure(build, rounds):
+    """返回 (響應大小, gzip 後大小, 每次產生響應的 CPU 毫秒數, 每次 gzip 的 CPU 毫秒數)"""
+    content = build().content
+    start = time.process_time()
+    for _ in range(rounds):
+        build()
+    cpu_ms = (time.process_time() - start) / rounds * 1000
+    start = time.process_time()
+    for _ in range(rounds):
+        compressed = compress_string(content)
+    gzip_cpu_ms = (time.process_time() - start) / rounds * 1000
+    return len(content), len(compressed), cpu_ms, gzip_cpu_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Jamendo 響應大小與序列化 CPU 基準測試')
+    parser.add_argument('--limit', type=int, default=200)
+    parser.add_argument('--rounds', type=int, default=200)
+    parser.add_argument('--json', help='將結果寫入 JSON 檔案')
+    args = parser.parse_args()
+
+    data = {
+        'headers': {'status': 'success', 'code': 0, 'results_count': args.limit},
+        'results': [make_track(i) for i in range(args.limit)],
+    }
+    cases = [
+        ('full / JsonResponse', lambda: JsonResponse(data)),
+        (f"full / {'orjson' if orjson else 'json'}", lambda: json_response(data)),
+    ]
+    for profile, fields in FIELD_PROFILES.items():
+        cases.append((f'fields={profile}', lambda fields=set(fields): json_response(project_tracks(data, fields))))
+
+    results = []
+    for name, build in cases:
+        size, gzip_size, cpu_ms, gzip_cpu_ms = measure(build, args.rounds)
+        results.append({
+            'case': name,
+            'bytes': size,
+            'gzip_bytes': gzip_size,
+            'cpu_ms': round(cpu_ms, 3),
+            'gzip_cpu_ms': round(gzip_cpu_ms, 3),
+        })
+        print(f'{name:>22}: {size:>9} B  gzip {gzip_size:>8} B  {cpu_ms:8.3f} ms/響應  gzip {gzip_cpu_ms:8.3f} ms')
+
+    if args.json:
+        Path(args.json).write_text(json.dumps({'limit': args.limit, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""大型歌單（預設 10k 首）的建立、讀取與移動
+
+在臨時測試資料庫（SQLite 時為記憶體資料庫）中以 stub 格式的音軌填滿本地曲庫，然後量測：
+- 建立：以每次 1000 首的批量加入建立歌單
+- 讀取：整個歌單與第一頁（完整數據與 fields=card）的時間、查詢數與響應大小
+- 移動：隨機位置與反覆移到同一位置（最壞情況）的每次時間、寫入行數與重新分布次數；
+  並列出連續編號（position 欄位）時同樣的移動需要改寫的行數作為對照
+
+    python -m benchmarks.bench_playlists --items 10000 --moves 500 --json playlists.json
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+from pathlib import Path
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'music_streaming.settings')
+# 音軌都在本地曲庫中，讀取歌單不需要上游；避免意外請求真正的 Jamendo
+os.environ.setdefault('JAMENDO_API_BASE', 'http://127.0.0.1:9/v3.0')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.test.utils import CaptureQueriesContext, setup_test_environment  # noqa: E402
+
+from apps.music.catalog import import_tracks  # noqa: E402
+from apps.playlists.services import add_tracks, create_playlist, move_item, ordered_items  # noqa: E402
+
+from .bench_asgi import percentile  # noqa: E402
+from .stub_jamendo import make_track  # noqa: E402
+
+ADD_BATCH_SIZE = 1000
+
+
+def seed_catalog(count, peaks):
+    for start in range(0, count, ADD_BATCH_SIZE):
+        import_tracks([make_track(i + 1, peaks=peaks) for i in range(start, min(start + ADD_BATCH_SIZE, count))])
+
+def build_playlist(count):
+    """返回 (歌單, 建立耗時秒數)"""
+    start = time.perf_counter()
+    playlist, _ = create_playlist('bench')
+    for offset in range(0, count, ADD_BATCH_SIZE):
+        add_tracks(playlist, [str(i + 1) for i in range(offset, min(offset + ADD_BATCH_SIZE, count))])
+    return playlist, time.perf_counter() - start
+
+def measure_load(client, playlist, query, rounds):
+    """讀取歌單的 (中位數毫秒, 查詢數, 響應位元組)"""
+    url = f'/api/playlists/{playlist.uuid}/?{query}'
+    # 查詢紀錄有長度上限，填充曲庫時已經滿了
+    connection.queries_log.clear()
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url)
+    assert response.status_code == 200, response.content[:200]
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        client.get(url)
+        timings.append(time.perf_counter() - start)
+    return {
+        'query': query,
+        'median_ms': round(statistics.median(timings) * 1000, 2),
+        'queries': len(queries.captured_queries),
+        'bytes': len(response.content),
+    }
+
+def current_ranks(playlist):
+    return dict(ordered_items(playlist).values_list('pk', 'rank'))
+
+def measure_moves(playlist, moves, pattern, rng):
+    """執行 moves 次移動，返回時間、寫入與連續編號的對照"""
+    pks = list(ordered_items(playlist).values_list('pk', flat=True))
+    count = len(pks)
+    timings, rows_written, dense_rows = [], [], []
+    ranks = current_ranks(playlist)
+    for i in range(moves):
+        if pattern == 'random':
+            source, target = rng.randrange(count), rng.randrange(count)
+        else:
+            # 每次都把最後一項移到第 1 與第 2 項之間：中點最快用完
+            source, target = count - 1, 1
+        pk = pks.pop(source)
+        pks.insert(target, pk)
+        start = time.perf_counter()
+        move_item(playlist, pk, position=target)
+        timings.append(time.perf_counter() - start)
+        # 比對移動前後所有項目的 rank，得到實際寫入的行數
+        previous, ranks = ranks, current_ranks(playlist)
+        rows_written.append(sum(1 for key, rank in ranks.items() if previous[key] != rank))
+        dense_rows.append(abs(source - target) + 1)
+
+    assert list(ordered_items(playlist).values_list('pk', flat=True)) == pks, '移動後的順序不正確'
+    return {
+        'pattern': pattern,
+        'moves': moves,
+        'mean_ms': round(statistics.fmean(timings) * 1000, 3),
+        'p99_ms': round(percentile(timings, 99) * 1000, 3),
+        'respaces': sum(1 for rows in rows_written if rows > 1),
+        'rows_written_per_move': round(statistics.fmean(rows_written), 2),
+        'max_rows_written': max(rows_written),
+        'dense_rows_per_move': round(statistics.fmean(dense_rows), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='大型歌單基準測試')
+    parser.add_argument('--items', type=int, default=10000, help='歌單音軌數')
+    parser.add_argument('--moves', type=int, default=500, help='每種移動模式的次數')
+    parser.add_argument('--rounds', type=int, default=5, help='每種讀取的重複次數')
+    parser.add_argument('--peaks', type=int, default=100, help='每首音軌 waveform 的峰值數（控制音軌數據大小）')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='將結果寫入 JSON 檔案')
+    args = parser.parse_args()
+
+    settings.PLAYLIST_MAX_ITEMS = max(settings.PLAYLIST_MAX_ITEMS, args.items)
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+
+    start = time.perf_counter()
+    seed_catalog(args.items, args.peaks)
+    print(f'曲庫: {args.items} 首音軌, {time.perf_counter() - start:.1f}s')
+
+    playlist, elapsed = build_playlist(args.items)
+    results = {'items': args.items, 'create_s': round(elapsed, 3), 'load': [], 'moves': []}
+    print(f'建立歌單: {args.items} 項, {elapsed * 1000:.0f} ms')
+
+    client = Client()
+    for query in (f'limit={args.items}', f'limit={args.items}&fields=card', 'limit=100', 'limit=100&fields=card'):
+        result = measure_load(client, playlist, query, args.rounds)
+        results['load'].append(result)
+        print(f"讀取 {query:<28} {result['median_ms']:>9} ms  {result['queries']:>3} 個查詢  {result['bytes']:>10} bytes")
+
+    rng = random.Random(args.seed)
+    for pattern in ('random', 'hotspot'):
+        result = measure_moves(playlist, args.moves, pattern, rng)
+        results['moves'].append(result)
+        print(
+            f"移動 {pattern:<8} 平均 {result['mean_ms']:>7} ms  p99 {result['p99_ms']:>7} ms  "
+            f"重新分布 {result['respaces']:>3} 次  每次寫入 {result['rows_written_per_move']:>6} 行"
+            f"（最多 {result['max_rows_written']} 行）"
+            f"（連續編號需 {result['dense_rows_per_move']} 行）"
+        )
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""相似音軌（tracks/<id>/similar/）在大型曲庫（預設 10 萬首）下的延遲
+
+在臨時測試資料庫中以 stub 格式、musicinfo 隨機組合（曲風、樂器、其他標籤依長尾分布）的音軌填滿本地曲庫，然後量測：
+- 載入：從曲庫建立特徵矩陣的時間
+- 查詢：只計算最近鄰（矩陣乘法 + argpartition）與整個端點（含讀取音軌數據與序列化）的 p50/p99
+- 更新：增量寫入一批音軌的時間，對照重新建立整個矩陣的時間
+
+    python -m benchmarks.bench_similar --tracks 100000 --queries 500 --json similar.json
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+from pathlib import Path
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'music_streaming.settings')
+# 音軌都在本地曲庫中，查詢不需要上游；避免意外請求真正的 Jamendo
+os.environ.setdefault('JAMENDO_API_BASE', 'http://127.0.0.1:9/v3.0')
+# 所有查詢來自同一個測試客戶端，不做每客戶端限流
+os.environ.setdefault('API_THROTTLE_RATE', '0')
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+
+from apps.music.catalog import import_tracks  # noqa: E402
+from apps.music.similarity import SimilarityIndex, index  # noqa: E402
+
+from .bench_asgi import percentile  # noqa: E402
+from .stub_jamendo import make_track  # noqa: E402
+
+IMPORT_BATCH_SIZE = 2000
+
+GENRES = [f'genre{i}' for i in range(60)]
+INSTRUMENTS = [f'instrument{i}' for i in range(40)]
+VARTAGS = [f'mood{i}' for i in range(120)]
+
+
+def long_tail(rng, names, count):
+    """依長尾分布選出 count 個不重複的名稱（少數標籤很常見）"""
+    chosen = set()
+    while len(chosen) < count:
+        chosen.add(names[min(int(rng.paretovariate(1.0)) - 1, len(names) - 1)])
+    return sorted(chosen)
+
+def make_musicinfo(rng):
+    return {
+        'vocalinstrumental': rng.choice(('vocal', 'instrumental')),
+        'speed': rng.choice(('verylow', 'low', 'medium', 'high', 'veryhigh')),
+        'tags': {
+            'genres': long_tail(rng, GENRES, rng.randint(1, 3)),
+            'instruments': long_tail(rng, INSTRUMENTS, rng.randint(0, 4)),
+            'vartags': long_tail(rng, VARTAGS, rng.randint(0, 5)),
+        },
+    }
+
+def make_tracks(start, stop, rng, peaks):
+    tracks = []
+    for track_id in range(start, stop):
+        track = make_track(track_id, peaks=peaks)
+        track['musicinfo'] = make_musicinfo(rng)
+        tracks.append(track)
+    return tracks
+
+def seed_catalog(count, rng, peaks):
+    for start in range(0, count, IMPORT_BATCH_SIZE):
+        import_tracks(make_tracks(start + 1, min(start + IMPORT_BATCH_SIZE, count) + 1, rng, peaks))
+
+def summary(timings):
+    return {
+        'p50_ms': round(percentile(timings, 50) * 1000, 3),
+        'p99_ms': round(percentile(timings, 99) * 1000, 3),
+        'mean_ms': round(statistics.fmean(timings) * 1000, 3),
+    }
+
+def measure_queries(seeds, limit):
+    timings = []
+    for track_id in seeds:
+        start = time.perf_counter()
+        index.similar(track_id, limit)
+        timings.append(time.perf_counter() - start)
+    return summary(timings)
+
+def measure_endpoint(client, seeds, limit):
+    timings = []
+    for track_id in seeds:
+        start = time.perf_counter()
+        response = client.get(f'/api/jamendo/tracks/{track_id}/similar/?limit={limit}&fields=card')
+        timings.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.content[:200]
+    return summary(timings)
+
+def measure_updates(count, batch, rng):
+    """增量寫入 batch 首音軌（一半更新已有的、一半新增）的時間，對照從曲庫重新建立整個矩陣"""
+    timings = []
+    next_id = count + 1
+    for _ in range(10):
+        tracks = [{'id': str(rng.randint(1, count)), 'musicinfo': make_musicinfo(rng)} for _ in range(batch // 2)]
+        tracks += [{'id': str(next_id + i), 'musicinfo': make_musicinfo(rng)} for i in range(batch - batch // 2)]
+        next_id += batch - batch // 2
+        start = time.perf_counter()
+        index.update(tracks)
+        timings.append(time.perf_counter() - start)
+
+    rebuild = SimilarityIndex()
+    start = time.perf_counter()
+    rebuild.ensure_loaded()
+    return {'batch': batch, **summary(timings), 'rebuild_ms': round((time.perf_counter() - start) * 1000, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='相似音軌基準測試')
+    parser.add_argument('--tracks', type=int, default=100000, help='曲庫音軌數')
+    parser.add_argument('--queries', type=int, default=500, help='每種量測的查詢次數')
+    parser.add_argument('--limit', type=int, default=20, help='每次查詢返回的音軌數')
+    parser.add_argument('--update-batch', type=int, default=200, help='每次增量更新的音軌數（一次上游響應的大小）')
+    parser.add_argument('--peaks', type=int, default=20, help='每首音軌 waveform 的峰值數（控制音軌數據大小）')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='將結果寫入 JSON 檔案')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+
+    start = time.perf_counter()
+    seed_catalog(args.tracks, rng, args.peaks)
+    print(f'曲庫: {args.tracks} 首音軌, {time.perf_counter() - start:.1f}s')
+
+    index.ensure_loaded()
+    stats = index.stats()
+    results = {
+        'tracks': stats['tracks'],
+        'load_ms': stats['load_ms'],
+        'matrix_bytes': stats['bytes'],
+    }
+    print(f"載入: {stats['tracks']} 首, {stats['load_ms']} ms, 矩陣 {results['matrix_bytes'] / 1024 ** 2:.1f} MB")
+
+    seeds = [str(rng.randint(1, args.tracks)) for _ in range(args.queries)]
+    results['query'] = measure_queries(seeds, args.limit)
+    results['endpoint'] = measure_endpoint(Client(), seeds, args.limit)
+    for name in ('query', 'endpoint'):
+        result = results[name]
+        print(f"{name:<8} p50 {result['p50_ms']:>7} ms  p99 {result['p99_ms']:>7} ms  平均 {result['mean_ms']:>7} ms")
+
+    results['update'] = measure_updates(args.tracks, args.update_batch, rng)
+    update = results['update']
+    print(
+        f"增量更新 {update['batch']} 首: p50 {update['p50_ms']} ms  p99 {update['p99_ms']} ms"
+        f"（重新建立整個矩陣 {update['rebuild_ms']} ms）"
+    )
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
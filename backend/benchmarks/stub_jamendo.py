@@ -0,0 +1,170 @@
+"""本地 Jamendo API stub，模擬 api.jamendo.com/v3.0/tracks
+
+用法：
+    python -m benchmarks.stub_jamendo --port 8765 --latency 0.2 --error-rate 0.05 --peaks 960
+
+然後以 JAMENDO_API_BASE=http://127.0.0.1:8765/v3.0 啟動 Django。
+GET /_stats 返回目前為止的上游請求數（不計入請求數）。
+"""
+import argparse
+import json
+import random
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+
+class StubJamendoServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address, latency=0.0, error_rate=0.0, peaks=960):
+        super().__init__(address, StubJamendoHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.peaks = peaks
+        self.calls = 0
+        self.errors = 0
+        self._calls_lock = threading.Lock()
+
+    def count_call(self):
+        """記錄一次上游請求，返回這次是否要模擬錯誤"""
+        failed = random.random() < self.error_rate
+        with self._calls_lock:
+            self.calls += 1
+            self.errors += failed
+        return failed
+
+    def stats(self):
+        with self._calls_lock:
+            return {'calls': self.calls, 'errors': self.errors}
+
+    def handle_error(self, request, client_address):
+        pass  # 壓測客戶端中途斷線屬正常情況
+
+
+def make_track(track_id, tag='rock', peaks=960):
+    """產生一首與 Jamendo 回應格式相同的假音軌；peaks 決定 waveform 的大小（即單首音軌的大小）"""
+    return {
+        'id': str(track_id),
+        'name': f'Track {track_id}',
+        'duration': 180 + track_id % 120,
+        'artist_id': str(track_id % 97),
+        'artist_name': f'Artist {track_id % 97}',
+        'album_id': str(track_id % 211),
+        'album_name': f'Album {track_id % 211}',
+        'album_image': f'https://usercontent.jamendo.com/?type=album&id={track_id % 211}&width=300',
+        'image': f'https://usercontent.jamendo.com/?type=album&id={track_id % 211}&width=300',
+        'audio': f'https://prod-1.storage.jamendo.com/?trackid={track_id}&format=mp31',
+        'audiodownload': f'https://prod-1.storage.jamendo.com/download/track/{track_id}/mp32/',
+        'releasedate': '2024-01-01',
+        'position': track_id % 12 + 1,
+        'license_ccurl': 'http://creativecommons.org/licenses/by-nc-sa/3.0/',
+        'shorturl': f'https://jamen.do/t/{track_id}',
+        'shareurl': f'https://www.jamendo.com/track/{track_id}',
+        'prourl': f'https://licensing.jamendo.com/track/{track_id}',
+        'audiodownload_allowed': True,
+        # Jamendo 的 waveform 是 JSON 字串，約一千個峰值，是單首音軌中最大的字段
+        'waveform': json.dumps({'peaks': [(track_id * 7 + i * 13) % 100 for i in range(peaks)]}),
+        'musicinfo': {
+            'vocalinstrumental': 'vocal' if track_id % 3 else 'instrumental',
+            'lang': 'en',
+            'gender': 'male',
+            'acousticelectric': 'electric',
+            'speed': ('low', 'medium', 'high')[track_id % 3],
+            'tags': {
+                'genres': [tag],
+                'instruments': ['guitar', 'drums'],
+                'vartags': ['energetic'],
+            },
+        },
+    }
+
+
+class StubJamendoHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True  # 標頭與內容分開寫出，避免 Nagle + delayed ACK 的 40ms 停頓
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/_stats':
+            self.send_json(200, self.server.stats())
+            return
+
+        failed = self.server.count_call()
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if failed:
+            self.send_json(503, {'error': 'stub error'})
+            return
+
+        query = parse_qs(url.query)
+        limit = int(query.get('limit', ['10'])[0])
+        offset = int(query.get('offset', ['0'])[0])
+        tag = query.get('tags', ['rock'])[0]
+        if 'id' in query:
+            ids = [int(i) for i in query['id'][0].split()]
+        else:
+            ids = range(offset + 1, offset + limit + 1)
+        results = [make_track(i, tag, self.server.peaks) for i in ids]
+
+        self.send_json(200, {
+            'headers': {'status': 'success', 'code': 0, 'error_message': '', 'results_count': len(results)},
+            'results': results,
+        })
+
+
+def start_stub(host='127.0.0.1', port=0, latency=0.0, error_rate=0.0, peaks=960):
+    """在背景執行緒啟動 stub，返回 (server, api_base)"""
+    server = StubJamendoServer((host, port), latency=latency, error_rate=error_rate, peaks=peaks)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://{host}:{server.server_address[1]}/v3.0'
+
+
+def spawn_stub(port, latency=0.0, host='127.0.0.1', error_rate=0.0, peaks=960):
+    """在獨立進程啟動 stub（避免與壓測客戶端搶 GIL），返回 (process, api_base)"""
+    process = subprocess.Popen(
+        [
+            sys.executable, '-m', 'benchmarks.stub_jamendo', '--host', host, '--port', str(port),
+            '--latency', str(latency), '--error-rate', str(error_rate), '--peaks', str(peaks),
+        ],
+        cwd=Path(__file__).resolve().parent.parent,
+        stdout=subprocess.DEVNULL,
+    )
+    return process, f'http://{host}:{port}/v3.0'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地 Jamendo API stub')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.2, help='每個請求的模擬延遲（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回 503 的請求比例（0-1）')
+    parser.add_argument('--peaks', type=int, default=960, help='每首音軌 waveform 的峰值數（控制響應大小）')
+    args = parser.parse_args()
+
+    server = StubJamendoServer((args.host, args.port), latency=args.latency, error_rate=args.error_rate, peaks=args.peaks)
+    print(
+        f'Jamendo stub: http://{args.host}:{args.port}/v3.0 '
+        f'(latency={args.latency}s, error_rate={args.error_rate}, peaks={args.peaks})'
+    )
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+import math
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from apps.jamendo.governor import QuotaExceeded, client_address, client_throttle
+from apps.jamendo.metrics import http_request_duration, http_response_size
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """同時支援同步與非同步模式的 WhiteNoise
+
+    WhiteNoise 只提供同步中介層；在 ASGI 下 Django 會把其後的整條鏈（含非同步視圖）
+    包進同一條 thread_sensitive 執行緒，所有請求因此被串行化。這裡只在命中靜態檔案時
+    才切到執行緒，其餘請求直接 await 下一層。
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve, thread_sensitive=False)(static_file, request)
+        return await self.get_response(request)
+
+
+class MetricsMiddleware:
+    """記錄每個視圖的處理時間與響應大小（apps.jamendo.metrics）
+
+    以路由名稱作為標籤，避免路徑參數（音軌 id 等）讓標籤數量無限增長。
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start = time.perf_counter()
+        response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - start)
+        return response
+
+    def record(self, request, response, elapsed):
+        match = getattr(request, 'resolver_match', None)
+        view = match.url_name or match.view_name if match else 'unmatched'
+        http_request_duration.observe(elapsed, view, request.method, str(response.status_code))
+        if response.streaming:
+            size = response.get('Content-Length')
+        else:
+            size = len(response.content)
+        if size is not None:
+            http_response_size.observe(int(size), view)
+
+
+class ApiAdmissionMiddleware:
+    """api/jamendo/ 的准入控制
+
+    - 單一客戶端的請求速率超過 API_THROTTLE_RATE 時返回 429（健康檢查、統計、指標與搜尋建議端點除外；
+      搜尋建議每次按鍵一個請求，只讀進程內索引，不會用到上游配額）
+    - 上游配額或並發名額不足、又沒有舊緩存可用（QuotaExceeded）時返回 503
+    兩者都帶 Retry-After，客戶端不必等待上游逾時。
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    THROTTLED_PREFIX = '/api/jamendo/'
+    EXEMPT_PATHS = ('/api/jamendo/health/', '/api/jamendo/stats/', '/api/jamendo/metrics/', '/api/jamendo/autocomplete/')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.throttle(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        return self.throttle(request) or await self.get_response(request)
+
+    def throttle(self, request):
+        """超過每客戶端速率時返回 429 響應，否則返回 None"""
+        path = request.path_info
+        if not path.startswith(self.THROTTLED_PREFIX) or path in self.EXEMPT_PATHS:
+            return None
+        wait = client_throttle.check(client_address(request))
+        if not wait:
+            return None
+        return self.retry_response({'error': '請求過於頻繁，請稍後再試'}, 429, wait)
+
+    def process_exception(self, request, exception):
+        if isinstance(exception, QuotaExceeded):
+            return self.retry_response({'error': '上游服務繁忙，請稍後再試'}, 503, exception.retry_after)
+        return None
+
+    def retry_response(self, payload, status, retry_after):
+        response = JsonResponse(payload, status=status)
+        response['Retry-After'] = str(max(1, math.ceil(retry_after)))
+        return response
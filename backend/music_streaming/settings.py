@@ -41,9 +41,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'music_streaming.middleware.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'music_streaming.middleware.ApiAdmissionMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'music_streaming.middleware.AsyncWhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -52,6 +54,26 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# 只提供 API 的部署（DJANGO_API_ONLY=True）：前端靜態文件與 admin 由另一個使用完整設定的進程提供
+# API 視圖都是 @csrf_exempt、匿名且不使用 session，因此不載入 admin、auth、sessions、messages、DRF 與 staticfiles，
+# 中介層只保留指標、CORS、限流與安全標頭；沒有 CommonMiddleware，缺少結尾斜線的路徑不再重定向而是 404
+API_ONLY = os.getenv('DJANGO_API_ONLY', 'False').lower() == 'true'
+if API_ONLY:
+    INSTALLED_APPS = [
+        'corsheaders',
+        'apps.music',
+        'apps.users',
+        'apps.playlists',
+        'apps.streaming',
+        'apps.jamendo',
+    ]
+    MIDDLEWARE = [
+        'music_streaming.middleware.MetricsMiddleware',
+        'corsheaders.middleware.CorsMiddleware',
+        'music_streaming.middleware.ApiAdmissionMiddleware',
+        'django.middleware.security.SecurityMiddleware',
+    ]
+
 ROOT_URLCONF = 'music_streaming.urls'
 
 TEMPLATES = [
@@ -71,6 +93,12 @@ TEMPLATES = [
         },
     },
 ]
+if API_ONLY:
+    # auth 與 messages 的 context processor 依賴沒有載入的 app
+    TEMPLATES[0]['OPTIONS']['context_processors'] = [
+        'django.template.context_processors.debug',
+        'django.template.context_processors.request',
+    ]
 
 WSGI_APPLICATION = 'music_streaming.wsgi.application'
 
@@ -186,14 +214,150 @@ CORS_ALLOW_HEADERS = [
     'x-csrftoken',
     'x-requested-with',
     'cache-control',
+    'x-playlist-token',
 ]
 
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# 緩存設定：Jamendo 音軌實體按 id 各存一份（列表只存 id 陣列），條目數遠多於預設上限 300
+# 兩層緩存：每個 worker 的進程內 LRU（L1）在前，所有 worker 共用的 L2 在後
+# 設定 CACHE_REDIS_URL 時 L2 使用 Redis（需安裝 redis 套件），否則使用本機 SQLite 檔案
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', '')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'apps.jamendo.cache.TieredCache',
+        'OPTIONS': {
+            'SHARED': 'shared',
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', '50000')),
+            'MAX_BYTES': int(os.getenv('CACHE_LOCAL_MAX_BYTES', str(128 * 1024 * 1024))),
+            'LOCAL_TTL': float(os.getenv('CACHE_LOCAL_TTL', '60')),
+        },
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CACHE_REDIS_URL,
+    } if CACHE_REDIS_URL else {
+        'BACKEND': 'apps.jamendo.cache.SQLiteCache',
+        'LOCATION': os.getenv('CACHE_SQLITE_PATH', str(BASE_DIR / 'cache.sqlite3')),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_SHARED_MAX_ENTRIES', '200000')),
+        },
+    },
+}
+
 # Jamendo API 設定
 JAMENDO_CLIENT_ID = os.getenv('JAMENDO_CLIENT_ID', '93957ee4')
+JAMENDO_API_BASE = os.getenv('JAMENDO_API_BASE', 'https://api.jamendo.com/v3.0')
+
+# ASGI 部署（music_streaming.asgi）時設為 True，改用非同步視圖與 httpx 連線池
+JAMENDO_ASYNC_VIEWS = os.getenv('JAMENDO_ASYNC_VIEWS', 'False').lower() == 'true'
+JAMENDO_ASYNC_POOL_SIZE = int(os.getenv('JAMENDO_ASYNC_POOL_SIZE', '100'))
+
+# Jamendo 上游連線池與逾時（秒）
+JAMENDO_POOL_SIZE = int(os.getenv('JAMENDO_POOL_SIZE', '20'))
+JAMENDO_CONNECT_TIMEOUT = float(os.getenv('JAMENDO_CONNECT_TIMEOUT', '3.05'))
+JAMENDO_READ_TIMEOUT = float(os.getenv('JAMENDO_READ_TIMEOUT', '8'))
+JAMENDO_MAX_RETRIES = int(os.getenv('JAMENDO_MAX_RETRIES', '2'))
+JAMENDO_RETRY_BACKOFF = float(os.getenv('JAMENDO_RETRY_BACKOFF', '0.3'))
+
+# 緩存未命中時的跨 worker 抓取鎖（秒）
+JAMENDO_FETCH_LOCK_TIMEOUT = float(os.getenv('JAMENDO_FETCH_LOCK_TIMEOUT', '30'))
+JAMENDO_FETCH_LOCK_WAIT = float(os.getenv('JAMENDO_FETCH_LOCK_WAIT', '3'))
+
+# 各端點緩存 (軟 TTL, 硬 TTL)（秒）：超過軟 TTL 先返回舊數據並在背景刷新，超過硬 TTL 才阻塞請求上游
+JAMENDO_CACHE_TTLS = {
+    'search': (1800, 3600),     # 搜尋
+    'tag': (3600, 7200),        # 曲風標籤
+    'popular': (1800, 3600),    # 熱門
+    'latest': (900, 1800),      # 最新
+    'detail': (43200, 86400),   # 音軌詳情
+}
+JAMENDO_REFRESH_WORKERS = int(os.getenv('JAMENDO_REFRESH_WORKERS', '4'))
+
+# 上游數據通知（本地曲庫、相似度與搜尋建議索引）在背景執行緒處理；排隊中的通知超過這個數量時丟棄新的
+JAMENDO_NOTIFY_MAX_PENDING = int(os.getenv('JAMENDO_NOTIFY_MAX_PENDING', '100'))
+
+# 緩存項過了硬 TTL 後再保留的秒數：上游不可用時返回這些舊數據（標記為 stale）
+JAMENDO_STALE_GRACE = int(os.getenv('JAMENDO_STALE_GRACE', '86400'))
+
+# 上游斷路器：連續失敗幾次後斷開、斷開多少秒後半開試探；背景健康探測的間隔（秒）
+JAMENDO_BREAKER_THRESHOLD = int(os.getenv('JAMENDO_BREAKER_THRESHOLD', '5'))
+JAMENDO_BREAKER_RESET = float(os.getenv('JAMENDO_BREAKER_RESET', '30'))
+JAMENDO_HEALTH_PROBE_INTERVAL = float(os.getenv('JAMENDO_HEALTH_PROBE_INTERVAL', '30'))
+
+# 上游配額（所有 worker 共用同一個 JAMENDO_CLIENT_ID 的令牌桶）：每秒請求數（0 為不限）、桶容量；
+# 預熱、預取、背景刷新等背景工作只取用桶內超過這個比例的令牌，列表頁只取用超過 BROWSE_RESERVE 的，
+# 其餘留給音軌詳情與搜尋
+JAMENDO_QUOTA_RATE = float(os.getenv('JAMENDO_QUOTA_RATE', '20'))
+JAMENDO_QUOTA_BURST = float(os.getenv('JAMENDO_QUOTA_BURST', '40'))
+JAMENDO_QUOTA_BACKGROUND_RESERVE = float(os.getenv('JAMENDO_QUOTA_BACKGROUND_RESERVE', '0.5'))
+JAMENDO_QUOTA_BROWSE_RESERVE = float(os.getenv('JAMENDO_QUOTA_BROWSE_RESERVE', '0.2'))
+
+# 每個 worker 同時進行的上游請求上限（背景工作最多用一半）；超過上限或配額不足時的最長排隊秒數
+JAMENDO_MAX_CONCURRENCY = int(os.getenv('JAMENDO_MAX_CONCURRENCY', '16'))
+JAMENDO_QUEUE_TIMEOUT = float(os.getenv('JAMENDO_QUEUE_TIMEOUT', '2'))
+JAMENDO_BACKGROUND_QUEUE_TIMEOUT = float(os.getenv('JAMENDO_BACKGROUND_QUEUE_TIMEOUT', '30'))
+
+# api/jamendo/ 的每客戶端限流（每個 worker 各自計算）：每秒請求數（0 為不限）、突發容量、
+# 前面的反向代理層數（大於 0 時從 X-Forwarded-For 取客戶端位址）
+API_THROTTLE_RATE = float(os.getenv('API_THROTTLE_RATE', '20'))
+API_THROTTLE_BURST = float(os.getenv('API_THROTTLE_BURST', '60'))
+API_THROTTLE_TRUSTED_PROXIES = int(os.getenv('API_THROTTLE_TRUSTED_PROXIES', '0'))
+
+# 標籤、熱門、最新列表向上游抓取與緩存的固定頁大小：任意 limit/offset 都從這些頁切出
+JAMENDO_LIST_PAGE_SIZE = int(os.getenv('JAMENDO_LIST_PAGE_SIZE', '200'))
+
+# 隨機音軌池（tracks/random/ 從池中抽樣）：池大小上限、向上游補充的間隔（秒）、保留不重複紀錄的 session 數
+JAMENDO_RANDOM_POOL_SIZE = int(os.getenv('JAMENDO_RANDOM_POOL_SIZE', '3000'))
+JAMENDO_RANDOM_POOL_REFRESH = float(os.getenv('JAMENDO_RANDOM_POOL_REFRESH', '300'))
+JAMENDO_RANDOM_POOL_SESSIONS = int(os.getenv('JAMENDO_RANDOM_POOL_SESSIONS', '10000'))
+
+# 搜尋建議（autocomplete/）：每個 worker 的前綴索引最多保留的建議數（音軌、藝人、專輯、標籤合計）
+AUTOCOMPLETE_MAX_ENTRIES = int(os.getenv('AUTOCOMPLETE_MAX_ENTRIES', '50000'))
+
+# 緩存預熱（manage.py warm_jamendo_cache 與啟動時預熱）
+JAMENDO_WARM_PAGES = int(os.getenv('JAMENDO_WARM_PAGES', '1'))
+JAMENDO_WARM_CONCURRENCY = int(os.getenv('JAMENDO_WARM_CONCURRENCY', '4'))
+JAMENDO_WARM_ON_BOOT = os.getenv('JAMENDO_WARM_ON_BOOT', 'False').lower() == 'true'
+
+# 緩存快照（manage.py dump_jamendo_snapshot / load_jamendo_snapshot）：檔案路徑、啟動時是否載入、
+# 可接受的快照最長年齡（秒，未設定時為音軌實體的緩存時間）
+JAMENDO_SNAPSHOT_PATH = os.getenv('JAMENDO_SNAPSHOT_PATH', str(BASE_DIR / 'jamendo_snapshot.jsonl.gz'))
+JAMENDO_SNAPSHOT_ON_BOOT = os.getenv('JAMENDO_SNAPSHOT_ON_BOOT', 'False').lower() == 'true'
+JAMENDO_SNAPSHOT_MAX_AGE = float(os.getenv('JAMENDO_SNAPSHOT_MAX_AGE', '0')) or None
+
+# 音訊代理（api/streaming/）：區塊緩存目錄、區塊大小、磁碟用量上限、單次上游請求最多抓取的區塊數
+STREAMING_CACHE_DIR = os.getenv('STREAMING_CACHE_DIR', str(BASE_DIR / 'audio_cache'))
+STREAMING_CHUNK_SIZE = int(os.getenv('STREAMING_CHUNK_SIZE', str(1024 * 1024)))
+STREAMING_CACHE_MAX_BYTES = int(os.getenv('STREAMING_CACHE_MAX_BYTES', str(2 * 1024 ** 3)))
+STREAMING_FETCH_CHUNKS = int(os.getenv('STREAMING_FETCH_CHUNKS', '4'))
+
+# 播放佇列預取（api/streaming/prefetch/）：預取幾首、每首預取的音訊位元組、並發數、排隊中的位元組上限
+STREAMING_PREFETCH_TRACKS = int(os.getenv('STREAMING_PREFETCH_TRACKS', '3'))
+STREAMING_PREFETCH_BYTES = int(os.getenv('STREAMING_PREFETCH_BYTES', str(256 * 1024)))
+STREAMING_PREFETCH_WORKERS = int(os.getenv('STREAMING_PREFETCH_WORKERS', '2'))
+STREAMING_PREFETCH_MAX_PENDING_BYTES = int(os.getenv('STREAMING_PREFETCH_MAX_PENDING_BYTES', str(16 * 1024 * 1024)))
+
+# 本地曲庫搜尋：同一搜尋詞近期已向上游查詢過，或本地 FTS 以完整字詞命中至少 MIN_HITS 首時，
+# search/ 直接由本地曲庫回答；搜尋詞覆蓋記錄的有效期（秒）
+MUSIC_CATALOG_SEARCH = os.getenv('MUSIC_CATALOG_SEARCH', 'True').lower() == 'true'
+MUSIC_CATALOG_COVERAGE_TTL = int(os.getenv('MUSIC_CATALOG_COVERAGE_TTL', str(7 * 24 * 3600)))
+MUSIC_CATALOG_SEARCH_MIN_HITS = int(os.getenv('MUSIC_CATALOG_SEARCH_MIN_HITS', '50'))
+
+# 相似音軌（tracks/<id>/similar/，需要 numpy）：每個 worker 每隔多少秒增量同步其他 worker 寫入曲庫的音軌
+MUSIC_SIMILAR_SYNC_INTERVAL = float(os.getenv('MUSIC_SIMILAR_SYNC_INTERVAL', '300'))
+
+# 伺服器端歌單（api/playlists/）：每個歌單的音軌上限、讀取歌單時每頁預設的項目數
+PLAYLIST_MAX_ITEMS = int(os.getenv('PLAYLIST_MAX_ITEMS', '10000'))
+PLAYLIST_PAGE_SIZE = int(os.getenv('PLAYLIST_PAGE_SIZE', '100'))
+
+# 收聽紀錄（api/users/history/）：每個 worker 緩衝的事件達到多少個或每隔多少秒批量寫入、緩衝事件數上限
+USERS_HISTORY_FLUSH_SIZE = int(os.getenv('USERS_HISTORY_FLUSH_SIZE', '500'))
+USERS_HISTORY_FLUSH_INTERVAL = float(os.getenv('USERS_HISTORY_FLUSH_INTERVAL', '5'))
+USERS_HISTORY_MAX_PENDING = int(os.getenv('USERS_HISTORY_MAX_PENDING', '50000'))
 
 # 日誌設定
 if IS_RAILWAY:
@@ -40,8 +40,11 @@ export function useJamendo() {
     const mp3Urls = validUrls.filter(url => url.toLowerCase().includes('.mp3') || url.toLowerCase().includes('mp3'))
     const otherUrls = validUrls.filter(url => !url.toLowerCase().includes('.mp3'))
     
-    console.log('🔗 找到的音頻 URLs:', { mp3Urls, otherUrls, allUrls: validUrls })
-    return [...mp3Urls, ...otherUrls]
+    // 優先使用後端音訊代理（支援 Range，熱門音軌直接從伺服器磁碟緩存送出），Jamendo 直連作為備用
+    const proxyUrls = track.id ? [`${API_BASE_URL}/streaming/tracks/${track.id}/audio/`] : []
+    
+    console.log('🔗 找到的音頻 URLs:', { proxyUrls, mp3Urls, otherUrls, allUrls: validUrls })
+    return [...proxyUrls, ...mp3Urls, ...otherUrls]
   }
 
   // 檢查配置
@@ -287,7 +290,7 @@ export function useJamendo() {
           console.log(`🔗 嘗試音頻 URL ${attemptCount}/${audioUrls.length}:`, audioUrl)
           
           // 驗證 URL 格式
-          new URL(audioUrl)
+          new URL(audioUrl, window.location.origin)
           
           // 重置音頻元素
           audioPlayer.value.src = ''
@@ -405,6 +408,9 @@ export function useJamendo() {
       
       console.log('✅ 成功播放:', track.name)
       
+      // 讓後端預先緩存接下來幾首的音訊開頭，切歌時不必等待
+      prefetchUpcoming()
+      
     } catch (error) {
       console.error('❌ 播放失敗:', error)
       
@@ -613,6 +619,29 @@ export function useJamendo() {
     console.log('🔁 重複模式:', playerStore.repeatMode)
   }
 
+  // 預取播放佇列中接下來的音軌（失敗不影響播放）
+  const prefetchUpcoming = (count = 3) => {
+    const playlist = currentPlaylist.value
+    if (playlist.length < 2) return
+    
+    const trackIds = []
+    for (let offset = 1; offset <= count && offset < playlist.length; offset++) {
+      let index = currentTrackIndex.value + offset
+      if (index >= playlist.length) {
+        if (playerStore.repeatMode !== 'all') break
+        index -= playlist.length
+      }
+      if (playlist[index]?.id) trackIds.push(playlist[index].id)
+    }
+    if (trackIds.length === 0) return
+    
+    fetch(`${API_BASE_URL}/streaming/prefetch/`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ track_ids: trackIds })
+    }).catch(error => console.warn('⚠️ 預取下一首失敗:', error))
+  }
+
   // 播放列表管理
   const setPlaylist = (tracks, startIndex = 0) => {
     currentPlaylist.value = tracks
@@ -690,6 +719,36 @@ export function useJamendo() {
     }
   }
 
+  // 搜尋建議 - 後端的進程內索引，輸入時不請求 Jamendo；新的輸入會取消還沒完成的上一次請求
+  let suggestionsController = null
+  const getSuggestions = async (query, options = {}) => {
+    suggestionsController?.abort()
+    if (!query.trim()) return []
+
+    const controller = new AbortController()
+    suggestionsController = controller
+    try {
+      const params = new URLSearchParams({ q: query, limit: options.limit || 8 })
+      const response = await fetch(`${API_BASE_URL}/jamendo/autocomplete/?${params}`, {
+        signal: controller.signal
+      })
+      if (!response.ok) {
+        throw new Error(`HTTP ${response.status}: ${response.statusText}`)
+      }
+      const data = await response.json()
+      return data.results || []
+    } catch (error) {
+      if (error.name !== 'AbortError') {
+        console.error('❌ 獲取搜尋建議失敗:', error)
+      }
+      return null
+    } finally {
+      if (suggestionsController === controller) {
+        suggestionsController = null
+      }
+    }
+  }
+
   const getTracksByTag = async (tag, options = {}) => {
     try {
       const params = {
@@ -857,6 +916,7 @@ export function useJamendo() {
     toggleShuffle,
     toggleRepeat,
     searchTracks,
+    getSuggestions,
     getTracksByTag,
     getPopularTracks,
     getLatestTracks,